@@ -0,0 +1,201 @@
+"""Admission control for expensive endpoints.
+
+Every expensive route class (calculations, bulk writes/imports) has a gate with
+a concurrency limit and a bounded wait queue. A request that finds the gate
+full and the queue full, or that waits longer than ``max_wait`` seconds, is
+answered at once with ``503`` and a ``Retry-After`` estimated from the gate's
+recent service time, instead of tying up a worker thread. Cheap routes
+(/health, /ready, lists) never pass a gate.
+
+Pure ASGI middleware, like backend.compression. Gates hold no event loop
+state between requests, so the same gates work under several test clients.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from typing import (Any, Awaitable, Callable, Deque, Iterable, Optional, Pattern, Sequence,
+                    Tuple)
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+
+class Overloaded(Exception):
+    """The gate is full; retry after `retry_after` seconds."""
+
+    def __init__(self, gate: str, retry_after: int):
+        super().__init__(gate)
+        self.gate = gate
+        self.retry_after = retry_after
+
+
+class Gate:
+    """At most `limit` requests inside, at most `queue` waiting for a slot."""
+
+    def __init__(self, name: str, limit: int, queue: int = 0, max_wait: float = 5.0):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of seconds spent inside the gate
+        self.service_seconds = 1.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for w in self._waiters if not w.done())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: the queue ahead drains at
+        `limit` requests per average service time."""
+        per_slot = self.service_seconds * (self.waiting + 1) / max(self.limit, 1)
+        return max(1, math.ceil(per_slot))
+
+    def _reject(self) -> Overloaded:
+        self.rejected += 1
+        return Overloaded(self.name, self.retry_after())
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if there is room; Overloaded otherwise."""
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.waiting >= self.queue:
+            raise self._reject()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self._discard(waiter)
+                raise self._reject()
+            # Handed a slot just as the wait timed out: keep it
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(waiter)
+            raise
+        self.admitted += 1
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, seconds: Optional[float] = None) -> None:
+        """Free a slot; the oldest waiter takes it over (`active` is unchanged)."""
+        if seconds is not None:
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "queue": self.queue, "active": self.active,
+                "waiting": self.waiting, "admitted": self.admitted,
+                "rejected": self.rejected,
+                "service_seconds": round(self.service_seconds, 4)}
+
+
+async def admitted(gate: Gate, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """`await fn()` inside `gate`, for routes that gate only part of their
+    work (e.g. the leader of a single-flight computation)."""
+    await gate.acquire()
+    started = time.perf_counter()
+    try:
+        return await fn()
+    finally:
+        gate.release(time.perf_counter() - started)
+
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        {"detail": f"Serveren er opptatt ({e.gate}), prøv igjen om {e.retry_after} s"},
+        status_code=503, headers={"Retry-After": str(e.retry_after)})
+
+
+Rule = Tuple[Sequence[str], Pattern, Gate]
+
+_BODY_METHODS = ("POST", "PUT", "PATCH")
+
+
+def rule(methods: Iterable[str], path: str, gate: Gate) -> Rule:
+    """Requests with one of `methods` whose path fully matches the regex `path`."""
+    return (tuple(methods), re.compile(path), gate)
+
+
+class AdmissionMiddleware:
+    """Sends requests through the gate of the first matching rule.
+
+    Requests whose Content-Length is at least `large_bytes` try the `large`
+    rules first, so a few huge payloads queue on their own gate instead of
+    taking the slots that normal-sized requests use. A body of unknown size
+    (chunked upload without Content-Length) counts as large. The admitting
+    gate's name is left in ``request.state.admission_gate``.
+    """
+
+    def __init__(self, app, rules: Sequence[Rule] = (),
+                 large: Sequence[Rule] = (), large_bytes: int = 0):
+        self.app = app
+        self.rules = list(rules)
+        # Checked first for requests whose Content-Length is at least large_bytes
+        self.large = list(large)
+        self.large_bytes = large_bytes
+
+    def gate_for(self, method: str, path: str,
+                 content_length: Optional[int]) -> Optional[Gate]:
+        """`content_length` None: the request has a body of unknown size."""
+        candidates = self.rules
+        if self.large and self.large_bytes and (
+                content_length is None or content_length >= self.large_bytes):
+            candidates = self.large + self.rules
+        for methods, pattern, gate in candidates:
+            if method in methods and pattern.fullmatch(path):
+                return gate
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        try:
+            content_length = int(headers["content-length"])
+        except KeyError:
+            # No Content-Length: a chunked body may be any size
+            chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+            content_length = None if chunked or scope["method"] in _BODY_METHODS else 0
+        except ValueError:
+            content_length = None
+        gate = self.gate_for(scope["method"], scope["path"], content_length)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await gate.acquire()
+        except Overloaded as e:
+            await overloaded_response(e)(scope, receive, send)
+            return
+        scope.setdefault("state", {})["admission_gate"] = gate.name
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - started)
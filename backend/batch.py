@@ -0,0 +1,260 @@
+"""Offline batch EBIT calculation over many scenario files.
+
+Reads the master data (consultants, projects, settings) straight from the data
+directory once, then fans the scenario files out over a process pool. Each
+worker calculates with the same code as POST /calculate-ebit
+(``backend.calculations.calculate_assignments``) and writes its own result
+file, so only the small per-scenario summary travels back to the parent.
+Nothing goes through the web server or its lock.
+
+Scenario files hold assignment rows (consultant_id, project_id, utilization,
+project_percent; optional row_index, utlegg_mode, expense_pct and
+manual_expense_total; JSON rows may carry manual_expenses line items instead):
+
+    .csv                  one assignment per line, header row
+    .json                 list of rows, {"assignments": [rows] | {columns}, ...}
+                          or a /calculate-ebit body; yearly_work_hours, pex_pct,
+                          expense_pct, cost_mode and as_of in the object override
+                          the CLI
+    .parquet / .arrow     one assignment per row
+
+Usage:
+
+    python -m backend.batch scenarios/ --out batch-results --format parquet
+    python -m backend.batch a.csv b.json --workers 4 --cost-mode consultant
+
+Writes <out>/<scenario>.<format> (result rows; JSON gets the full response)
+and <out>/summary.csv. Exits with 1 if any scenario failed. Salaries and
+rates are the versions in effect on --as-of (default today).
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.calculations import (UnknownId, calculate_assignments, manual_lines,
+                                  resolve_settings)
+from backend.data_access import DataStore, default_data_dir
+from backend.formats import ASSIGNMENT_COLUMNS, dumps_json, rows_to_columns, validate_columns
+from backend.tables import TABLE_COLUMNS, ColumnTable, to_days
+
+SCENARIO_SUFFIXES = (".csv", ".json", ".parquet", ".arrow")
+OUTPUT_FORMATS = ("csv", "json", "parquet")
+PARAM_FIELDS = ("yearly_work_hours", "pex_pct", "expense_pct", "cost_mode", "as_of")
+
+RESULT_FIELDS = ("consultant_id", "consultant_name", "project_id", "project_name",
+                 "billable_hours", "income", "cost", "utlegg", "ebit")
+SUMMARY_FIELDS = ("scenario", "rows", "income", "cost", "utlegg", "ebit", "margin",
+                  "seconds", "output", "error")
+
+# ------------------------------
+# Masterdata
+# ------------------------------
+
+
+def load_master_data(data_dir: Optional[str] = None) -> Tuple[ColumnTable, ColumnTable, dict]:
+    """(consultants, projects, settings) from the JSON files in `data_dir`."""
+    store = DataStore(data_dir)
+    consultants = ColumnTable.from_records(store.items("consultants"),
+                                           TABLE_COLUMNS["consultants"])
+    projects = ColumnTable.from_records(store.items("projects"), TABLE_COLUMNS["projects"])
+    return consultants, projects, store.settings()
+
+
+# ------------------------------
+# Scenariofiler
+# ------------------------------
+
+
+def _row_columns(rows: List[dict]) -> Dict[str, list]:
+    columns = rows_to_columns(rows, ASSIGNMENT_COLUMNS)
+    # Absent or blank optional columns fall back to their defaults
+    return {k: v for k, v in columns.items()
+            if any(x not in (None, "") for x in v)}
+
+
+def read_scenario(path: str) -> Tuple[dict, dict]:
+    """(validated assignment columns, parameter overrides) for one scenario file."""
+    suffix = os.path.splitext(path)[1].lower()
+    params: dict = {}
+    if suffix == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            columns = _row_columns(list(csv.DictReader(f)))
+    elif suffix == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if isinstance(payload, dict):
+            params = {k: payload[k] for k in PARAM_FIELDS if payload.get(k) is not None}
+            payload = payload.get("assignments", payload)
+        if isinstance(payload, list):
+            return ({**validate_columns(_row_columns(payload), ASSIGNMENT_COLUMNS),
+                     **manual_lines(payload)}, params)
+        columns = payload
+    elif suffix in (".parquet", ".arrow"):
+        from backend.export import read_table, table_columns
+
+        with open(path, "rb") as f:
+            columns = table_columns(read_table(f.read()))
+    else:
+        raise ValueError(f"Ukjent scenarioformat: {suffix}")
+    return validate_columns(columns, ASSIGNMENT_COLUMNS), params
+
+
+def _write_result(result: dict, path: str, fmt: str) -> None:
+    cols = result["results"]
+    if fmt == "json":
+        rows = {**result, "results": [dict(zip(RESULT_FIELDS, r)) for r in
+                                      zip(*(_as_list(cols[f]) for f in RESULT_FIELDS))]}
+        with open(path, "wb") as f:
+            f.write(dumps_json(rows))
+    elif fmt == "parquet":
+        from backend.export import table_from_columns, write_table
+
+        with open(path, "wb") as f:
+            f.write(write_table(table_from_columns({f: cols[f] for f in RESULT_FIELDS}),
+                                "parquet"))
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_FIELDS)
+            writer.writerows(zip(*(_as_list(cols[f]) for f in RESULT_FIELDS)))
+
+
+def _as_list(values) -> list:
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
+
+# ------------------------------
+# Arbeidere
+# ------------------------------
+
+_master: Optional[Tuple[ColumnTable, ColumnTable, dict]] = None
+
+
+def _init_worker(consultants: ColumnTable, projects: ColumnTable, settings: dict) -> None:
+    global _master
+    _master = (consultants, projects, settings)
+
+
+def run_scenario(path: str, out_path: str, fmt: str, overrides: dict) -> dict:
+    """Calculate one scenario file and write its result. Never raises: errors
+    end up in the summary row."""
+    started = time.perf_counter()
+    summary = {"scenario": path, "rows": 0, "income": None, "cost": None, "utlegg": None,
+               "ebit": None, "margin": None, "output": None, "error": None}
+    consultants, projects, settings = _master
+    try:
+        cols, params = read_scenario(path)
+        params = {**overrides, **params}
+        as_of = to_days([params.get("as_of") or datetime.date.today().isoformat()])[0]
+        cols = {**cols, "as_of": np.full(len(cols["consultant_id"]), as_of, dtype=np.int64)}
+        result = calculate_assignments(
+            cols, consultants, projects,
+            resolve_settings(settings, params.get("yearly_work_hours"),
+                             params.get("pex_pct"), params.get("expense_pct")),
+            params.get("cost_mode") or "row")
+        _write_result(result, out_path, fmt)
+        dept = {k: result["department"][k] for k in ("income", "cost", "utlegg", "ebit")}
+        summary.update(rows=len(cols["consultant_id"]), output=out_path, **dept,
+                       margin=dept["ebit"] / dept["income"] if dept["income"] else None)
+    except UnknownId as e:
+        kind = "Konsulent" if e.kind == "consultant" else "Prosjekt"
+        summary["error"] = f"{kind} {e.item_id} finnes ikke"
+    except Exception as e:
+        summary["error"] = str(e) or type(e).__name__
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def _scenario_files(paths: Sequence[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(SCENARIO_SUFFIXES)))
+        else:
+            files.append(path)
+    return files
+
+
+def _output_paths(files: Sequence[str], out_dir: str, fmt: str) -> List[str]:
+    # <stem>.<fmt>; a numeric suffix keeps equal stems from different folders apart
+    seen: Dict[str, int] = {}
+    out = []
+    for path in files:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        name = stem if seen[stem] == 1 else f"{stem}-{seen[stem]}"
+        out.append(os.path.join(out_dir, f"{name}.{fmt}"))
+    return out
+
+
+def run_batch(paths: Sequence[str], out_dir: str, fmt: str = "csv",
+              workers: Optional[int] = None, data_dir: Optional[str] = None,
+              overrides: Optional[dict] = None) -> List[dict]:
+    """Calculate every scenario in `paths` (files or folders); returns the
+    summary rows in input order and writes <out_dir>/summary.csv."""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Ukjent utformat: {fmt}")
+    files = _scenario_files(paths)
+    os.makedirs(out_dir, exist_ok=True)
+    outputs = _output_paths(files, out_dir, fmt)
+    master = load_master_data(data_dir)
+    overrides = {k: v for k, v in (overrides or {}).items() if v is not None}
+
+    workers = min(workers or os.cpu_count() or 1, max(len(files), 1))
+    if workers == 1:
+        _init_worker(*master)
+        summaries = [run_scenario(f, o, fmt, overrides) for f, o in zip(files, outputs)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=master) as pool:
+            summaries = list(pool.map(run_scenario, files, outputs,
+                                      [fmt] * len(files), [overrides] * len(files)))
+
+    with open(os.path.join(out_dir, "summary.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summaries)
+    return summaries
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.batch", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="+", help="scenariofiler eller mapper")
+    parser.add_argument("--out", default="batch-results")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    parser.add_argument("--workers", type=int, help="standard: antall kjerner")
+    parser.add_argument("--data-dir", default=default_data_dir())
+    parser.add_argument("--cost-mode", choices=("row", "consultant"))
+    parser.add_argument("--yearly-work-hours", type=float)
+    parser.add_argument("--pex-pct", type=float)
+    parser.add_argument("--expense-pct", type=float)
+    parser.add_argument("--as-of", help="lønn/timepris gjeldende denne datoen (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    summaries = run_batch(
+        args.scenarios, args.out, args.format, args.workers, args.data_dir,
+        {"cost_mode": args.cost_mode, "yearly_work_hours": args.yearly_work_hours,
+         "pex_pct": args.pex_pct, "expense_pct": args.expense_pct, "as_of": args.as_of})
+    failed = [s for s in summaries if s["error"]]
+    for s in failed:
+        print(f"Feil i {s['scenario']}: {s['error']}", file=sys.stderr)
+    print(f"{len(summaries) - len(failed)} av {len(summaries)} scenarier beregnet på "
+          f"{time.perf_counter() - started:.1f} s -> {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,273 @@
+import numpy as np
+
 
 def calculate_ebit(income, cost, utlegg=0.0):
     return income - cost - utlegg
+
+
+def loaded_cost(salary, pex_pct, expense_pct):
+    """Full yearly cost of a consultant: salary incl. PEX and expenses."""
+    return np.asarray(salary, dtype=float) * (1 + pex_pct + expense_pct)
+
+
+def _safe_divide(num, den):
+    # Division that yields inf (not an error) where the denominator is 0.
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    out = np.full(np.broadcast(num, den).shape, np.inf)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _kept_share(target_margin, expense_pct):
+    # Share of income left for cost and fixed utlegg at the target margin
+    return 1 - target_margin - np.asarray(expense_pct, dtype=float)
+
+
+def required_rate(cost, billable_hours, target_margin=0.0, expense_pct=0.0, fixed_utlegg=0.0):
+    """Hourly rate giving EBIT / income == target_margin.
+
+    income = hours * rate and, as in calculate_assignments,
+    EBIT = income - cost - utlegg with utlegg = income * expense_pct (Prosent
+    rows) + fixed_utlegg (Manuelt rows). The margin condition is linear in the
+    rate: rate = (cost + fixed_utlegg) / ((1 - margin - expense_pct) * hours).
+    """
+    return _safe_divide(np.asarray(cost, dtype=float) + fixed_utlegg,
+                        _kept_share(target_margin, expense_pct)
+                        * np.asarray(billable_hours, dtype=float))
+
+
+def required_utilization(cost, yearly_work_hours, project_percent, hourly_rate, target_margin=0.0,
+                         expense_pct=0.0, fixed_utlegg=0.0):
+    """Utilization giving EBIT / income == target_margin (may exceed 1);
+    utlegg terms as in required_rate."""
+    capacity_income = (np.asarray(yearly_work_hours, dtype=float)
+                       * np.asarray(project_percent, dtype=float)
+                       * np.asarray(hourly_rate, dtype=float))
+    return _safe_divide(np.asarray(cost, dtype=float) + fixed_utlegg,
+                        _kept_share(target_margin, expense_pct) * capacity_income)
+
+
+def supported_headcount(income, cost, headcount, target_margin=0.0, utlegg=0.0):
+    """Number of consultants at the average cost the income carries at
+    target_margin, after `utlegg`."""
+    average_cost = _safe_divide(cost, headcount)
+    return _safe_divide(np.asarray(income, dtype=float) * (1 - target_margin) - utlegg,
+                        average_cost)
+
+
+def group_sum(keys, *values):
+    """Sum each value array per unique key. Returns (unique_keys, sums...)."""
+    uniq, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    sums = [np.bincount(inverse, weights=np.asarray(v, dtype=float), minlength=len(uniq))
+            for v in values]
+    return (uniq, *sums)
+
+
+def allocate_cost(consultant_ids, billable_hours, consultant_cost):
+    """Charge each consultant's cost once, split over their rows by hours share.
+
+    `consultant_cost` is given per row (the same value on every row of a
+    consultant). Consultants without hours are split evenly over their rows.
+    """
+    _, inverse = np.unique(np.asarray(consultant_ids), return_inverse=True)
+    hours = np.asarray(billable_hours, dtype=float)
+    total_hours = np.bincount(inverse, weights=hours)
+    row_count = np.bincount(inverse)
+    share = np.where(
+        total_hours[inverse] > 0,
+        _safe_divide(hours, total_hours[inverse]),
+        1.0 / row_count[inverse],
+    )
+    return np.asarray(consultant_cost, dtype=float) * share
+
+
+UTLEGG_MANUAL = "Manuelt"
+UTLEGG_PERCENT = "Prosent"
+
+
+def utlegg_amount(manual, expense_pct, income, manual_sum):
+    """Utlegg: the manual line items when the mode is Manuelt, otherwise
+    expense_pct of income. Works on scalars and arrays."""
+    return np.where(manual, manual_sum, np.asarray(income, dtype=float) * expense_pct)
+
+
+def manual_lines(rows):
+    """Flatten the manual_expenses lists of assignment rows into parallel
+    columns (expense_row, expense_type, expense_amount)."""
+    line_rows, types, amounts = [], [], []
+    for i, row in enumerate(rows):
+        for line in row.get("manual_expenses") or []:
+            line_rows.append(i)
+            types.append(line.get("type") or "Annet")
+            amounts.append(float(line.get("amount") or 0.0))
+    return {
+        "expense_row": np.array(line_rows, dtype=np.int64),
+        "expense_type": types,
+        "expense_amount": np.array(amounts, dtype=float),
+    }
+
+
+def utlegg_terms(cols, n):
+    """Per-row (expense_pct, fixed amount) with utlegg = income * expense_pct
+    + fixed, as expenses() computes it; used to solve EBIT for a rate."""
+    modes = cols.get("utlegg_mode")
+    manual = (np.zeros(n, dtype=bool) if modes is None
+              else np.asarray(modes, dtype=object) == UTLEGG_MANUAL)
+    expense_pct = np.nan_to_num(np.asarray(cols.get("expense_pct", 0.0), dtype=float))
+    # With no income only the manual line items remain
+    fixed, _ = expenses(cols, np.zeros(n))
+    return np.where(manual, 0.0, expense_pct), fixed
+
+
+def expenses(cols, income):
+    """Utlegg per row and per type, in one vectorized pass.
+
+    `cols` may carry utlegg_mode and expense_pct per row, manual line items
+    as expense_row/expense_type/expense_amount and a per-row
+    manual_expense_total (columnar requests; counted as type "Annet").
+    Manual lines only count on rows in Manuelt mode, like on the pages.
+    Rows without an expense_pct (missing column or NaN) have no percentage
+    utlegg: the expense_pct setting is already part of loaded_cost.
+    Returns (utlegg per row, {type: total}).
+    """
+    n = len(income)
+    modes = cols.get("utlegg_mode")
+    manual = (np.zeros(n, dtype=bool) if modes is None
+              else np.asarray(modes, dtype=object) == UTLEGG_MANUAL)
+    expense_pct = np.nan_to_num(np.asarray(cols.get("expense_pct", 0.0), dtype=float))
+
+    line_rows = np.asarray(cols.get("expense_row", ()), dtype=np.int64)
+    line_types = list(cols.get("expense_type", ()))
+    line_amounts = np.asarray(cols.get("expense_amount", ()), dtype=float)
+    totals = cols.get("manual_expense_total")
+    if totals is not None:
+        extra = np.flatnonzero(np.asarray(totals, dtype=float))
+        line_rows = np.concatenate((line_rows, extra))
+        line_types = line_types + ["Annet"] * len(extra)
+        line_amounts = np.concatenate((line_amounts, np.asarray(totals, dtype=float)[extra]))
+
+    manual_sum = np.bincount(line_rows, weights=line_amounts, minlength=n)
+    utlegg = utlegg_amount(manual, expense_pct, income, manual_sum)
+
+    by_type = {}
+    percent = float(np.where(manual, 0.0, utlegg).sum())
+    if percent:
+        by_type[UTLEGG_PERCENT] = percent
+    counted = manual[line_rows] if len(line_rows) else np.zeros(0, dtype=bool)
+    if counted.any():
+        types, sums = group_sum(np.asarray(line_types, dtype=object)[counted],
+                                line_amounts[counted])
+        by_type.update(zip(types.tolist(), sums.tolist()))
+    return utlegg, by_type
+
+
+class UnknownId(KeyError):
+    """An assignment refers to a consultant or project that doesn't exist."""
+
+    def __init__(self, kind: str, item_id: int):
+        super().__init__(item_id)
+        self.kind = kind  # "consultant" | "project"
+        self.item_id = item_id
+
+
+def resolve_settings(settings, yearly_work_hours=None, pex_pct=None, expense_pct=None):
+    """Stored settings with per-request overrides (None = use stored)."""
+    return {
+        "yearly_work_hours": yearly_work_hours or settings["yearly_work_hours"],
+        "pex_pct": settings["pex_pct"] if pex_pct is None else pex_pct,
+        "expense_pct": settings["expense_pct"] if expense_pct is None else expense_pct,
+    }
+
+
+def join_assignments(cols, consultants, projects):
+    """Add salary/hourly_rate and names to assignment columns as array takes on
+    the consultant/project ColumnTables. Raises UnknownId.
+
+    With an `as_of` column (day numbers, backend.tables.to_days) salaries and
+    rates are the versions in effect on those days; otherwise the newest.
+    """
+    try:
+        cpos = consultants.positions(cols["consultant_id"])
+    except KeyError as e:
+        raise UnknownId("consultant", e.args[0])
+    try:
+        ppos = projects.positions(cols["project_id"])
+    except KeyError as e:
+        raise UnknownId("project", e.args[0])
+
+    cols = dict(cols)
+    as_of = cols.get("as_of")
+    if as_of is None:
+        cols["salary"] = consultants.columns["salary"][cpos]
+        cols["hourly_rate"] = projects.columns["hourly_rate"][ppos]
+    else:
+        cols["salary"] = consultants.values_at("salary", cpos, as_of)
+        cols["hourly_rate"] = projects.values_at("hourly_rate", ppos, as_of)
+    cols["consultant_name"] = consultants.names_at(cpos)
+    cols["project_name"] = projects.names_at(ppos)
+    return cols
+
+
+def rollup(kind, keys, table, hours, income, cost, utlegg):
+    """Per-consultant or per-project totals (kind: "consultant" | "project")."""
+    ids, h, inc, cst, utl = group_sum(keys, hours, income, cost, utlegg)
+    names = table.names_at(table.positions(ids))
+    out = []
+    for i, name, hh, ii, cc, uu in zip(ids.tolist(), names, h.tolist(), inc.tolist(),
+                                       cst.tolist(), utl.tolist()):
+        out.append({f"{kind}_id": i, f"{kind}_name": name, "billable_hours": hh,
+                    "income": ii, "cost": cc, "utlegg": uu, "ebit": ii - cc - uu})
+    return out
+
+
+def calculate_assignments(cols, consultants, projects, settings_used, cost_mode="row"):
+    """EBIT for assignment columns (consultant_id, project_id, utilization,
+    project_percent) against consultant/project tables.
+
+    `settings_used` is the resolved settings (see resolve_settings); utlegg
+    inputs are described in expenses(). Returns the /calculate-ebit result
+    with `results` as columns.
+    """
+    cols = join_assignments(cols, consultants, projects)
+
+    billable_hours = (settings_used["yearly_work_hours"]
+                      * cols["utilization"] * cols["project_percent"])
+    income = billable_hours * cols["hourly_rate"]
+    cost = loaded_cost(
+        cols["salary"], settings_used["pex_pct"], settings_used["expense_pct"])
+    if cost_mode == "consultant":
+        cost = allocate_cost(cols["consultant_id"], billable_hours, cost)
+    utlegg, utlegg_by_type = expenses(cols, income)
+    ebit = income - cost - utlegg
+
+    results = {
+        "consultant_id": cols["consultant_id"],
+        "consultant_name": cols["consultant_name"],
+        "project_id": cols["project_id"],
+        "project_name": cols["project_name"],
+        "billable_hours": billable_hours,
+        "income": income,
+        "cost": cost,
+        "utlegg": utlegg,
+        "ebit": ebit,
+    }
+    if cols.get("row_index") is not None:
+        # Lets clients match results to their rows
+        results = {"row_index": cols["row_index"], **results}
+
+    return {
+        "settings_used": {**settings_used, "cost_mode": cost_mode},
+        "results": results,
+        "consultants": rollup("consultant", cols["consultant_id"], consultants,
+                              billable_hours, income, cost, utlegg),
+        "projects": rollup("project", cols["project_id"], projects,
+                           billable_hours, income, cost, utlegg),
+        "department": {
+            "income": float(income.sum()),
+            "cost": float(cost.sum()),
+            "utlegg": float(utlegg.sum()),
+            "utlegg_by_type": utlegg_by_type,
+            "ebit": float(ebit.sum())
+        }
+    }
@@ -0,0 +1,111 @@
+"""Over-allocation detection for assignment rows with date ranges.
+
+Every row becomes two events per consultant: +load on start_date and -load on
+the day after end_date. One lexsort over (consultant, day) plus a cumulative
+sum gives the booked load on every interval between events, so the whole check
+is O(n log n) regardless of how many rows overlap.
+"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+_EPS = 1e-9
+# Open-ended rows (no start/end date) extend to these day numbers
+_OPEN_START = np.iinfo(np.int64).min // 4
+_OPEN_END = np.iinfo(np.int64).max // 4
+
+
+def _days(values: Sequence[Optional[str]], open_value: int) -> np.ndarray:
+    """ISO dates -> day numbers since epoch; None becomes `open_value`."""
+    parsed = np.array([v if v else "NaT" for v in values], dtype="datetime64[D]")
+    days = parsed.astype(np.int64)
+    days[np.isnat(parsed)] = open_value
+    return days
+
+
+def _iso(day: int) -> Optional[str]:
+    if day <= _OPEN_START or day >= _OPEN_END - 1:
+        return None
+    return str(np.datetime64(int(day), "D"))
+
+
+def find_overallocations(
+    consultant_ids: Sequence[int],
+    start_dates: Sequence[Optional[str]],
+    end_dates: Sequence[Optional[str]],
+    load: Sequence[float],
+    capacity: float = 1.0,
+) -> List[dict]:
+    """Date ranges (inclusive) where a consultant's summed load exceeds `capacity`.
+
+    Adjacent over-allocated intervals are merged; `peak_load` is the highest
+    booked load within the range. Raises ValueError on unparseable dates and
+    on rows whose start_date is after their end_date.
+    """
+    cids = np.asarray(consultant_ids, dtype=np.int64)
+    start = _days(start_dates, _OPEN_START)
+    end = _days(end_dates, _OPEN_END)
+    load = np.asarray(load, dtype=float)
+
+    reversed_rows = np.flatnonzero(start > end)
+    if len(reversed_rows):
+        i = int(reversed_rows[0])
+        raise ValueError(f"rad {i}: start_date {start_dates[i]} er etter end_date {end_dates[i]}")
+
+    valid = load > 0
+    cids, start, end, load = cids[valid], start[valid], end[valid], load[valid]
+    if len(cids) == 0:
+        return []
+
+    ev_cid = np.concatenate((cids, cids))
+    ev_day = np.concatenate((start, np.minimum(end + 1, _OPEN_END)))
+    ev_delta = np.concatenate((load, -load))
+
+    order = np.lexsort((ev_day, ev_cid))
+    ev_cid, ev_day, ev_delta = ev_cid[order], ev_day[order], ev_delta[order]
+
+    # Collapse events on the same (consultant, day)
+    first = np.ones(len(ev_cid), dtype=bool)
+    first[1:] = (ev_cid[1:] != ev_cid[:-1]) | (ev_day[1:] != ev_day[:-1])
+    idx = np.flatnonzero(first)
+    ev_cid, ev_day = ev_cid[idx], ev_day[idx]
+    ev_delta = np.add.reduceat(ev_delta, idx)
+
+    # Running load per consultant (reset at each consultant's first event)
+    running = np.cumsum(ev_delta)
+    new_cid = np.ones(len(ev_cid), dtype=bool)
+    new_cid[1:] = ev_cid[1:] != ev_cid[:-1]
+    group = np.cumsum(new_cid) - 1
+    base = (running - ev_delta)[new_cid]
+    running = running - base[group]
+
+    # Interval i spans [ev_day[i], ev_day[i+1]) when the next event is the same consultant
+    same_next = np.zeros(len(ev_cid), dtype=bool)
+    same_next[:-1] = ev_cid[1:] == ev_cid[:-1]
+    over = same_next & (running > capacity + _EPS)
+    if not over.any():
+        return []
+
+    run_start = over.copy()
+    run_start[1:] &= ~(over[:-1] & (ev_cid[1:] == ev_cid[:-1]))
+    starts = np.flatnonzero(run_start)
+    over_idx = np.flatnonzero(over)
+    # Each run is a contiguous block of `over` intervals
+    run_id = np.cumsum(run_start)[over_idx] - 1
+    peak = np.full(len(starts), -np.inf)
+    np.maximum.at(peak, run_id, running[over_idx])
+    last = np.zeros(len(starts), dtype=np.int64)
+    np.maximum.at(last, run_id, over_idx)
+
+    out = []
+    for s, e, p in zip(starts.tolist(), last.tolist(), peak.tolist()):
+        out.append({
+            "consultant_id": int(ev_cid[s]),
+            "start_date": _iso(ev_day[s]),
+            "end_date": _iso(ev_day[e + 1] - 1),
+            "peak_load": p,
+            "excess": p - capacity,
+        })
+    return out
@@ -0,0 +1,62 @@
+"""Per-record change history behind GET /changes?since=<version>.
+
+Each collection keeps a bounded window of (version, upserts, deletes) entries.
+A client that is behind by less than the window gets the net delta; anything
+older (compacted away, or from before a restart/reset) gets a full snapshot.
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_HISTORY = 1000
+
+_Entry = Tuple[int, List[dict], List[int]]
+
+
+class ChangeLog:
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        self._history = history
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[_Entry]] = {}
+        # Oldest version a delta can start from, per collection
+        self._floor: Dict[str, int] = {}
+
+    def record(self, collection: str, version: int,
+               upserts: Iterable[dict] = (), deletes: Iterable[int] = ()) -> None:
+        with self._lock:
+            entries = self._entries.setdefault(collection, deque())
+            self._floor.setdefault(collection, version - 1)
+            entries.append((version, [dict(x) for x in upserts], list(deletes)))
+            while len(entries) > self._history:
+                old_version, _, _ = entries.popleft()
+                self._floor[collection] = old_version
+
+    def reset(self, collection: str, version: int) -> None:
+        """Forget history; clients older than `version` must take a snapshot."""
+        with self._lock:
+            self._entries[collection] = deque()
+            self._floor[collection] = version
+
+    def since(self, collection: str, version: int, current: int) -> Optional[dict]:
+        """Net upserts/deletes after `version`, or None if a snapshot is needed."""
+        with self._lock:
+            floor = self._floor.get(collection, current)
+            if version > current or version < floor:
+                return None
+            upserts: Dict[int, dict] = {}
+            deletes = set()
+            for v, ups, dels in self._entries.get(collection, ()):
+                if v <= version:
+                    continue
+                for item in ups:
+                    upserts[item["id"]] = item
+                    deletes.discard(item["id"])
+                for rid in dels:
+                    upserts.pop(rid, None)
+                    deletes.add(rid)
+        return {
+            "upserts": sorted(upserts.values(), key=lambda x: x["id"]),
+            "deletes": sorted(deletes),
+        }
@@ -0,0 +1,116 @@
+"""Negotiated gzip/brotli compression for response bodies above a size threshold.
+
+Pure ASGI middleware. Bodies sent in one piece (every JSON, MessagePack and
+Arrow response here) are compressed with the best encoding the client accepts:
+brotli if the optional ``brotli`` package is installed, otherwise gzip.
+Streaming responses (server-sent events) and bodies that already carry a
+Content-Encoding are passed through untouched. Every response gets
+``Vary: Accept-Encoding``, compressed or not, so shared caches keep the
+variants apart.
+"""
+from __future__ import annotations
+
+import gzip
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+# Bodies above this size are compressed off the event loop
+_THREADPOOL_BYTES = 256 * 1024
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br/gzip from an Accept-Encoding header (q-values respected)."""
+    prefs = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            prefs[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = prefs.get(encoding, prefs.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            async def send_identity(message):
+                # The body would differ with another Accept-Encoding: tell caches
+                if message["type"] == "http.response.start":
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                await send(message)
+
+            await self.app(scope, receive, send_identity)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # held until we know the body
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) > _THREADPOOL_BYTES:
+                body = await run_in_threadpool(
+                    compress, body, encoding, self.gzip_level, self.brotli_quality)
+            else:
+                body = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
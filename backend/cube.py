@@ -0,0 +1,340 @@
+"""Materialized consultant x project x month aggregate of income, cost, utlegg and EBIT.
+
+Scenario rows contribute to one cell per month they overlap. The cube keeps the
+cells plus month-level rollups per consultant, per project and for the whole
+department, and applies +/- deltas when a single row (or the rows of a changed
+consultant/project) is recomputed, so queries never rescan the scenario.
+
+Monthly figures follow the EBIT_Trends page: yearly income and cost are scaled
+by the month's share of the year's business days, percentage utlegg follows the
+scaled income and manual utlegg counts as a per-month amount (the same rule as
+/calculate-ebit, backend.calculations.utlegg_amount, applied per month).
+Salary and hourly rate are the versions in effect on the 1st of each month
+(effective-dated history, backend.tables).
+"""
+from __future__ import annotations
+
+import datetime
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backend.calculations import UTLEGG_MANUAL, utlegg_amount
+from backend.tables import ColumnTable
+
+MEASURES = ("income", "cost", "utlegg", "ebit")
+# Cell vectors carry the measures plus a row count, so empty cells can be dropped
+_COUNT = len(MEASURES)
+
+
+@lru_cache(maxsize=None)
+def business_days_in_month(year: int, month: int) -> int:
+    """Number of weekdays (mon–fri) in the month, without public holidays."""
+    first = datetime.date(year, month, 1)
+    if month == 12:
+        last = datetime.date(year + 1, 1, 1) - datetime.timedelta(days=1)
+    else:
+        last = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+    return int(np.busday_count(first, last + datetime.timedelta(days=1)))
+
+
+@lru_cache(maxsize=None)
+def business_days_in_year(year: int) -> int:
+    return sum(business_days_in_month(year, m) for m in range(1, 13))
+
+
+def month_weight(year: int, month: int) -> float:
+    bd_year = business_days_in_year(year)
+    return business_days_in_month(year, month) / bd_year if bd_year else 1.0
+
+
+def months_between(start: datetime.date, end: datetime.date) -> List[Tuple[int, int]]:
+    """(year, month) pairs overlapped by the inclusive date range."""
+    out = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        out.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def month_starts(months: Iterable[Tuple[int, int]]) -> np.ndarray:
+    """Day numbers (backend.tables.to_days) of the 1st of each (year, month)."""
+    return np.array([f"{y:04d}-{m:02d}-01" for y, m in months],
+                    dtype="datetime64[D]").astype(np.int64)
+
+
+def _row_terms(row: dict, settings: dict):
+    # Yearly hours, the utlegg inputs and the cost factor of one scenario row
+    hours = settings["yearly_work_hours"] * \
+        row["utilization"] * row["project_percent"]
+    manual = row.get("utlegg_mode") == UTLEGG_MANUAL
+    manual_sum = sum(e.get("amount", 0.0)
+                     for e in row.get("manual_expenses") or [])
+    expense_pct = row.get("expense_pct") or 0.0
+    return hours, manual, manual_sum, expense_pct
+
+
+def row_contributions(row: dict, consultant: dict, project: dict, settings: dict,
+                      salary=None, hourly_rate=None) -> Dict[str, np.ndarray]:
+    """Per-month measure vectors ("YYYY-MM" -> vector) for one scenario row.
+
+    `salary`/`hourly_rate` are optional per-month values in months_between
+    order (see row_contributions_at); default the records' newest values.
+    """
+    start = datetime.date.fromisoformat(row["start_date"])
+    end = datetime.date.fromisoformat(row["end_date"])
+    months = months_between(start, end)
+    hours, manual, manual_sum, expense_pct = _row_terms(row, settings)
+    w = np.array([month_weight(y, m) for y, m in months])
+    salary = consultant["salary"] if salary is None else np.asarray(salary, dtype=float)
+    hourly_rate = project["hourly_rate"] if hourly_rate is None else np.asarray(
+        hourly_rate, dtype=float)
+
+    income = hours * hourly_rate * w
+    cost = salary * (1 + settings["pex_pct"] + settings["expense_pct"]) * w
+    utlegg = utlegg_amount(manual, expense_pct, income, manual_sum)
+    vectors = np.column_stack(
+        (income, cost, utlegg, income - cost - utlegg, np.ones(len(months))))
+    return {f"{y:04d}-{m:02d}": vec for (y, m), vec in zip(months, vectors)}
+
+
+def row_contributions_at(row: dict, consultants: ColumnTable, cpos: int,
+                         projects: ColumnTable, ppos: int, settings: dict
+                         ) -> Dict[str, np.ndarray]:
+    """row_contributions with the salary and rate in effect each month."""
+    months = months_between(datetime.date.fromisoformat(row["start_date"]),
+                            datetime.date.fromisoformat(row["end_date"]))
+    days = month_starts(months)
+    positions = np.zeros(len(days), dtype=np.int64)
+    return row_contributions(
+        row, {}, {}, settings,
+        salary=consultants.values_at("salary", positions + cpos, days),
+        hourly_rate=projects.values_at("hourly_rate", positions + ppos, days))
+
+
+def trend_totals(rows: List[dict], months: List[str], consultants: ColumnTable,
+                 projects: ColumnTable, settings: dict) -> np.ndarray:
+    """Department measures per month (len(months) x len(MEASURES)) for scenario rows.
+
+    Same rules as row_contributions, vectorized over every (row, month)
+    pair: salaries and rates for all pairs are two as-of lookups. `months`
+    are sorted "YYYY-MM"; rows with unknown consultants/projects are skipped.
+    """
+    wanted = np.array([int(m[:4]) * 12 + int(m[5:7]) - 1 for m in months], dtype=np.int64)
+    weights = np.array([month_weight(int(m[:4]), int(m[5:7])) for m in months])
+    days = month_starts((int(m[:4]), int(m[5:7])) for m in months)
+
+    cpos, ppos, first, last, terms = [], [], [], [], []
+    for row in rows:
+        c = consultants.position(row["consultant_id"])
+        p = projects.position(row["project_id"])
+        if c is None or p is None:
+            continue
+        start = datetime.date.fromisoformat(row["start_date"])
+        end = datetime.date.fromisoformat(row["end_date"])
+        cpos.append(c)
+        ppos.append(p)
+        first.append(start.year * 12 + start.month - 1)
+        last.append(end.year * 12 + end.month - 1)
+        terms.append(_row_terms(row, settings))
+    out = np.zeros((len(months), len(MEASURES)))
+    if not terms:
+        return out
+
+    # Expand rows to their overlapping months: pair k is (row_of[k], month_of[k])
+    lo = np.searchsorted(wanted, np.array(first, dtype=np.int64))
+    hi = np.searchsorted(wanted, np.array(last, dtype=np.int64), side="right")
+    counts = np.maximum(hi - lo, 0)
+    row_of = np.repeat(np.arange(len(terms)), counts)
+    month_of = lo[row_of] + np.arange(len(row_of)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    hours, manual, manual_sum, expense_pct = (np.array(col) for col in zip(*terms))
+    salary = consultants.values_at("salary", np.array(cpos)[row_of], days[month_of])
+    rate = projects.values_at("hourly_rate", np.array(ppos)[row_of], days[month_of])
+    w = weights[month_of]
+    income = hours[row_of] * rate * w
+    cost = salary * (1 + settings["pex_pct"] + settings["expense_pct"]) * w
+    utlegg = utlegg_amount(manual[row_of], expense_pct[row_of], income, manual_sum[row_of])
+    for i, measure in enumerate((income, cost, utlegg, income - cost - utlegg)):
+        out[:, i] = np.bincount(month_of, weights=measure, minlength=len(months))
+    return out
+
+
+def _quarter(month: str) -> str:
+    return f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}"
+
+
+class EbitCube:
+    """Incrementally maintained aggregate; not thread-safe (callers hold a lock)."""
+
+    def __init__(self):
+        self._cells: Dict[Tuple[int, int], Dict[str, np.ndarray]] = {}
+        self._by_consultant: Dict[int, Dict[str, np.ndarray]] = {}
+        self._by_project: Dict[int, Dict[str, np.ndarray]] = {}
+        self._by_month: Dict[str, np.ndarray] = {}
+        self._rows: Dict[int, Tuple[int, int, Dict[str, np.ndarray]]] = {}
+        self._rows_of_consultant: Dict[int, set] = defaultdict(set)
+        self._rows_of_project: Dict[int, set] = defaultdict(set)
+        self._projects_of_consultant: Dict[int, set] = defaultdict(set)
+        self._consultants_of_project: Dict[int, set] = defaultdict(set)
+
+    # ---------- updates ----------
+
+    @staticmethod
+    def _add(target: Dict, key, vec: np.ndarray, sign: float) -> None:
+        cur = target.get(key)
+        cur = sign * vec if cur is None else cur + sign * vec
+        if cur[_COUNT] <= 0.5:
+            target.pop(key, None)
+        else:
+            target[key] = cur
+
+    def _apply(self, cid: int, pid: int, contrib: Dict[str, np.ndarray], sign: float) -> None:
+        cell = self._cells.setdefault((cid, pid), {})
+        per_c = self._by_consultant.setdefault(cid, {})
+        per_p = self._by_project.setdefault(pid, {})
+        for month, vec in contrib.items():
+            self._add(cell, month, vec, sign)
+            self._add(per_c, month, vec, sign)
+            self._add(per_p, month, vec, sign)
+            self._add(self._by_month, month, vec, sign)
+        if not cell:
+            del self._cells[(cid, pid)]
+            self._projects_of_consultant[cid].discard(pid)
+            self._consultants_of_project[pid].discard(cid)
+        else:
+            self._projects_of_consultant[cid].add(pid)
+            self._consultants_of_project[pid].add(cid)
+        if not per_c:
+            del self._by_consultant[cid]
+        if not per_p:
+            del self._by_project[pid]
+
+    def remove_row(self, row_id: int) -> None:
+        old = self._rows.pop(row_id, None)
+        if old is None:
+            return
+        cid, pid, contrib = old
+        self._apply(cid, pid, contrib, -1.0)
+        self._rows_of_consultant[cid].discard(row_id)
+        self._rows_of_project[pid].discard(row_id)
+
+    def upsert_row(self, row_id: int, consultant_id: int, project_id: int,
+                   contrib: Dict[str, np.ndarray]) -> None:
+        self.remove_row(row_id)
+        self._rows[row_id] = (consultant_id, project_id, contrib)
+        self._rows_of_consultant[consultant_id].add(row_id)
+        self._rows_of_project[project_id].add(row_id)
+        self._apply(consultant_id, project_id, contrib, 1.0)
+
+    def rows_for(self, consultant_ids: Iterable[int] = (), project_ids: Iterable[int] = ()) -> set:
+        out = set()
+        for cid in consultant_ids:
+            out |= self._rows_of_consultant.get(cid, set())
+        for pid in project_ids:
+            out |= self._rows_of_project.get(pid, set())
+        return out
+
+    # ---------- queries ----------
+
+    def _source(self, group_by: str, consultant_ids: Optional[List[int]],
+                project_ids: Optional[List[int]]) -> Iterator[Tuple[object, str, np.ndarray]]:
+        """Yield (group key, month, vector) from the narrowest maintained rollup."""
+        if consultant_ids is not None and project_ids is not None:
+            pairs = [(c, p) for c in consultant_ids for p in project_ids]
+        elif consultant_ids is not None and group_by == "project":
+            pairs = [(c, p) for c in consultant_ids
+                     for p in self._projects_of_consultant.get(c, ())]
+        elif project_ids is not None and group_by == "consultant":
+            pairs = [(c, p) for p in project_ids
+                     for c in self._consultants_of_project.get(p, ())]
+        elif consultant_ids is not None:
+            for c in consultant_ids:
+                for month, vec in self._by_consultant.get(c, {}).items():
+                    yield c, month, vec
+            return
+        elif project_ids is not None:
+            for p in project_ids:
+                for month, vec in self._by_project.get(p, {}).items():
+                    yield p, month, vec
+            return
+        elif group_by == "consultant":
+            for c, months in self._by_consultant.items():
+                for month, vec in months.items():
+                    yield c, month, vec
+            return
+        elif group_by == "project":
+            for p, months in self._by_project.items():
+                for month, vec in months.items():
+                    yield p, month, vec
+            return
+        else:
+            for month, vec in self._by_month.items():
+                yield None, month, vec
+            return
+
+        for c, p in pairs:
+            for month, vec in self._cells.get((c, p), {}).items():
+                yield (c if group_by == "consultant" else p), month, vec
+
+    def cells(self) -> Dict[str, object]:
+        """All consultant x project x month cells as sorted columns (for export)."""
+        keys = sorted((c, p, m) for (c, p), months in self._cells.items() for m in months)
+        values = np.array([self._cells[(c, p)][m][:_COUNT] for c, p, m in keys],
+                          dtype=float).reshape(len(keys), len(MEASURES))
+        out: Dict[str, object] = {
+            "consultant_id": np.array([k[0] for k in keys], dtype=np.int64),
+            "project_id": np.array([k[1] for k in keys], dtype=np.int64),
+            "month": [k[2] for k in keys],
+        }
+        out.update({m: values[:, i] for i, m in enumerate(MEASURES)})
+        return out
+
+    def query(self, group_by: str = "month", consultant_ids: Optional[List[int]] = None,
+              project_ids: Optional[List[int]] = None, start: Optional[str] = None,
+              end: Optional[str] = None, ytd: bool = False) -> List[dict]:
+        """Roll up the cube.
+
+        group_by: "month" | "quarter" | "consultant" | "project". `start`/`end`
+        are inclusive "YYYY-MM" bounds. With `ytd`, month/quarter rows also get
+        cumulative `<measure>_ytd` values that restart every year; they count
+        from January even when `start` is later in the year.
+        """
+        ytd = ytd and group_by in ("month", "quarter")
+        groups: Dict[object, np.ndarray] = {}
+        # Months between January and `start` of start's year, for the YTD values
+        lead = np.zeros(len(MEASURES))
+        for key, month, vec in self._source(group_by, consultant_ids, project_ids):
+            if ytd and start and start[:4] + "-01" <= month < start:
+                lead = lead + vec[:_COUNT]
+                continue
+            if (start and month < start) or (end and month > end):
+                continue
+            if group_by == "month":
+                key = month
+            elif group_by == "quarter":
+                key = _quarter(month)
+            cur = groups.get(key)
+            groups[key] = vec.copy() if cur is None else cur + vec
+
+        key_name = {"month": "month", "quarter": "quarter",
+                    "consultant": "consultant_id", "project": "project_id"}[group_by]
+        out = []
+        running = np.zeros(len(MEASURES))
+        year = None
+        for key in sorted(groups):
+            vec = groups[key][:_COUNT]
+            item = {key_name: key}
+            item.update(zip(MEASURES, vec.tolist()))
+            if ytd:
+                if key[:4] != year:
+                    year = key[:4]
+                    running = lead if start and year == start[:4] else np.zeros(len(MEASURES))
+                running = running + vec
+                item.update(
+                    {f"{m}_ytd": v for m, v in zip(MEASURES, running.tolist())})
+            out.append(item)
+        return out
@@ -1,53 +1,93 @@
-
 # backend/data_access.py
+"""File storage shared by the API (backend.main), department partitions,
+the batch CLI and scripts.
+
+The data directory is passed explicitly or taken from EBIT_DATA_DIR (default
+``data`` relative to the working directory, /app/data in the container), so
+tests and parallel test workers can each use their own directory.
+
+Collections are JSON objects ``{"last_id", "items", "version"}``; settings is
+a flat object. Writes go to a temporary file and are renamed into place, so a
+reader never sees a half-written file.
+"""
 from __future__ import annotations
+
 import json
+import os
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Dict, List, Optional, Union
 
-# Resolve project root (…/ebit-app)
-ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_SETTINGS = {"pex_pct": 0.32, "expense_pct": 0.40, "yearly_work_hours": 1625}
+COLLECTIONS = ("consultants", "projects", "scenario")
 
-# Data directory: …/ebit-app/data
-DATA_DIR = ROOT / "data"
+PathLike = Union[str, Path]
 
-CONSULTANTS_FILE = DATA_DIR / "consultants.json"
-PROJECTS_FILE = DATA_DIR / "projects.json"
-SETTINGS_FILE = DATA_DIR / "settings.json"
 
+def default_data_dir() -> str:
+    return os.getenv("EBIT_DATA_DIR", "data")
 
-def _load_json(path: Path) -> Any:
-    if not path.exists():
-        # Deterministic defaults (important for tests)
-        if path.stem in {"consultants", "projects"}:
-            return []
-        return {}
 
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+class DataStore:
+    """The JSON files of one data directory."""
 
+    def __init__(self, data_dir: Optional[PathLike] = None):
+        self.data_dir = str(data_dir if data_dir is not None else default_data_dir())
+        self.files = {name: os.path.join(self.data_dir, f"{name}.json")
+                      for name in (*COLLECTIONS, "settings")}
+        self.snapshot_file = os.path.join(self.data_dir, "snapshot.bin")
+        self.departments_dir = os.path.join(self.data_dir, "departments")
 
-def load_consultants() -> List[Dict[str, Any]]:
-    data = _load_json(CONSULTANTS_FILE)
-    if not isinstance(data, list):
-        raise ValueError("consultants.json must contain a list")
-    return data
+    def ensure(self, settings: Optional[dict] = None) -> None:
+        """Create the directory and any missing file with empty/default content."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        for name in COLLECTIONS:
+            if not os.path.exists(self.files[name]):
+                self.save(name, {"last_id": 0, "items": []})
+        if not os.path.exists(self.files["settings"]):
+            self.save("settings", {**DEFAULT_SETTINGS, **(settings or {})})
 
+    def load(self, collection: str) -> Any:
+        with open(self.files[collection], "r", encoding="utf-8") as f:
+            return json.load(f)
 
-def load_projects() -> List[Dict[str, Any]]:
-    data = _load_json(PROJECTS_FILE)
-    if not isinstance(data, list):
-        raise ValueError("projects.json must contain a list")
-    return data
+    def save(self, collection: str, data: dict) -> None:
+        path = self.files[collection]
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
 
+    def items(self, collection: str) -> List[Dict[str, Any]]:
+        """Records of a collection; [] if the file doesn't exist. Also reads
+        older list-shaped files."""
+        if not os.path.exists(self.files[collection]):
+            return []
+        data = self.load(collection)
+        if isinstance(data, dict):
+            data = data.get("items", [])
+        if not isinstance(data, list):
+            raise ValueError(f"{collection}.json must contain a list of items")
+        return data
 
-def load_settings() -> Dict[str, Any]:
-    data = _load_json(SETTINGS_FILE)
-    if not isinstance(data, dict):
-        raise ValueError("settings.json must contain an object")
-    return data
+    def settings(self) -> Dict[str, Any]:
+        """Stored settings over the defaults."""
+        settings = dict(DEFAULT_SETTINGS)
+        if os.path.exists(self.files["settings"]):
+            data = self.load("settings")
+            if not isinstance(data, dict):
+                raise ValueError("settings.json must contain an object")
+            settings.update(data)
+        return settings
+
+
+def load_consultants(data_dir: Optional[PathLike] = None) -> List[Dict[str, Any]]:
+    return DataStore(data_dir).items("consultants")
+
+
+def load_projects(data_dir: Optional[PathLike] = None) -> List[Dict[str, Any]]:
+    return DataStore(data_dir).items("projects")
 
-from pathlib import Path
 
-ROOT = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT / "data"
+def load_settings(data_dir: Optional[PathLike] = None) -> Dict[str, Any]:
+    return DataStore(data_dir).settings()
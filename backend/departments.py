@@ -0,0 +1,177 @@
+"""Department partitions: one directory per department under data/departments/.
+
+Every department has its own consultants, projects, settings (pex_pct,
+expense_pct, yearly_work_hours) and scenario rows, in its own files behind its
+own lock, so a write in one department never waits on another. The top-level
+endpoints keep serving the original data directory as the "default"
+department. ``company_rollup`` calculates all departments in parallel and
+merges their totals.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.calculations import calculate_assignments, manual_lines
+from backend.data_access import DEFAULT_SETTINGS, DataStore
+from backend.tables import TABLE_COLUMNS, ColumnTable
+
+DEFAULT_DEPARTMENT = "default"
+TOTALS = ("income", "cost", "utlegg", "ebit")
+
+_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+
+def valid_name(name: str) -> bool:
+    """Lowercase slug usable as a directory name; "default" is reserved."""
+    return bool(_NAME.match(name)) and name != DEFAULT_DEPARTMENT
+
+
+class DepartmentStore:
+    """One department's files, lock and cached column tables."""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.files = DataStore(path)
+        # Guards this department's files only
+        self.lock = threading.Lock()
+        self._cache: Dict[str, tuple] = {}
+
+    def create(self, settings: Optional[dict] = None) -> None:
+        self.files.ensure(settings)
+
+    def load(self, collection: str) -> dict:
+        return self.files.load(collection)
+
+    def commit(self, collection: str, data: dict) -> int:
+        """Save a changed collection and bump its version. Caller holds self.lock."""
+        data["version"] = data.get("version", 0) + 1
+        self.files.save(collection, data)
+        self._cache.pop(collection, None)
+        return data["version"]
+
+    def _cached(self, collection: str, build):
+        # Rebuilt when the file changed (another worker), like main._table
+        st = os.stat(self.files.files[collection])
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._cache.get(collection)
+        if cached is None or cached[0] != key:
+            cached = self._cache[collection] = (key, build(self.load(collection)))
+        return cached[1]
+
+    def table(self, collection: str) -> ColumnTable:
+        return self._cached(collection, lambda data: ColumnTable.from_records(
+            data["items"], TABLE_COLUMNS[collection]))
+
+    def settings(self) -> dict:
+        return self._cached("settings", lambda data: {
+            k: data.get(k, v) for k, v in DEFAULT_SETTINGS.items()})
+
+    def snapshot(self) -> Tuple[ColumnTable, ColumnTable, dict, List[dict]]:
+        """Consistent (consultants, projects, settings, scenario rows) for a calculation."""
+        with self.lock:
+            return (self.table("consultants"), self.table("projects"), self.settings(),
+                    self.load("scenario")["items"])
+
+
+class Departments:
+    """Registry of the partitions under `root` (one subdirectory each)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._stores: Dict[str, DepartmentStore] = {}
+        # Guards the registry dict only, never held during file I/O
+        self._lock = threading.Lock()
+
+    def _store(self, name: str) -> DepartmentStore:
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None:
+                store = self._stores[name] = DepartmentStore(
+                    name, os.path.join(self.root, name))
+            return store
+
+    def names(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root)
+                      if valid_name(n) and os.path.isdir(os.path.join(self.root, n)))
+
+    def get(self, name: str) -> Optional[DepartmentStore]:
+        if not valid_name(name) or not os.path.isdir(os.path.join(self.root, name)):
+            return None
+        return self._store(name)
+
+    def create(self, name: str, settings: Optional[dict] = None) -> DepartmentStore:
+        """New partition; FileExistsError if it exists, ValueError on a bad name."""
+        if not valid_name(name):
+            raise ValueError(name)
+        store = self._store(name)
+        with store.lock:
+            if os.path.isdir(store.path):
+                raise FileExistsError(name)
+            store.create(settings)
+        return store
+
+
+def scenario_columns(rows: List[dict], consultants: ColumnTable, projects: ColumnTable
+                     ) -> Tuple[List[dict], dict]:
+    """Assignment columns for stored scenario rows, sorted by id. Rows of
+    deleted consultants/projects are skipped. Returns (rows used, columns)."""
+    rows = [r for r in sorted(rows, key=lambda x: x["id"])
+            if consultants.position(r["consultant_id"]) is not None
+            and projects.position(r["project_id"]) is not None]
+    cols = {
+        "consultant_id": np.array([r["consultant_id"] for r in rows], dtype=np.int64),
+        "project_id": np.array([r["project_id"] for r in rows], dtype=np.int64),
+        "utilization": np.array([r["utilization"] for r in rows], dtype=float),
+        "project_percent": np.array([r["project_percent"] for r in rows], dtype=float),
+        "utlegg_mode": [r.get("utlegg_mode") or "Prosent" for r in rows],
+        "expense_pct": np.array([r.get("expense_pct") or 0.0 for r in rows], dtype=float),
+        **manual_lines(rows),
+    }
+    return rows, cols
+
+
+def scenario_ebit(consultants: ColumnTable, projects: ColumnTable, settings: dict,
+                  rows: List[dict], as_of: int, cost_mode: str = "row") -> dict:
+    """/calculate-ebit over a department's stored scenario rows, with salaries
+    and rates in effect on day `as_of` (backend.tables.to_days)."""
+    rows, cols = scenario_columns(rows, consultants, projects)
+    cols["as_of"] = np.full(len(rows), as_of, dtype=np.int64)
+    settings_used = {k: settings[k] for k in DEFAULT_SETTINGS}
+    return calculate_assignments(cols, consultants, projects, settings_used, cost_mode)
+
+
+def company_rollup(sources: Dict[str, Callable[[], dict]], max_workers: int) -> dict:
+    """Run every department's calculation (name -> callable returning a
+    /calculate-ebit result) in a thread pool and merge the department totals."""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as pool:
+        futures = {name: pool.submit(fn) for name, fn in sources.items()}
+        results = {name: f.result() for name, f in futures.items()}
+
+    company = {k: 0.0 for k in TOTALS}
+    by_type: Dict[str, float] = {}
+    departments = []
+    for name in sorted(results):
+        result = results[name]
+        dept = result["department"]
+        for k in TOTALS:
+            company[k] += dept[k]
+        for kind, amount in dept.get("utlegg_by_type", {}).items():
+            by_type[kind] = by_type.get(kind, 0.0) + amount
+        departments.append({
+            "department": name,
+            "settings_used": result["settings_used"],
+            "rows": len(result["results"]["consultant_id"]),
+            **{k: dept[k] for k in TOTALS},
+        })
+    company["utlegg_by_type"] = by_type
+    company["margin"] = company["ebit"] / company["income"] if company["income"] else None
+    return {"departments": departments, "company": company}
@@ -0,0 +1,74 @@
+"""In-process change bus behind the /events server-sent-events stream.
+
+Endpoints publish from worker threads while SSE subscribers live on the event
+loop, so events are handed over with ``loop.call_soon_threadsafe``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Set, Tuple
+
+# Slow/broken subscribers are dropped instead of buffering without bound
+MAX_QUEUED_EVENTS = 1000
+
+
+class ChangeBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    def publish(self, collection: str, version: int, **extra) -> dict:
+        with self._lock:
+            self._seq += 1
+            event = {"seq": self._seq, "collection": collection,
+                     "version": version, **extra}
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Loop already closed
+                self._discard(loop, queue)
+        return event
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Tell the client to resync instead of silently losing events
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"seq": event["seq"], "collection": "*", "resync": True})
+
+    def _discard(self, loop, queue) -> None:
+        with self._lock:
+            self._subscribers.discard((loop, queue))
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+        with self._lock:
+            self._subscribers.add((loop, queue))
+        try:
+            yield queue
+        finally:
+            self._discard(loop, queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def sse_message(event: str, data: Dict, event_id=None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,161 @@
+"""Parquet / Arrow IPC export and import of master data and calculation results.
+
+Tables:
+
+    consultants, projects, settings, scenario   stored data
+    results                                     /calculate-ebit rows for the scenario
+    trends                                      consultant x project x month series
+
+Only consultants, projects and settings can be imported. Conversion is done a
+column at a time (Arrow <-> NumPy); no per-row JSON round-trip. pyarrow is an
+optional dependency. Consultants and projects carry their salary/hourly rate
+versions in a ``salary_history`` / ``hourly_rate_history`` list column, so an
+export -> import round trip keeps effective-dated changes.
+
+CLI (works directly on the data directory; use POST /import/... while the
+backend is running so its caches and change events stay in sync):
+
+    python -m backend.export export --out dump/ --format parquet
+    python -m backend.export import dump/consultants.parquet --table consultants
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.formats import UnsupportedFormat, _pyarrow
+
+# format -> (media type, file suffix)
+FILE_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", ".arrow"),
+}
+
+EXPORT_TABLES = ("consultants", "projects", "settings", "scenario", "results", "trends")
+IMPORT_TABLES = ("consultants", "projects", "settings")
+
+_PARQUET_MAGIC = b"PAR1"
+_ARROW_FILE_MAGIC = b"ARROW1"
+
+
+def table_from_columns(columns: Dict[str, Any]):
+    pa = _pyarrow()
+    return pa.table({k: v if isinstance(v, (np.ndarray, pa.Array)) else list(v)
+                     for k, v in columns.items()})
+
+
+def history_column(histories: Sequence[Optional[list]], field: str):
+    """Effective-dated versions per row (``<field>_history`` records, None
+    for rows without) as a list<struct<effective_from, field>> column."""
+    pa = _pyarrow()
+    version = pa.struct([("effective_from", pa.string()), (field, pa.float64())])
+    return pa.array(list(histories), type=pa.list_(version))
+
+
+def history_lists(table, name: str) -> Optional[List[Optional[list]]]:
+    """The versions of a history column per row; None if the table has no such column."""
+    if name not in table.column_names:
+        return None
+    return table.column(name).to_pylist()
+
+
+def table_from_rows(rows: List[dict], fields: Optional[Sequence[str]] = None):
+    """Rows (JSON records) -> Arrow table; `fields` fixes the column order for empty tables."""
+    pa = _pyarrow()
+    if fields is None:
+        return pa.Table.from_pylist(rows)
+    return pa.table({f: [r.get(f) for r in rows] for f in fields})
+
+
+def write_table(table, fmt: str) -> bytes:
+    if fmt not in FILE_FORMATS:
+        raise UnsupportedFormat(f"Ukjent filformat: {fmt}")
+    pa = _pyarrow()
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def read_table(raw: bytes):
+    """Parquet, Arrow IPC file or Arrow IPC stream -> Arrow table (sniffed from the bytes)."""
+    pa = _pyarrow()
+    buf = pa.py_buffer(raw)
+    if raw[:4] == _PARQUET_MAGIC:
+        import pyarrow.parquet as pq
+        return pq.read_table(pa.BufferReader(buf))
+    if raw[:6] == _ARROW_FILE_MAGIC:
+        return pa.ipc.open_file(buf).read_all()
+    return pa.ipc.open_stream(buf).read_all()
+
+
+def table_columns(table) -> Dict[str, Any]:
+    """Arrow table -> {name: NumPy array} (strings come back as object arrays)."""
+    return {name: table.column(name).to_numpy(zero_copy_only=False)
+            for name in table.column_names}
+
+
+def _cli_export(args) -> int:
+    from backend import main as backend
+
+    backend.init_data()
+    os.makedirs(args.out, exist_ok=True)
+    suffix = FILE_FORMATS[args.format][1]
+    for name in args.tables or EXPORT_TABLES:
+        table = backend.export_table(name)
+        path = os.path.join(args.out, name + suffix)
+        with open(path, "wb") as f:
+            f.write(write_table(table, args.format))
+        print(f"{name}: {table.num_rows} rader -> {path}")
+    return 0
+
+
+def _cli_import(args) -> int:
+    from backend import main as backend
+
+    backend.init_data()
+    table = args.table or os.path.splitext(os.path.basename(args.file))[0]
+    with open(args.file, "rb") as f:
+        raw = f.read()
+    result = backend.import_table(table, read_table(raw), mode=args.mode)
+    print(f"{table}: {result['imported']} rader importert ({args.mode})")
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.export", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="skriv tabeller til Parquet/Arrow-filer")
+    exp.add_argument("--out", default="export")
+    exp.add_argument("--format", choices=sorted(FILE_FORMATS), default="parquet")
+    exp.add_argument("--tables", nargs="*", choices=EXPORT_TABLES)
+    exp.set_defaults(func=_cli_export)
+
+    imp = sub.add_parser("import", help="les en Parquet/Arrow-fil inn i en tabell")
+    imp.add_argument("file")
+    imp.add_argument("--table", choices=IMPORT_TABLES,
+                     help="standard: filnavnet uten endelse")
+    imp.add_argument("--mode", choices=("replace", "append"), default="replace")
+    imp.set_defaults(func=_cli_import)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        # HTTPException (unknown id, validation) carries the message in .detail
+        print(f"Feil: {getattr(e, 'detail', None) or e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
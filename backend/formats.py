@@ -0,0 +1,281 @@
+"""Content negotiation for bulk and calculation payloads.
+
+Besides plain JSON (a list of objects) the bulk and calculate endpoints accept
+and return a columnar shape, where the list field is replaced by parallel arrays
+per field, encoded as JSON, MessagePack or Arrow IPC:
+
+    application/json                        {"items": [{"name": ..}, ..]}
+    application/msgpack                     same, MessagePack encoded
+    application/vnd.ebit.columnar+json      {"items": {"name": [..], "salary": [..]}}
+    application/vnd.ebit.columnar+msgpack   same, MessagePack encoded
+    application/vnd.apache.arrow.stream     the list field as an Arrow table; the
+                                            other fields as JSON in schema metadata
+
+Columnar payloads are validated one column at a time with NumPy instead of one
+pydantic model per object. msgpack, pyarrow and orjson are optional
+dependencies; without orjson JSON falls back to the standard library.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional
+    orjson = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.ebit.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.ebit.columnar+msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# media type -> (columnar, encoding)
+_MEDIA_TYPES = {
+    JSON: (False, "json"),
+    MSGPACK: (False, "msgpack"),
+    "application/x-msgpack": (False, "msgpack"),
+    COLUMNAR_JSON: (True, "json"),
+    COLUMNAR_MSGPACK: (True, "msgpack"),
+    ARROW: (True, "arrow"),
+}
+
+# Arrow schema metadata key holding the non-list fields
+ARROW_PARAMS_KEY = b"params"
+
+
+class UnsupportedFormat(ValueError):
+    """Media type we (or the installed optional packages) can't handle."""
+
+
+class ColumnError(ValueError):
+    """Columnar payload that fails validation."""
+
+
+def _media_type(header: Optional[str]) -> str:
+    return (header or JSON).split(";")[0].strip().lower()
+
+
+def request_format(content_type: Optional[str]) -> Tuple[bool, str]:
+    """(columnar, encoding) for a request Content-Type."""
+    media = _media_type(content_type)
+    if media not in _MEDIA_TYPES:
+        raise UnsupportedFormat(f"Ukjent Content-Type: {media}")
+    return _MEDIA_TYPES[media]
+
+
+def response_format(accept: Optional[str]) -> Tuple[bool, str, str]:
+    """(columnar, encoding, media type) for the first supported Accept entry."""
+    for part in (accept or JSON).split(","):
+        media = _media_type(part)
+        if media in ("*/*", "application/*"):
+            media = JSON
+        if media in _MEDIA_TYPES:
+            return (*_MEDIA_TYPES[media], media)
+    raise UnsupportedFormat(f"Ingen støttet Accept-type i: {accept}")
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise UnsupportedFormat("MessagePack krever pakken 'msgpack'")
+    return msgpack
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise UnsupportedFormat("Arrow krever pakken 'pyarrow'")
+    return pyarrow
+
+
+def decode(raw: bytes, content_type: Optional[str], list_field: str) -> Tuple[bool, Dict[str, Any]]:
+    """Decode a request body. Returns (columnar, payload) with JSON-like shape."""
+    columnar, encoding = request_format(content_type)
+    try:
+        if encoding == "json":
+            payload = json.loads(raw or b"null")
+        elif encoding == "msgpack":
+            payload = _msgpack().unpackb(raw, raw=False)
+        else:
+            pa = _pyarrow()
+            table = pa.ipc.open_stream(raw).read_all()
+            meta = (table.schema.metadata or {}).get(ARROW_PARAMS_KEY, b"{}")
+            payload = json.loads(meta)
+            payload[list_field] = {
+                name: table.column(name).to_numpy(zero_copy_only=False)
+                for name in table.column_names
+            }
+    except UnsupportedFormat:
+        raise
+    except Exception as e:
+        raise ColumnError(f"Kunne ikke lese forespørselen: {e}")
+    if not isinstance(payload, dict):
+        raise ColumnError("Forventet et objekt i forespørselen")
+    return columnar, payload
+
+
+def dumps_json(payload: Any) -> bytes:
+    """JSON bytes for plain data (dicts, lists, numbers, strings, NumPy arrays)."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_plain(payload), ensure_ascii=False).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response that skips FastAPI's jsonable_encoder.
+
+    Return it directly from endpoints whose data is already plain (JSON file
+    records, NumPy results); it is rendered once with orjson.
+    """
+    media_type = JSON
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+def _plain(value):
+    # NumPy scalars/arrays -> JSON/msgpack-friendly Python values
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def encode(payload: Dict[str, Any], encoding: str, list_field: Optional[str] = None) -> bytes:
+    """Encode a response. For Arrow, `list_field` (columns) becomes the table."""
+    if encoding == "json":
+        return dumps_json(payload)
+    if encoding == "msgpack":
+        return _msgpack().packb(_plain(payload), use_bin_type=True)
+    pa = _pyarrow()
+    if list_field is None:
+        columns, params = payload, {}
+    else:
+        columns = payload[list_field]
+        params = {k: v for k, v in payload.items() if k != list_field}
+    table = pa.table({k: np.asarray(v) if isinstance(v, np.ndarray) else v
+                      for k, v in columns.items()})
+    table = table.replace_schema_metadata(
+        {ARROW_PARAMS_KEY: json.dumps(_plain(params)).encode("utf-8")})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def rows_to_columns(rows, fields) -> Dict[str, list]:
+    return {f: [r.get(f) for r in rows] for f in fields}
+
+
+# ------------------------------
+# Kolonnevalidering
+# ------------------------------
+
+
+@dataclass(frozen=True)
+class Column:
+    kind: str  # "str" | "float" | "int"
+    required: bool = True
+    default: Any = None
+    ge: Optional[float] = None
+    le: Optional[float] = None
+    # Float columns only: null/NaN is kept as NaN ("not set")
+    nullable: bool = False
+
+
+CONSULTANT_COLUMNS = {
+    "name": Column("str"),
+    "salary": Column("float", ge=0),
+    "default_utilization": Column("float", required=False, default=0.8, ge=0, le=1),
+}
+
+PROJECT_COLUMNS = {
+    "name": Column("str"),
+    "hourly_rate": Column("float", ge=0),
+}
+
+ASSIGNMENT_COLUMNS = {
+    "row_index": Column("int", required=False),
+    "consultant_id": Column("int"),
+    "project_id": Column("int"),
+    "utilization": Column("float", ge=0, le=1),
+    "project_percent": Column("float", ge=0, le=1),
+    "consultant_work_pct": Column("float", required=False, default=1.0, ge=0, le=1),
+    "utlegg_mode": Column("str", required=False, default="Prosent"),
+    # Missing/null: no percentage utlegg (the setting is part of the cost)
+    "expense_pct": Column("float", required=False, nullable=True, ge=0),
+    # Sum of the manual line items (utlegg_mode "Manuelt"); counted as type "Annet"
+    "manual_expense_total": Column("float", required=False, default=0.0, ge=0),
+}
+
+
+def validate_columns(columns: Any, spec: Dict[str, Column]) -> Dict[str, Any]:
+    """Validate parallel arrays against `spec`, one vectorized check per column.
+
+    Returns NumPy arrays for numeric columns and lists for strings. Unknown
+    columns are ignored, like extra fields on the pydantic models.
+    """
+    if not isinstance(columns, dict):
+        raise ColumnError("Forventet kolonner som objekt med lister")
+    for name, values in columns.items():
+        if name in spec and values is not None and not (
+                isinstance(values, (list, tuple))
+                or (isinstance(values, np.ndarray) and values.ndim == 1)):
+            raise ColumnError(f"Kolonne '{name}' må være en liste")
+    lengths = {len(v) for k, v in columns.items() if k in spec and v is not None}
+    if len(lengths) > 1:
+        raise ColumnError("Alle kolonner må ha samme lengde")
+    n = lengths.pop() if lengths else 0
+
+    out: Dict[str, Any] = {}
+    for name, col in spec.items():
+        values = columns.get(name)
+        if values is None:
+            if col.required:
+                raise ColumnError(f"Mangler kolonne '{name}'")
+            if col.default is None:
+                continue
+            values = [col.default] * n
+
+        if col.kind == "str":
+            values = list(values.tolist() if isinstance(values, np.ndarray) else values)
+            if not all(isinstance(v, str) for v in values):
+                raise ColumnError(f"Kolonne '{name}' må inneholde tekst")
+            out[name] = values
+            continue
+
+        try:
+            arr = np.asarray(values, dtype=float)
+        except (TypeError, ValueError):
+            raise ColumnError(f"Kolonne '{name}' må være numerisk")
+        if arr.ndim != 1 or (not col.nullable and np.isnan(arr).any()):
+            raise ColumnError(f"Kolonne '{name}' har manglende eller ugyldige verdier")
+        if col.kind == "int":
+            if (arr != np.round(arr)).any():
+                raise ColumnError(f"Kolonne '{name}' må være heltall")
+            arr = arr.astype(np.int64)
+        bad = np.zeros(n, dtype=bool)
+        if col.ge is not None:
+            bad |= arr < col.ge
+        if col.le is not None:
+            bad |= arr > col.le
+        if bad.any():
+            first = int(np.flatnonzero(bad)[0])
+            raise ColumnError(
+                f"Kolonne '{name}' rad {first}: {arr[first]} utenfor [{col.ge}, {col.le}]")
+        out[name] = arr
+    return out
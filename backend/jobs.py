@@ -0,0 +1,158 @@
+"""In-process background jobs: bounded worker pool, progress, cancellation and
+results kept for a TTL.
+
+A job function gets the Job as first argument and calls ``job.report(progress)``
+now and then; ``report`` raises JobCancelled once cancellation is requested, so
+cancelling is cooperative. Finished jobs (done/failed/cancelled) are purged
+``ttl`` seconds after they finish.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    """Too many queued/running jobs; the caller should retry later."""
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message: Optional[str] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, progress: float, message: Optional[str] = None) -> None:
+        """Update progress (0..1); raises JobCancelled if the job was cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        out = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if include_result and self.status == DONE:
+            out["result"] = self.result
+        return out
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, ttl: float = 900.0):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ebit-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        job = Job(kind)
+        with self._lock:
+            self._purge()
+            active = sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+            if active >= self.max_pending:
+                raise JobQueueFull(f"{active} jobber i kø")
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs) -> None:
+        with self._lock:
+            # Cancelled while queued: already finished by _request_cancel
+            if job.cancel_requested:
+                return
+            job.status = RUNNING
+            job.started = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = getattr(e, "detail", None) or str(e) or type(e).__name__
+            self._finish(job, FAILED)
+        else:
+            job.result = result
+            job.progress = 1.0
+            self._finish(job, DONE)
+
+    @staticmethod
+    def _finish(job: Job, status: str) -> None:
+        job.finished = time.time()
+        job.status = status
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            self._purge()
+            return sorted(self._jobs.values(), key=lambda j: j.created)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Request cancellation; queued jobs are cancelled at once and never
+        start, running jobs stop at their next report()."""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._request_cancel(job)
+        return job
+
+    def _request_cancel(self, job: Job) -> None:
+        # Caller holds self._lock, so a queued job can't start in between
+        if job.status in FINISHED:
+            return
+        job._cancel.set()
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED)
+
+    def _purge(self) -> None:
+        # Caller holds self._lock
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.status in FINISHED and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def cancel_all(self) -> None:
+        """Cancel every unfinished job (on shutdown, so workers exit quickly)."""
+        with self._lock:
+            for job in self._jobs.values():
+                self._request_cancel(job)
@@ -1,59 +1,218 @@
 
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Literal, Optional
 import json
 import os
 import threading
 import random
+import datetime
+import asyncio
+import time
+import hashlib
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+from backend.admission import (AdmissionMiddleware, Gate, Overloaded, admitted,
+                               overloaded_response, rule)
+from backend.capacity import find_overallocations
+from backend.compression import CompressionMiddleware
+from backend.changelog import ChangeLog
+from backend.data_access import DataStore
+from backend.departments import (DEFAULT_DEPARTMENT, Departments, company_rollup,
+                                 scenario_columns, scenario_ebit)
+from backend.cube import MEASURES, EbitCube, row_contributions_at, trend_totals
+from backend.events import ChangeBus, sse_message
+from backend.jobs import Job, JobManager, JobQueueFull
+from backend.singleflight import SingleFlight
+from backend.snapshot import write_snapshot
+from backend.tables import TABLE_COLUMNS, ColumnTable, to_days
+from backend import formats
+from backend.formats import FastJSONResponse
+from backend.export import (EXPORT_TABLES, FILE_FORMATS, IMPORT_TABLES, history_column,
+                            history_lists, read_table, table_columns, table_from_columns,
+                            table_from_rows, write_table)
+from backend.optimizer import optimize_staffing
+from backend.calculations import (
+    UnknownId,
+    allocate_cost,
+    calculate_assignments,
+    group_sum,
+    join_assignments,
+    loaded_cost,
+    required_rate,
+    required_utilization,
+    manual_lines,
+    resolve_settings,
+    supported_headcount,
+    utlegg_terms,
+)
 
 # ------------------------------
 # FIL-LAGRING
 # ------------------------------
-DATA_DIR = "data"
-CONSULTANTS_FILE = os.path.join(DATA_DIR, "consultants.json")
-PROJECTS_FILE = os.path.join(DATA_DIR, "projects.json")
-SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
+# Data directory from EBIT_DATA_DIR (default ./data); see configure()
+_store = DataStore()
 _lock = threading.Lock()
 
 
-def _ensure_data():
-    os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(CONSULTANTS_FILE):
-        with open(CONSULTANTS_FILE, "w", encoding="utf-8") as f:
-            json.dump({"last_id": 0, "items": []}, f,
-                      ensure_ascii=False, indent=2)
-    if not os.path.exists(PROJECTS_FILE):
-        with open(PROJECTS_FILE, "w", encoding="utf-8") as f:
-            json.dump({"last_id": 0, "items": []}, f,
-                      ensure_ascii=False, indent=2)
-    if not os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump({
-                "pex_pct": 0.32,
-                "expense_pct": 0.40,
-                "yearly_work_hours": 1625
-            }, f, ensure_ascii=False, indent=2)
+def _load(collection: str) -> dict:
+    return _store.load(collection)
+
+
+_versions: dict = {}
+_bus = ChangeBus()
+_changes = ChangeLog()
+
+
+def _current_versions() -> dict:
+    # Versions live in the data files (survive restarts), cached in memory
+    if not _versions:
+        for name in _store.files:
+            _versions[name] = _load(name).get("version", 0)
+    return _versions
+
+
+def _commit(collection: str, data: dict, upserts=(), deletes=(), reset=False) -> int:
+    """Save a changed collection, bump its version, record the changed
+    records and publish a change event.
+
+    `reset` marks a wholesale replacement: clients must take a new snapshot.
+    Caller holds _lock.
+    """
+    version = _current_versions()[collection] + 1
+    data["version"] = version
+    _store.save(collection, data)
+    if collection in TABLE_COLUMNS:
+        _tables[collection] = (_file_key(_store.files[collection]), ColumnTable.from_records(
+            data["items"], TABLE_COLUMNS[collection]))
+    _versions[collection] = version
+    if reset:
+        _changes.reset(collection, version)
+    else:
+        _changes.record(collection, version, upserts, deletes)
+    if collection in _SNAPSHOT_COLLECTIONS:
+        _write_snapshot()
+    _bus.publish(collection, version)
+    return version
+
+
+_SNAPSHOT_COLLECTIONS = ("consultants", "projects", "settings")
+_tables: dict = {}
 
 
-def _load(path: str) -> dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def _file_key(path: str):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
 
 
-def _save(path: str, data: dict):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def _table(collection: str) -> ColumnTable:
+    """Columnar copy of consultants/projects (backend/tables.py).
 
+    Replaced by _commit on every write; rebuilt if the file changed on disk
+    behind our back (another worker, the export CLI).
+    """
+    key = _file_key(_store.files[collection])
+    cached = _tables.get(collection)
+    if cached is None or cached[0] != key:
+        table = ColumnTable.from_records(
+            _load(collection)["items"], TABLE_COLUMNS[collection])
+        cached = _tables[collection] = (key, table)
+    return cached[1]
 
-_ensure_data()
+
+def _write_snapshot():
+    # Binary mmap-able copy for other processes (backend/snapshot.py); caller holds _lock
+    write_snapshot(_store.snapshot_file, _table("consultants"), _table("projects"),
+                   _load("settings"), _current_versions())
+
+
+_ready = threading.Event()
+_startup_seconds: Optional[float] = None
+
+
+def configure(data_dir=None) -> DataStore:
+    """Point the API at another data directory (default: EBIT_DATA_DIR or
+    ./data) and drop everything cached from the previous one. Used by the
+    tests to give every test its own store; files are created by init_data()
+    or by the caller."""
+    global _store, _changes, _cube, _departments
+    with _lock:
+        _store = DataStore(data_dir)
+        _versions.clear()
+        _tables.clear()
+        _changes = ChangeLog()
+        _cube = None
+        _departments = Departments(_store.departments_dir)
+    return _store
+
+
+def init_data():
+    """Create missing data files and warm the in-memory state (versions,
+    columnar tables, snapshot, cube). Runs once at startup, off the import path."""
+    with _lock:
+        _store.ensure()
+        _current_versions()
+        _write_snapshot()
+        _get_cube()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _startup_seconds
+    started = time.perf_counter()
+    await run_in_threadpool(init_data)
+    _startup_seconds = time.perf_counter() - started
+    _ready.set()
+    yield
+    _jobs.cancel_all()
 
 # ------------------------------
 # APP + CORS
 # ------------------------------
-app = FastAPI(title="EBIT Backend")
+app = FastAPI(title="EBIT Backend", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
+
+# Admission control: expensive routes share a few slots and a short wait
+# queue; beyond that they get 503 + Retry-After at once, so /health and cheap
+# reads keep their threads. Added first, so it sits inside CORS/compression.
+# /calculate-ebit gates only single-flight leaders (see calculate_ebit), so
+# identical concurrent requests still share one computation; large bodies
+# pass the large gate here, before they are read and parsed.
+_CALCULATE_PATHS = r"/(goal-seek|optimize-staffing|departments/[^/]+/calculate-ebit)"
+_BULK_PATHS = r"/((consultants|projects)/bulk|import/[^/]+)"
+_SCENARIO_PATHS = r"/(departments/[^/]+/)?scenario/rows"
+LARGE_BODY_BYTES = int(os.getenv("EBIT_LARGE_BODY_BYTES", str(4 * 1024 * 1024)))
+_ADMISSION_WAIT = float(os.getenv("EBIT_ADMISSION_WAIT_SECONDS", "5"))
+_gates = {
+    "calculate": Gate("calculate", int(os.getenv("EBIT_CALC_CONCURRENCY", "4")),
+                      int(os.getenv("EBIT_CALC_QUEUE", "16")), _ADMISSION_WAIT),
+    "bulk": Gate("bulk", int(os.getenv("EBIT_BULK_CONCURRENCY", "2")),
+                 int(os.getenv("EBIT_BULK_QUEUE", "4")), _ADMISSION_WAIT),
+    # Bodies of EBIT_LARGE_BODY_BYTES or more, on any expensive route
+    "large": Gate("large", int(os.getenv("EBIT_LARGE_CONCURRENCY", "1")),
+                  int(os.getenv("EBIT_LARGE_QUEUE", "2")), _ADMISSION_WAIT),
+}
+app.add_middleware(
+    AdmissionMiddleware,
+    rules=[
+        rule(["POST"], _CALCULATE_PATHS, _gates["calculate"]),
+        rule(["GET"], r"/company/ebit", _gates["calculate"]),
+        rule(["POST"], _BULK_PATHS, _gates["bulk"]),
+        rule(["PUT"], _SCENARIO_PATHS, _gates["bulk"]),
+        rule(["GET"], r"/export/[^/]+", _gates["bulk"]),
+    ],
+    large=[rule(["POST", "PUT"],
+                f"{_CALCULATE_PATHS}|/calculate-ebit|{_BULK_PATHS}|{_SCENARIO_PATHS}",
+                _gates["large"])],
+    large_bytes=LARGE_BODY_BYTES,
+)
 
 # CORS settings - use environment variable for production
 ALLOWED_ORIGINS = os.getenv(
@@ -69,6 +228,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli (Accept-Encoding) for bodies above the threshold
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("EBIT_COMPRESS_MIN_BYTES", "1024")),
+)
+
 # ------------------------------
 # MODELLER
 # ------------------------------
@@ -88,6 +253,8 @@ class ConsultantUpdate(BaseModel):
     name: Optional[str] = None
     salary: Optional[float] = Field(default=None, ge=0)
     default_utilization: Optional[float] = Field(default=None, ge=0, le=1)
+    # New salary applies from this date (YYYY-MM-DD, default today)
+    effective_from: Optional[str] = None
 
 
 class ProjectIn(BaseModel):
@@ -102,6 +269,13 @@ class Project(ProjectIn):
 class ProjectUpdate(BaseModel):
     name: Optional[str] = None
     hourly_rate: Optional[float] = Field(default=None, ge=0)
+    # New rate applies from this date (YYYY-MM-DD, default today)
+    effective_from: Optional[str] = None
+
+
+class ManualExpense(BaseModel):
+    type: str = "Annet"
+    amount: float = Field(ge=0)
 
 
 class Assignment(BaseModel):
@@ -115,14 +289,24 @@ class Assignment(BaseModel):
     end_date: Optional[str] = None
     utlegg_mode: Optional[str] = None
     expense_pct: Optional[float] = Field(default=None, ge=0)
+    # Counted when utlegg_mode is "Manuelt"
+    manual_expenses: List[ManualExpense] = []
 
 
-class CalculateInput(BaseModel):
-    assignments: List[Assignment]
+class CalculateParams(BaseModel):
     yearly_work_hours: Optional[float] = None
     pex_pct: Optional[float] = None
     expense_pct: Optional[float] = None
     month: Optional[int] = Field(default=None, ge=1, le=12)
+    # Salaries/rates in effect on this date (YYYY-MM-DD, default today)
+    as_of: Optional[str] = None
+    # "row": full salary per assignment row (legacy)
+    # "consultant": salary charged once per consultant, split by hours
+    cost_mode: Literal["row", "consultant"] = "row"
+
+
+class CalculateInput(CalculateParams):
+    assignments: List[Assignment]
 
 
 class Settings(BaseModel):
@@ -135,24 +319,175 @@ class Settings(BaseModel):
 # ------------------------------
 
 
+# async: answered on the event loop, never waiting for a busy worker thread
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until startup (data files + cache warm-up) has finished."""
+    if not _ready.is_set():
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready", "startup_seconds": _startup_seconds}
+
+
+@app.get("/admission")
+async def admission():
+    """Admission gates: limits, requests inside/waiting, admitted and rejected."""
+    return {name: gate.stats() for name, gate in _gates.items()}
+
+# ------------------------------
+# FORMATER (JSON / kolonner / MessagePack / Arrow)
+# ------------------------------
+
+
+def _openapi_body(schema_ref: str) -> dict:
+    # Documents the negotiated request body for endpoints that read Request directly
+    content = {formats.JSON: {"schema": {"$ref": f"#/components/schemas/{schema_ref}"}}}
+    for media in (formats.MSGPACK, formats.COLUMNAR_JSON, formats.COLUMNAR_MSGPACK, formats.ARROW):
+        content[media] = {"schema": {"type": "object"}}
+    return {"requestBody": {"required": True, "content": content}}
+
+
+def _response_format(request: Request):
+    try:
+        return formats.response_format(request.headers.get("accept"))
+    except formats.UnsupportedFormat as e:
+        raise HTTPException(406, str(e))
+
+
+# Bodies above this size are decoded off the event loop
+_THREADPOOL_BYTES = 256 * 1024
+
+
+async def _read_body(request: Request, list_field: str):
+    body = await request.body()
+    content_type = request.headers.get("content-type")
+    try:
+        if len(body) >= _THREADPOOL_BYTES:
+            return await run_in_threadpool(formats.decode, body, content_type, list_field)
+        return formats.decode(body, content_type, list_field)
+    except formats.UnsupportedFormat as e:
+        raise HTTPException(415, str(e))
+    except formats.ColumnError as e:
+        raise HTTPException(422, str(e))
+
+
+def _parse(model, payload: dict):
+    try:
+        return model(**payload)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+def _columns(columns, spec) -> dict:
+    try:
+        return formats.validate_columns(columns, spec)
+    except formats.ColumnError as e:
+        raise HTTPException(422, str(e))
+
+
+def _column_rows(cols: dict) -> List[dict]:
+    values = [v.tolist() if isinstance(v, np.ndarray) else v for v in cols.values()]
+    return [dict(zip(cols, row)) for row in zip(*values)]
+
+
+def _encoded(payload: dict, encoding: str, media: str, list_field=None) -> Response:
+    try:
+        body = formats.encode(payload, encoding, list_field)
+    except formats.UnsupportedFormat as e:
+        raise HTTPException(406, str(e))
+    return Response(body, media_type=media)
+
+# ------------------------------
+# ENDRINGSHENDELSER (versjoner + SSE)
+# ------------------------------
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@app.get("/versions")
+def get_versions():
+    with _lock:
+        return dict(_current_versions())
+
+
+@app.get("/events")
+async def change_events(request: Request):
+    """Server-sent events: a `versions` snapshot on connect, then one `change` per commit."""
+    async def stream():
+        async with _bus.subscribe() as queue:
+            # Subscribed before the snapshot, so no commit falls in between
+            yield sse_message("versions", dict(_current_versions()))
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_message("change", event, event_id=event["seq"])
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.get("/changes")
+def get_changes(
+    collection: Literal["consultants", "projects", "scenario"],
+    since: int = Query(0, ge=0),
+):
+    """Upserts/deletes after version `since`, or a full snapshot when the
+    history no longer covers it (compacted, restarted or reset)."""
+    with _lock:
+        current = _current_versions()[collection]
+        delta = _changes.since(collection, since, current)
+        if delta is None:
+            items = sorted(_load(collection)["items"], key=lambda x: x["id"])
+    if delta is None:
+        return FastJSONResponse({"collection": collection, "version": current,
+                                 "mode": "snapshot", "items": items})
+    return FastJSONResponse({"collection": collection, "version": current,
+                             "mode": "delta", **delta})
+
+
+def _etag(collection: str) -> str:
+    # Version plus file stat, so edits behind our back also change the tag
+    mtime_ns, size = _file_key(_store.files[collection])
+    return f'"{_current_versions()[collection]}-{mtime_ns:x}-{size:x}"'
+
+
+def _conditional(request: Request, collection: str, build) -> Response:
+    """GET with an ETag; 304 without a body when If-None-Match still matches.
+
+    The tag is taken before `build()` runs: a write in between makes the
+    client's next tag stale (a full response), never a wrong 304.
+    """
+    etag = _etag(collection)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*"
+                          or etag in (t.strip() for t in if_none_match.split(","))):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(build(), headers={"ETag": etag})
+
 # ------------------------------
 # SETTINGS
 # ------------------------------
 
 
 @app.get("/settings", response_model=Settings)
-def get_settings():
-    return _load(SETTINGS_FILE)
+def get_settings(request: Request):
+    return _conditional(request, "settings", lambda: Settings(**_settings()).dict())
 
 
 @app.post("/settings", response_model=Settings)
 def save_settings(s: Settings):
     with _lock:
-        _save(SETTINGS_FILE, s.dict())
+        _commit("settings", s.dict())
+        _cube_refresh(rebuild=True)
     return s
 
 # ------------------------------
@@ -161,33 +496,74 @@ def save_settings(s: Settings):
 
 
 @app.get("/consultants", response_model=List[Consultant])
-def get_consultants():
-    data = _load(CONSULTANTS_FILE)["items"]
-    return sorted(data, key=lambda x: x["id"])
+def get_consultants(request: Request):
+    return _conditional(request, "consultants", lambda: _table("consultants").records())
 
 
 @app.post("/consultants", response_model=Consultant)
 def create_consultant(c: ConsultantIn):
     with _lock:
-        data = _load(CONSULTANTS_FILE)
+        data = _load("consultants")
         new_id = data["last_id"] + 1
         item = {"id": new_id, **c.dict()}
         data["last_id"] = new_id
         data["items"].append(item)
-        _save(CONSULTANTS_FILE, data)
+        _commit("consultants", data, upserts=[item])
     return item
 
 
+def _effective_date(value: Optional[str]) -> str:
+    if value is None:
+        return datetime.date.today().isoformat()
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError as e:
+        raise HTTPException(422, f"Ugyldig dato: {e}")
+
+
+def _apply_update(item: dict, changes: dict, field: str):
+    """Apply a PATCH to a consultant/project record.
+
+    `field` (salary/hourly_rate) is effective-dated: a new value becomes a
+    version in item["<field>_history"] from `effective_from` (default today)
+    instead of rewriting past calculations; item[field] is the newest version.
+    """
+    effective_from = _effective_date(changes.pop("effective_from", None))
+    for k, v in changes.items():
+        if v is None:
+            continue
+        if k == field:
+            history = item.setdefault(f"{field}_history",
+                                      [{"effective_from": None, field: item[field]}])
+            history[:] = [h for h in history if h["effective_from"] != effective_from]
+            history.append({"effective_from": effective_from, field: v})
+            history.sort(key=lambda h: h["effective_from"] or "")
+            v = history[-1][field]
+        item[k] = v
+
+
+def _history(collection: str, item_id: int, field: str, kind: str) -> List[dict]:
+    for item in _load(collection)["items"]:
+        if item["id"] == item_id:
+            return item.get(f"{field}_history") or [{"effective_from": None, field: item[field]}]
+    raise HTTPException(404, f"{kind} {item_id} ikke funnet")
+
+
+@app.get("/consultants/{cid}/salary-history")
+def get_salary_history(cid: int):
+    """Salary versions, oldest first (effective_from None = since the beginning)."""
+    return _history("consultants", cid, "salary", "Konsulent")
+
+
 @app.patch("/consultants/{cid}", response_model=Consultant)
 def update_consultant(cid: int, upd: ConsultantUpdate):
     with _lock:
-        data = _load(CONSULTANTS_FILE)
+        data = _load("consultants")
         for item in data["items"]:
             if item["id"] == cid:
-                for k, v in upd.dict(exclude_unset=True).items():
-                    if v is not None:
-                        item[k] = v
-                _save(CONSULTANTS_FILE, data)
+                _apply_update(item, upd.dict(exclude_unset=True), "salary")
+                _commit("consultants", data, upserts=[item])
+                _cube_refresh(consultant_ids=[cid])
                 return item
     raise HTTPException(404, f"Konsulent {cid} ikke funnet")
 
@@ -195,12 +571,13 @@ def update_consultant(cid: int, upd: ConsultantUpdate):
 @app.delete("/consultants/{cid}")
 def delete_consultant(cid: int):
     with _lock:
-        data = _load(CONSULTANTS_FILE)
+        data = _load("consultants")
         before = len(data["items"])
         data["items"] = [x for x in data["items"] if x["id"] != cid]
         if len(data["items"]) == before:
             raise HTTPException(404, f"Konsulent {cid} ikke funnet")
-        _save(CONSULTANTS_FILE, data)
+        _commit("consultants", data, deletes=[cid])
+        _cube_refresh(consultant_ids=[cid])
     return {"status": "deleted", "id": cid}
 
 
@@ -208,53 +585,79 @@ class ConsultantsBulk(BaseModel):
     items: List[ConsultantIn]
 
 
-@app.post("/consultants/bulk", response_model=List[Consultant])
-def create_consultants_bulk(payload: ConsultantsBulk):
+def _insert_items(collection: str, items: List[dict]) -> List[dict]:
     out = []
     with _lock:
-        data = _load(CONSULTANTS_FILE)
-        for c in payload.items:
+        data = _load(collection)
+        for fields in items:
             new_id = data["last_id"] + 1
-            item = {"id": new_id, **c.dict()}
+            item = {"id": new_id, **fields}
             data["last_id"] = new_id
             data["items"].append(item)
             out.append(item)
-        _save(CONSULTANTS_FILE, data)
+        _commit(collection, data, upserts=out)
     return out
 
+
+async def _bulk_insert(request: Request, collection: str, model, spec) -> Response:
+    columnar_out, encoding, media = _response_format(request)
+    columnar, payload = await _read_body(request, "items")
+    if columnar:
+        items = _column_rows(_columns(payload.get("items"), spec))
+    else:
+        items = [x.dict() for x in _parse(model, payload).items]
+    out = await run_in_threadpool(_insert_items, collection, items)
+    if not columnar_out and encoding == "json":
+        return out
+    if columnar_out:
+        out = formats.rows_to_columns(out, ["id", *spec])
+        return _encoded({"items": out}, encoding, media, list_field="items")
+    return _encoded(out, encoding, media)
+
+
+@app.post("/consultants/bulk", response_model=List[Consultant],
+          openapi_extra=_openapi_body("ConsultantsBulk"))
+async def create_consultants_bulk(request: Request):
+    return await _bulk_insert(request, "consultants", ConsultantsBulk,
+                              formats.CONSULTANT_COLUMNS)
+
 # ------------------------------
 # PROSJEKTER
 # ------------------------------
 
 
 @app.get("/projects", response_model=List[Project])
-def get_projects():
-    data = _load(PROJECTS_FILE)["items"]
-    return sorted(data, key=lambda x: x["id"])
+def get_projects(request: Request):
+    return _conditional(request, "projects", lambda: _table("projects").records())
 
 
 @app.post("/projects", response_model=Project)
 def create_project(p: ProjectIn):
     with _lock:
-        data = _load(PROJECTS_FILE)
+        data = _load("projects")
         new_id = data["last_id"] + 1
         item = {"id": new_id, **p.dict()}
         data["last_id"] = new_id
         data["items"].append(item)
-        _save(PROJECTS_FILE, data)
+        _commit("projects", data, upserts=[item])
     return item
 
 
+@app.get("/projects/{pid}/rate-history")
+def get_rate_history(pid: int):
+    """Hourly rate versions, oldest first (effective_from None = since the beginning)."""
+    return _history("projects", pid, "hourly_rate", "Prosjekt")
+
+
 @app.patch("/projects/{pid}", response_model=Project)
 def update_project(pid: int, upd: ProjectUpdate):
     with _lock:
-        data = _load(PROJECTS_FILE)
+        data = _load("projects")
         for item in data["items"]:
             if item["id"] == pid:
-                for k, v in upd.dict(exclude_unset=True).items():
-                    if v is not None:
-                        item[k] = v
-                _save(PROJECTS_FILE, data)
+                _apply_update(item, upd.dict(exclude_unset=True), "hourly_rate")
+                _commit("projects", data, upserts=[item])
+                _cube_refresh(project_ids=[pid])
                 return item
     raise HTTPException(404, f"Prosjekt {pid} ikke funnet")
 
@@ -262,12 +665,13 @@ def update_project(pid: int, upd: ProjectUpdate):
 @app.delete("/projects/{pid}")
 def delete_project(pid: int):
     with _lock:
-        data = _load(PROJECTS_FILE)
+        data = _load("projects")
         before = len(data["items"])
         data["items"] = [x for x in data["items"] if x["id"] != pid]
         if len(data["items"]) == before:
             raise HTTPException(404, f"Prosjekt {pid} ikke funnet")
-        _save(PROJECTS_FILE, data)
+        _commit("projects", data, deletes=[pid])
+        _cube_refresh(project_ids=[pid])
     return {"status": "deleted", "id": pid}
 
 
@@ -275,19 +679,11 @@ class ProjectsBulk(BaseModel):
     items: List[ProjectIn]
 
 
-@app.post("/projects/bulk", response_model=List[Project])
-def create_projects_bulk(payload: ProjectsBulk):
-    out = []
-    with _lock:
-        data = _load(PROJECTS_FILE)
-        for p in payload.items:
-            new_id = data["last_id"] + 1
-            item = {"id": new_id, **p.dict()}
-            data["last_id"] = new_id
-            data["items"].append(item)
-            out.append(item)
-        _save(PROJECTS_FILE, data)
-    return out
+@app.post("/projects/bulk", response_model=List[Project],
+          openapi_extra=_openapi_body("ProjectsBulk"))
+async def create_projects_bulk(request: Request):
+    return await _bulk_insert(request, "projects", ProjectsBulk,
+                              formats.PROJECT_COLUMNS)
 
 
 # ------------------------------
@@ -302,7 +698,7 @@ _LAST_NAMES = ["Nordmann", "Hansen", "Larsen",
 @app.post("/seed/consultants")
 def seed_consultants(count: int = Query(10, ge=5, le=25), reset: bool = False):
     with _lock:
-        data = _load(CONSULTANTS_FILE)
+        data = _load("consultants")
         if reset:
             data = {"last_id": 0, "items": []}
         for _ in range(count):
@@ -313,7 +709,9 @@ def seed_consultants(count: int = Query(10, ge=5, le=25), reset: bool = False):
             data["items"].append(
                 {"id": new_id, "name": name, "salary": salary, "default_utilization": util})
             data["last_id"] = new_id
-        _save(CONSULTANTS_FILE, data)
+        _commit("consultants", data, upserts=data["items"][-count:], reset=reset)
+        if reset:
+            _cube_refresh(rebuild=True)
         total = len(data["items"])
     return {"status": "ok", "added": count, "total": total, "reset": reset}
 
@@ -321,7 +719,7 @@ def seed_consultants(count: int = Query(10, ge=5, le=25), reset: bool = False):
 @app.post("/seed/projects")
 def seed_projects(count: int = Query(10, ge=5, le=25), reset: bool = False):
     with _lock:
-        data = _load(PROJECTS_FILE)
+        data = _load("projects")
         if reset:
             data = {"last_id": 0, "items": []}
         for i in range(count):
@@ -331,7 +729,9 @@ def seed_projects(count: int = Query(10, ge=5, le=25), reset: bool = False):
             data["items"].append(
                 {"id": new_id, "name": name, "hourly_rate": rate})
             data["last_id"] = new_id
-        _save(PROJECTS_FILE, data)
+        _commit("projects", data, upserts=data["items"][-count:], reset=reset)
+        if reset:
+            _cube_refresh(rebuild=True)
         total = len(data["items"])
     return {"status": "ok", "added": count, "total": total, "reset": reset}
 
@@ -349,61 +749,1033 @@ def seed_both():
 # ------------------------------
 
 
-@app.post("/calculate-ebit")
-def calculate_ebit(body: CalculateInput):
-    settings = _load(SETTINGS_FILE)
-    yearly_work_hours = body.yearly_work_hours or settings["yearly_work_hours"]
-    pex_pct = settings["pex_pct"] if body.pex_pct is None else body.pex_pct
-    expense_pct = settings["expense_pct"] if body.expense_pct is None else body.expense_pct
+def _settings() -> dict:
+    # Parsed settings.json, cached until the file changes (like _table)
+    key = _file_key(_store.files["settings"])
+    cached = _tables.get("settings")
+    if cached is None or cached[0] != key:
+        cached = _tables["settings"] = (key, _load("settings"))
+    return cached[1]
 
-    consultants = {c["id"]: c for c in _load(CONSULTANTS_FILE)["items"]}
-    projects = {p["id"]: p for p in _load(PROJECTS_FILE)["items"]}
 
-    results = []
-    total_income = 0.0
-    total_cost = 0.0
-    total_ebit = 0.0
+def _resolve_settings(body) -> dict:
+    return resolve_settings(_settings(), body.yearly_work_hours, body.pex_pct, body.expense_pct)
+
+
+def _assignment_columns(assignments: List[Assignment]) -> dict:
+    return {
+        "consultant_id": np.array([a.consultant_id for a in assignments], dtype=np.int64),
+        "project_id": np.array([a.project_id for a in assignments], dtype=np.int64),
+        "utilization": np.array([a.utilization for a in assignments], dtype=float),
+        "project_percent": np.array([a.project_percent for a in assignments], dtype=float),
+        "row_index": [a.row_index for a in assignments],
+        "utlegg_mode": [a.utlegg_mode or "Prosent" for a in assignments],
+        "expense_pct": np.array([a.expense_pct or 0.0 for a in assignments], dtype=float),
+        **manual_lines([{"manual_expenses": [e.dict() for e in a.manual_expenses]}
+                        for a in assignments]),
+    }
+
+
+def _as_of(date: Optional[str]) -> int:
+    """Day number for salary/rate lookups (backend.tables.to_days)."""
+    return int(to_days([_effective_date(date)])[0])
+
+
+def _with_as_of(cols: dict, date: Optional[str] = None) -> dict:
+    if "as_of" in cols:
+        return cols
+    n = len(cols["consultant_id"])
+    return {**cols, "as_of": np.full(n, _as_of(date), dtype=np.int64)}
+
+
+def _not_found(e: UnknownId) -> HTTPException:
+    kind = "Konsulent" if e.kind == "consultant" else "Prosjekt"
+    return HTTPException(404, f"{kind} {e.item_id} finnes ikke")
+
+
+def _join(cols: dict):
+    """Join assignment columns with the consultant/project tables (404 on unknown ids)."""
+    consultants, projects = _table("consultants"), _table("projects")
+    try:
+        return (join_assignments(_with_as_of(cols), consultants, projects),
+                consultants, projects)
+    except UnknownId as e:
+        raise _not_found(e)
+
+
+def _calculate(cols: dict, params: CalculateParams) -> dict:
+    consultants, projects = _table("consultants"), _table("projects")
+    try:
+        return calculate_assignments(_with_as_of(cols, params.as_of), consultants, projects,
+                                     _resolve_settings(params), params.cost_mode)
+    except UnknownId as e:
+        raise _not_found(e)
+
+
+_calculations = SingleFlight()
+
+
+# Numeric assignment columns that feed _calculate
+_KEY_ARRAYS = (
+    ("consultant_id", np.int64), ("project_id", np.int64), ("as_of", np.int64),
+    ("utilization", float), ("project_percent", float), ("expense_pct", float),
+    ("expense_row", np.int64), ("expense_amount", float), ("manual_expense_total", float),
+)
+
+
+def _plain_list(values) -> list:
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+
+def _calculation_key(cols: dict, params: CalculateParams) -> tuple:
+    """Canonical hash of the inputs _calculate uses, plus the data versions.
+
+    Independent of key order, whitespace and wire format, so equal requests
+    in JSON, MessagePack or columnar form share one computation.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(params.dict(exclude={"assignments"}), sort_keys=True).encode())
+    for name, dtype in _KEY_ARRAYS:
+        if name in cols:
+            h.update(name.encode())
+            h.update(np.ascontiguousarray(cols[name], dtype=dtype).tobytes())
+    for name in ("row_index", "utlegg_mode", "expense_type"):
+        if name in cols:
+            h.update(json.dumps([name, _plain_list(cols[name])]).encode())
+    versions = _current_versions()
+    return (h.hexdigest(), versions["consultants"], versions["projects"], versions["settings"])
+
+
+def _calculation_input(columnar: bool, payload: dict):
+    if columnar:
+        params = _parse(CalculateParams, {
+            k: v for k, v in payload.items() if k != "assignments"})
+        cols = _columns(payload.get("assignments"), formats.ASSIGNMENT_COLUMNS)
+    else:
+        params = _parse(CalculateInput, payload)
+        cols = _assignment_columns(params.assignments)
+    # Resolved here so "today" is part of the coalescing key
+    return _with_as_of(cols, params.as_of), params
+
+
+# Requests with at least this many rows run as background jobs (202 + /jobs/{id})
+BACKGROUND_ROWS = int(os.getenv("EBIT_BACKGROUND_ROWS", "50000"))
+
+
+def _calculate_job(job: Job, cols: dict, params: CalculateParams) -> dict:
+    job.report(0.0, f"Beregner {len(cols['consultant_id'])} rader")
+    result = _calculate(cols, params)
+    return {**result, "results": _column_rows(result["results"])}
+
+
+@app.post("/calculate-ebit", openapi_extra=_openapi_body("CalculateInput"))
+async def calculate_ebit(request: Request):
+    columnar_out, encoding, media = _response_format(request)
+    columnar, payload = await _read_body(request, "assignments")
+    if len(await request.body()) >= _THREADPOOL_BYTES:
+        cols, params = await run_in_threadpool(_calculation_input, columnar, payload)
+    else:
+        cols, params = _calculation_input(columnar, payload)
+    if len(cols["consultant_id"]) >= BACKGROUND_ROWS:
+        return _submit_job("calculate", _calculate_job, cols, params)
+
+    # Identical concurrent requests wait on the first one and share its result;
+    # only that first one takes an admission slot. Large bodies already hold
+    # one from the middleware.
+    def compute():
+        return run_in_threadpool(_calculate, cols, params)
+
+    already_admitted = getattr(request.state, "admission_gate", None) is not None
+    try:
+        result, shared = await _calculations.do(
+            _calculation_key(cols, params),
+            compute if already_admitted else lambda: admitted(_gates["calculate"], compute))
+    except Overloaded as e:
+        return overloaded_response(e)
+    coalesced = {"X-Coalesced": "1"} if shared else {}
+
+    if columnar_out:
+        out = _encoded(result, encoding, media, list_field="results")
+    else:
+        # Shared result: build a new dict instead of mutating it
+        result = {**result, "results": _column_rows(result["results"])}
+        if encoding == "json":
+            return FastJSONResponse(result, headers=coalesced)
+        out = _encoded(result, encoding, media)
+    out.headers.update(coalesced)
+    return out
 
-    for a in body.assignments:
-        if a.consultant_id not in consultants:
-            raise HTTPException(
-                404, f"Konsulent {a.consultant_id} finnes ikke")
-        if a.project_id not in projects:
-            raise HTTPException(404, f"Prosjekt {a.project_id} finnes ikke")
+# ------------------------------
+# MÅLSØK (break-even / målmargin)
+# ------------------------------
 
-        c = consultants[a.consultant_id]
-        p = projects[a.project_id]
 
-        billable_hours = yearly_work_hours * a.utilization * a.project_percent
-        income = billable_hours * p["hourly_rate"]
-        cost = c["salary"] * (1 + pex_pct + expense_pct)
-        ebit = income - cost
+class GoalSeekInput(BaseModel):
+    assignments: List[Assignment]
+    yearly_work_hours: Optional[float] = None
+    pex_pct: Optional[float] = None
+    expense_pct: Optional[float] = None
+    # Salaries/rates in effect on this date (YYYY-MM-DD, default today)
+    as_of: Optional[str] = None
+    # As in CalculateParams: rates that break even under that cost split
+    cost_mode: Literal["row", "consultant"] = "row"
+    target_margin: float = Field(default=0.15, ge=0, lt=1)
+
+
+def _finite(values) -> list:
+    # inf/nan (no hours, zero rate) is not valid JSON -> None
+    return [float(v) if np.isfinite(v) else None for v in values]
+
+
+@app.post("/goal-seek")
+def goal_seek(body: GoalSeekInput):
+    settings_used = _resolve_settings(body)
+    hours_per_year = settings_used["yearly_work_hours"]
+    m = body.target_margin
+
+    day = _as_of(body.as_of)
+    cols, consultants, projects = _join(_with_as_of(_assignment_columns(body.assignments),
+                                                    body.as_of))
+    cids = cols["consultant_id"]
+    pids = cols["project_id"]
+    util = cols["utilization"]
+    pct = cols["project_percent"]
+    rate = cols["hourly_rate"]
+
+    hours = hours_per_year * util * pct
+    income = hours * rate
+    cost = loaded_cost(
+        cols["salary"], settings_used["pex_pct"], settings_used["expense_pct"])
+    if body.cost_mode == "consultant":
+        cost = allocate_cost(cids, hours, cost)
+    # Utlegg as /calculate-ebit deducts it: income * e + fixed
+    e, fixed = utlegg_terms(cols, len(hours))
+    utlegg = income * e + fixed
+
+    be_rate = _finite(required_rate(cost, hours, 0.0, e, fixed))
+    target_rate = _finite(required_rate(cost, hours, m, e, fixed))
+    be_util = _finite(required_utilization(cost, hours_per_year, pct, rate, 0.0, e, fixed))
+    target_util = _finite(
+        required_utilization(cost, hours_per_year, pct, rate, m, e, fixed))
 
+    results = []
+    for i, a in enumerate(body.assignments):
         results.append({
-            "consultant_id": c["id"],
-            "consultant_name": c["name"],
-            "project_id": p["id"],
-            "project_name": p["name"],
-            "billable_hours": billable_hours,
-            "income": income,
-            "cost": cost,
-            "ebit": ebit
+            "row_index": a.row_index,
+            "consultant_id": a.consultant_id,
+            "project_id": a.project_id,
+            "hourly_rate": float(rate[i]),
+            "billable_hours": float(hours[i]),
+            "income": float(income[i]),
+            "cost": float(cost[i]),
+            "utlegg": float(utlegg[i]),
+            "break_even_rate": be_rate[i],
+            "target_rate": target_rate[i],
+            "break_even_utilization": be_util[i],
+            "target_utilization": target_util[i],
+        })
+
+    # One rate per group: percentage utlegg weighted by hours
+    ones = np.ones_like(hours)
+    p_ids, p_hours, p_income, p_cost, p_utlegg, p_pct_hours, p_fixed, p_heads = group_sum(
+        pids, hours, income, cost, utlegg, hours * e, fixed, ones)
+    p_pct = np.divide(p_pct_hours, p_hours, out=np.zeros_like(p_hours), where=p_hours > 0)
+    ppos = projects.positions(p_ids)
+    by_project = []
+    for pid, name, p_rate, h, inc, cst, utl, be, tr, hc in zip(
+            p_ids.tolist(), projects.names_at(ppos),
+            projects.values_at("hourly_rate", ppos, day).tolist(),
+            p_hours.tolist(), p_income.tolist(), p_cost.tolist(), p_utlegg.tolist(),
+            _finite(required_rate(p_cost, p_hours, 0.0, p_pct, p_fixed)),
+            _finite(required_rate(p_cost, p_hours, m, p_pct, p_fixed)),
+            _finite(supported_headcount(p_income, p_cost, p_heads, m, p_utlegg))):
+        by_project.append({
+            "project_id": pid,
+            "project_name": name,
+            "hourly_rate": p_rate,
+            "billable_hours": h,
+            "income": inc,
+            "cost": cst,
+            "utlegg": utl,
+            "break_even_rate": be,
+            "target_rate": tr,
+            "supported_headcount": hc,
         })
 
-        total_income += income
-        total_cost += cost
-        total_ebit += ebit
+    c_ids, c_hours, c_income, c_cost, c_utlegg, c_pct_hours, c_fixed = group_sum(
+        cids, hours, income, cost, utlegg, hours * e, fixed)
+    c_pct = np.divide(c_pct_hours, c_hours, out=np.zeros_like(c_hours), where=c_hours > 0)
+    by_consultant = []
+    for cid, name, h, inc, cst, utl, be, tr in zip(
+            c_ids.tolist(), consultants.names_at(consultants.positions(c_ids)),
+            c_hours.tolist(), c_income.tolist(), c_cost.tolist(), c_utlegg.tolist(),
+            _finite(required_rate(c_cost, c_hours, 0.0, c_pct, c_fixed)),
+            _finite(required_rate(c_cost, c_hours, m, c_pct, c_fixed))):
+        by_consultant.append({
+            "consultant_id": cid,
+            "consultant_name": name,
+            "billable_hours": h,
+            "income": inc,
+            "cost": cst,
+            "utlegg": utl,
+            "break_even_rate": be,
+            "target_rate": tr,
+        })
 
-    return {
-        "settings_used": {
-            "yearly_work_hours": yearly_work_hours,
-            "pex_pct": pex_pct,
-            "expense_pct": expense_pct
-        },
+    return FastJSONResponse({
+        "settings_used": settings_used,
+        "target_margin": m,
         "results": results,
+        "projects": by_project,
+        "consultants": by_consultant,
+    })
+
+# ------------------------------
+# BEMANNINGSOPTIMERING
+# ------------------------------
+
+
+class ProjectDemand(BaseModel):
+    project_id: int
+    max_fte: float = Field(ge=0)
+
+
+class PinnedAssignment(BaseModel):
+    consultant_id: int
+    project_id: int
+    project_percent: float = Field(ge=0, le=1)
+
+
+class OptimizeInput(BaseModel):
+    consultant_ids: Optional[List[int]] = None
+    project_ids: Optional[List[int]] = None
+    demands: List[ProjectDemand] = []
+    pinned: List[PinnedAssignment] = []
+    yearly_work_hours: Optional[float] = None
+    pex_pct: Optional[float] = None
+    expense_pct: Optional[float] = None
+    # Salaries/rates in effect on this date (YYYY-MM-DD, default today)
+    as_of: Optional[str] = None
+
+
+@app.post("/optimize-staffing")
+def optimize_staffing_endpoint(body: OptimizeInput):
+    settings_used = _resolve_settings(body)
+    consultants, projects = _table("consultants"), _table("projects")
+
+    cpos = np.arange(len(consultants))
+    if body.consultant_ids is not None:
+        wanted = sorted(set(body.consultant_ids) | {p.consultant_id for p in body.pinned})
+        try:
+            cpos = consultants.positions(wanted)
+        except KeyError as e:
+            raise HTTPException(404, f"Konsulent {e.args[0]} finnes ikke")
+    ppos = np.arange(len(projects))
+    if body.project_ids is not None:
+        wanted = sorted(set(body.project_ids) | {p.project_id for p in body.pinned})
+        try:
+            ppos = projects.positions(wanted)
+        except KeyError as e:
+            raise HTTPException(404, f"Prosjekt {e.args[0]} finnes ikke")
+
+    consultant_ids = consultants.ids[cpos]
+    utilization = consultants.columns["default_utilization"][cpos]
+    # 0 is a real utilization; only a missing one falls back to 0.8
+    utilization = np.where(np.isnan(utilization), 0.8, utilization)
+    day = _as_of(body.as_of)
+    try:
+        plan = optimize_staffing(
+            consultant_ids=consultant_ids,
+            utilization=utilization,
+            cost=loaded_cost(consultants.values_at("salary", cpos, day),
+                             settings_used["pex_pct"], settings_used["expense_pct"]),
+            project_ids=projects.ids[ppos],
+            hourly_rate=projects.values_at("hourly_rate", ppos, day),
+            yearly_work_hours=settings_used["yearly_work_hours"],
+            max_fte={d.project_id: d.max_fte for d in body.demands},
+            pinned=[(p.consultant_id, p.project_id, p.project_percent)
+                    for p in body.pinned],
+        )
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+
+    util_by_id = dict(zip(consultant_ids.tolist(), utilization.tolist()))
+    assignments = []
+    for i, row in enumerate(plan["rows"]):
+        assignments.append({
+            "row_index": i,
+            "consultant_id": row["consultant_id"],
+            "project_id": row["project_id"],
+            "utilization": util_by_id[row["consultant_id"]],
+            "project_percent": row["project_percent"],
+            "consultant_work_pct": 1.0,
+            # The optimizer deducts no utlegg beyond loaded_cost
+            "expense_pct": 0.0,
+        })
+
+    return {
+        "settings_used": settings_used,
+        # Directly usable as a /calculate-ebit payload; salary is charged
+        # once per consultant, as in the optimizer
+        "plan": {"assignments": assignments, **settings_used, "cost_mode": "consultant",
+                 **({"as_of": body.as_of} if body.as_of else {})},
+        "pinned_row_indexes": [i for i, r in enumerate(plan["rows"]) if r["pinned"]],
+        "unassigned_consultant_ids": plan["unassigned_consultant_ids"],
         "department": {
-            "income": total_income,
-            "cost": total_cost,
-            "ebit": total_ebit
-        }
+            "income": plan["income"],
+            "cost": plan["cost"],
+            "ebit": plan["ebit"],
+        },
+    }
+
+# ------------------------------
+# KAPASITETSSJEKK (overbooking)
+# ------------------------------
+
+
+class CapacityCheckInput(BaseModel):
+    assignments: List[Assignment]
+    capacity: float = Field(default=1.0, gt=0)
+
+
+@app.post("/capacity-check")
+def capacity_check(body: CapacityCheckInput):
+    rows = body.assignments
+    try:
+        overallocations = find_overallocations(
+            consultant_ids=[a.consultant_id for a in rows],
+            start_dates=[a.start_date for a in rows],
+            end_dates=[a.end_date for a in rows],
+            load=[a.utilization * a.project_percent for a in rows],
+            capacity=body.capacity,
+        )
+    except ValueError as e:
+        raise HTTPException(422, f"Ugyldig dato: {e}")
+
+    consultants = _table("consultants")
+    for item in overallocations:
+        pos = consultants.position(item["consultant_id"])
+        item["consultant_name"] = None if pos is None else consultants.name(pos)
+
+    return {
+        "capacity": body.capacity,
+        "checked_rows": len(rows),
+        "overallocations": overallocations,
     }
+
+# ------------------------------
+# SCENARIO (lagrede rader) + AGGREGAT-KUBE
+# ------------------------------
+
+
+class ScenarioRowIn(BaseModel):
+    consultant_id: int
+    project_id: int
+    utilization: float = Field(ge=0, le=1)
+    project_percent: float = Field(ge=0, le=1)
+    consultant_work_pct: Optional[float] = Field(default=1.0, ge=0, le=1)
+    start_date: str
+    end_date: str
+    utlegg_mode: Optional[str] = "Prosent"
+    expense_pct: Optional[float] = Field(default=0.0, ge=0)
+    manual_expenses: List[ManualExpense] = []
+
+
+class ScenarioRow(ScenarioRowIn):
+    id: int
+
+
+class ScenarioRowUpdate(BaseModel):
+    consultant_id: Optional[int] = None
+    project_id: Optional[int] = None
+    utilization: Optional[float] = Field(default=None, ge=0, le=1)
+    project_percent: Optional[float] = Field(default=None, ge=0, le=1)
+    consultant_work_pct: Optional[float] = Field(default=None, ge=0, le=1)
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    utlegg_mode: Optional[str] = None
+    expense_pct: Optional[float] = Field(default=None, ge=0)
+    manual_expenses: Optional[List[ManualExpense]] = None
+
+
+class ScenarioRowsReplace(BaseModel):
+    items: List[ScenarioRowIn]
+
+
+_cube: Optional[EbitCube] = None
+
+
+def _check_scenario_row(row: dict, consultants: Optional[ColumnTable] = None,
+                        projects: Optional[ColumnTable] = None):
+    # Against the default department unless other tables are given
+    if consultants is None:
+        consultants, projects = _table("consultants"), _table("projects")
+    try:
+        start = datetime.date.fromisoformat(row["start_date"])
+        end = datetime.date.fromisoformat(row["end_date"])
+    except ValueError as e:
+        raise HTTPException(422, f"Ugyldig dato: {e}")
+    if start > end:
+        raise HTTPException(422, "Ugyldig datointervall (Fra > Til)")
+    if consultants.position(row["consultant_id"]) is None:
+        raise HTTPException(404, f"Konsulent {row['consultant_id']} finnes ikke")
+    if projects.position(row["project_id"]) is None:
+        raise HTTPException(404, f"Prosjekt {row['project_id']} finnes ikke")
+
+
+def _cube_row(cube: EbitCube, row: dict, consultants: ColumnTable, projects: ColumnTable,
+              settings: dict):
+    # Rows pointing at deleted consultants/projects drop out of the cube
+    cpos = consultants.position(row["consultant_id"])
+    ppos = projects.position(row["project_id"])
+    if cpos is None or ppos is None:
+        cube.remove_row(row["id"])
+    else:
+        cube.upsert_row(row["id"], row["consultant_id"], row["project_id"],
+                        row_contributions_at(row, consultants, cpos, projects, ppos, settings))
+
+
+def _get_cube() -> EbitCube:
+    # Caller holds _lock. Built lazily, then kept up to date by _cube_refresh.
+    global _cube
+    if _cube is None:
+        cube = EbitCube()
+        consultants, projects = _table("consultants"), _table("projects")
+        settings = _load("settings")
+        for row in _load("scenario")["items"]:
+            _cube_row(cube, row, consultants, projects, settings)
+        _cube = cube
+    return _cube
+
+
+def _cube_refresh(consultant_ids=(), project_ids=(), row_ids=(), rebuild=False):
+    """Push changed consultants/projects/scenario rows into the cube (caller holds _lock)."""
+    global _cube
+    if _cube is None:
+        return
+    if rebuild:
+        _cube = None
+        return
+    affected = _cube.rows_for(consultant_ids, project_ids) | set(row_ids)
+    if not affected:
+        return
+    rows = {r["id"]: r for r in _load("scenario")["items"]}
+    consultants, projects = _table("consultants"), _table("projects")
+    settings = _load("settings")
+    for rid in affected:
+        if rid in rows:
+            _cube_row(_cube, rows[rid], consultants, projects, settings)
+        else:
+            _cube.remove_row(rid)
+
+
+@app.get("/scenario/rows", response_model=List[ScenarioRow])
+def get_scenario_rows(request: Request):
+    return _conditional(request, "scenario", lambda: [
+        ScenarioRow(**r).dict() for r in sorted(_load("scenario")["items"],
+                                                key=lambda x: x["id"])])
+
+
+@app.post("/scenario/rows", response_model=ScenarioRow)
+def create_scenario_row(row: ScenarioRowIn):
+    with _lock:
+        _check_scenario_row(row.dict())
+        data = _load("scenario")
+        new_id = data["last_id"] + 1
+        item = {"id": new_id, **row.dict()}
+        data["last_id"] = new_id
+        data["items"].append(item)
+        _commit("scenario", data, upserts=[item])
+        _cube_refresh(row_ids=[new_id])
+    return item
+
+
+@app.put("/scenario/rows", response_model=List[ScenarioRow])
+def replace_scenario_rows(payload: ScenarioRowsReplace):
+    with _lock:
+        for row in payload.items:
+            _check_scenario_row(row.dict())
+        data = _load("scenario")
+        old_ids = [x["id"] for x in data["items"]]
+        data["items"] = []
+        for row in payload.items:
+            new_id = data["last_id"] + 1
+            data["items"].append({"id": new_id, **row.dict()})
+            data["last_id"] = new_id
+        _commit("scenario", data, upserts=data["items"], deletes=old_ids)
+        _cube_refresh(row_ids=old_ids + [x["id"] for x in data["items"]])
+    return data["items"]
+
+
+@app.patch("/scenario/rows/{rid}", response_model=ScenarioRow)
+def update_scenario_row(rid: int, upd: ScenarioRowUpdate):
+    with _lock:
+        data = _load("scenario")
+        for item in data["items"]:
+            if item["id"] == rid:
+                for k, v in upd.dict(exclude_unset=True).items():
+                    if v is not None:
+                        item[k] = v
+                _check_scenario_row(item)
+                _commit("scenario", data, upserts=[item])
+                _cube_refresh(row_ids=[rid])
+                return item
+    raise HTTPException(404, f"Rad {rid} ikke funnet")
+
+
+@app.delete("/scenario/rows/{rid}")
+def delete_scenario_row(rid: int):
+    with _lock:
+        data = _load("scenario")
+        before = len(data["items"])
+        data["items"] = [x for x in data["items"] if x["id"] != rid]
+        if len(data["items"]) == before:
+            raise HTTPException(404, f"Rad {rid} ikke funnet")
+        _commit("scenario", data, deletes=[rid])
+        _cube_refresh(row_ids=[rid])
+    return {"status": "deleted", "id": rid}
+
+
+@app.get("/cube")
+def query_cube(
+    group_by: Literal["month", "quarter", "consultant", "project"] = "month",
+    consultant_id: Optional[List[int]] = Query(None),
+    project_id: Optional[List[int]] = Query(None),
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    ytd: bool = False,
+):
+    with _lock:
+        items = _get_cube().query(group_by, consultant_id, project_id,
+                                  start, end, ytd)
+    return FastJSONResponse({"group_by": group_by, "items": items})
+
+# ------------------------------
+# AVDELINGER (partisjonert lagring + selskapstotal)
+# ------------------------------
+
+_departments = Departments(_store.departments_dir)
+
+
+class DepartmentIn(BaseModel):
+    name: str
+    settings: Optional[Settings] = None
+
+
+class DepartmentRowsReplace(BaseModel):
+    items: List[ScenarioRowIn]
+
+
+def _department(dept: str):
+    store = _departments.get(dept)
+    if store is None:
+        raise HTTPException(404, f"Avdeling {dept} finnes ikke")
+    return store
+
+
+@app.get("/departments")
+def list_departments():
+    """All departments; "default" is the original data directory (top-level endpoints)."""
+    settings = _settings()
+    out = [{"name": DEFAULT_DEPARTMENT,
+            "settings": {k: settings[k] for k in Settings.__fields__}}]
+    for name in _departments.names():
+        out.append({"name": name, "settings": _department(name).settings()})
+    return out
+
+
+@app.post("/departments", status_code=201)
+def create_department(body: DepartmentIn):
+    try:
+        store = _departments.create(body.name, body.settings.dict() if body.settings else None)
+    except ValueError:
+        raise HTTPException(422, f"Ugyldig avdelingsnavn: {body.name}")
+    except FileExistsError:
+        raise HTTPException(409, f"Avdeling {body.name} finnes allerede")
+    return {"name": store.name, "settings": store.settings()}
+
+
+@app.get("/departments/{dept}/settings", response_model=Settings)
+def get_department_settings(dept: str):
+    return _department(dept).settings()
+
+
+@app.post("/departments/{dept}/settings", response_model=Settings)
+def save_department_settings(dept: str, s: Settings):
+    store = _department(dept)
+    with store.lock:
+        store.commit("settings", s.dict())
+    return s
+
+
+def _department_insert(dept: str, collection: str, fields: dict) -> dict:
+    store = _department(dept)
+    with store.lock:
+        data = store.load(collection)
+        item = {"id": data["last_id"] + 1, **fields}
+        data["last_id"] = item["id"]
+        data["items"].append(item)
+        store.commit(collection, data)
+    return item
+
+
+def _department_update(dept: str, collection: str, item_id: int, changes: dict,
+                       field: str, kind: str) -> dict:
+    store = _department(dept)
+    with store.lock:
+        data = store.load(collection)
+        for item in data["items"]:
+            if item["id"] == item_id:
+                _apply_update(item, changes, field)
+                store.commit(collection, data)
+                return item
+    raise HTTPException(404, f"{kind} {item_id} ikke funnet")
+
+
+def _department_delete(dept: str, collection: str, item_id: int, kind: str) -> dict:
+    store = _department(dept)
+    with store.lock:
+        data = store.load(collection)
+        before = len(data["items"])
+        data["items"] = [x for x in data["items"] if x["id"] != item_id]
+        if len(data["items"]) == before:
+            raise HTTPException(404, f"{kind} {item_id} ikke funnet")
+        store.commit(collection, data)
+    return {"status": "deleted", "id": item_id}
+
+
+@app.get("/departments/{dept}/consultants", response_model=List[Consultant])
+def get_department_consultants(dept: str):
+    return _department(dept).table("consultants").records()
+
+
+@app.post("/departments/{dept}/consultants", response_model=Consultant)
+def create_department_consultant(dept: str, c: ConsultantIn):
+    return _department_insert(dept, "consultants", c.dict())
+
+
+@app.patch("/departments/{dept}/consultants/{cid}", response_model=Consultant)
+def update_department_consultant(dept: str, cid: int, upd: ConsultantUpdate):
+    return _department_update(dept, "consultants", cid, upd.dict(exclude_unset=True),
+                              "salary", "Konsulent")
+
+
+@app.delete("/departments/{dept}/consultants/{cid}")
+def delete_department_consultant(dept: str, cid: int):
+    return _department_delete(dept, "consultants", cid, "Konsulent")
+
+
+@app.get("/departments/{dept}/projects", response_model=List[Project])
+def get_department_projects(dept: str):
+    return _department(dept).table("projects").records()
+
+
+@app.post("/departments/{dept}/projects", response_model=Project)
+def create_department_project(dept: str, p: ProjectIn):
+    return _department_insert(dept, "projects", p.dict())
+
+
+@app.patch("/departments/{dept}/projects/{pid}", response_model=Project)
+def update_department_project(dept: str, pid: int, upd: ProjectUpdate):
+    return _department_update(dept, "projects", pid, upd.dict(exclude_unset=True),
+                              "hourly_rate", "Prosjekt")
+
+
+@app.delete("/departments/{dept}/projects/{pid}")
+def delete_department_project(dept: str, pid: int):
+    return _department_delete(dept, "projects", pid, "Prosjekt")
+
+
+@app.get("/departments/{dept}/scenario/rows", response_model=List[ScenarioRow])
+def get_department_scenario_rows(dept: str):
+    return sorted(_department(dept).load("scenario")["items"], key=lambda x: x["id"])
+
+
+@app.put("/departments/{dept}/scenario/rows", response_model=List[ScenarioRow])
+def replace_department_scenario_rows(dept: str, payload: DepartmentRowsReplace):
+    store = _department(dept)
+    with store.lock:
+        consultants, projects = store.table("consultants"), store.table("projects")
+        items = []
+        for i, row in enumerate(payload.items, start=1):
+            row = row.dict()
+            _check_scenario_row(row, consultants, projects)
+            items.append({"id": i, **row})
+        store.commit("scenario", {"last_id": len(items), "items": items})
+    return items
+
+
+@app.post("/departments/{dept}/calculate-ebit")
+def calculate_department_ebit(dept: str, body: CalculateInput):
+    """/calculate-ebit against the department's consultants, projects and settings."""
+    store = _department(dept)
+    with store.lock:
+        consultants, projects = store.table("consultants"), store.table("projects")
+        settings = store.settings()
+    cols = _with_as_of(_assignment_columns(body.assignments), body.as_of)
+    try:
+        result = calculate_assignments(
+            cols, consultants, projects,
+            resolve_settings(settings, body.yearly_work_hours, body.pex_pct, body.expense_pct),
+            body.cost_mode)
+    except UnknownId as e:
+        raise _not_found(e)
+    return FastJSONResponse({**result, "results": _column_rows(result["results"])})
+
+
+def _default_department_ebit(as_of: int) -> dict:
+    with _lock:
+        consultants, projects = _table("consultants"), _table("projects")
+        settings, rows = _settings(), _load("scenario")["items"]
+    return scenario_ebit(consultants, projects, settings, rows, as_of)
+
+
+def _stored_department_ebit(store, as_of: int) -> dict:
+    # Reads under the department's own lock, calculates outside it
+    return scenario_ebit(*store.snapshot(), as_of)
+
+
+@app.get("/company/ebit")
+def company_ebit(as_of: Optional[str] = None):
+    """EBIT of every department's stored scenario, calculated in parallel and
+    summed to company totals. Each department uses its own settings."""
+    day = _as_of(as_of)
+    sources = {DEFAULT_DEPARTMENT: lambda: _default_department_ebit(day)}
+    for name in _departments.names():
+        store = _department(name)
+        sources[name] = lambda store=store: _stored_department_ebit(store, day)
+    return company_rollup(
+        sources, int(os.getenv("EBIT_ROLLUP_WORKERS", str(os.cpu_count() or 4))))
+
+# ------------------------------
+# BAKGRUNNSJOBBER
+# ------------------------------
+
+_jobs = JobManager(
+    max_workers=int(os.getenv("EBIT_JOB_WORKERS", "2")),
+    ttl=float(os.getenv("EBIT_JOB_TTL_SECONDS", "900")),
+)
+
+
+def _submit_job(kind: str, fn, *args) -> JSONResponse:
+    try:
+        job = _jobs.submit(kind, fn, *args)
+    except JobQueueFull as e:
+        raise HTTPException(503, f"For mange jobber i kø ({e}), prøv igjen senere",
+                            headers={"Retry-After": "5"})
+    return JSONResponse(job.to_dict(), status_code=202,
+                        headers={"Location": f"/jobs/{job.id}"})
+
+
+class TrendJobInput(BaseModel):
+    rows: List[ScenarioRowIn]
+    year: int = Field(ge=2000, le=2100)
+    start_month: int = Field(default=1, ge=1, le=12)
+    end_month: int = Field(default=12, ge=1, le=12)
+    consultant_ids: Optional[List[int]] = None
+    project_ids: Optional[List[int]] = None
+    yearly_work_hours: Optional[float] = None
+    pex_pct: Optional[float] = None
+    expense_pct: Optional[float] = None
+
+
+_TREND_CHUNK = 5000
+
+
+def _trend_job(job: Job, rows: List[dict], months: List[str], settings: dict) -> List[dict]:
+    """Department income/cost/utlegg/EBIT per month for the rows (cube semantics)."""
+    consultants, projects = _table("consultants"), _table("projects")
+    totals = np.zeros((len(months), len(MEASURES)))
+    # Rows of consultants/projects deleted after submission are skipped
+    for i in range(0, len(rows), _TREND_CHUNK):
+        job.report(i / len(rows), f"{i}/{len(rows)} rader")
+        totals += trend_totals(rows[i:i + _TREND_CHUNK], months, consultants, projects,
+                               settings)
+    return [{"month": m, **dict(zip(MEASURES, vec))} for m, vec in zip(months, totals.tolist())]
+
+
+@app.post("/jobs/trend", status_code=202)
+def submit_trend_job(body: TrendJobInput):
+    if body.start_month > body.end_month:
+        raise HTTPException(422, "Start måned må være før slutt måned")
+    rows = [row.dict() for row in body.rows]
+    for row in rows:
+        _check_scenario_row(row)
+    if body.consultant_ids is not None:
+        wanted = set(body.consultant_ids)
+        rows = [r for r in rows if r["consultant_id"] in wanted]
+    if body.project_ids is not None:
+        wanted = set(body.project_ids)
+        rows = [r for r in rows if r["project_id"] in wanted]
+    months = [f"{body.year:04d}-{m:02d}" for m in range(body.start_month, body.end_month + 1)]
+    return _submit_job("trend", _trend_job, rows, months, _resolve_settings(body))
+
+
+@app.get("/jobs")
+def list_jobs():
+    return [job.to_dict(include_result=False) for job in _jobs.list()]
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Jobb {job_id} finnes ikke")
+    return FastJSONResponse(job.to_dict())
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = _jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, f"Jobb {job_id} finnes ikke")
+    return job.to_dict(include_result=False)
+
+# ------------------------------
+# EKSPORT / IMPORT (Parquet / Arrow)
+# ------------------------------
+
+# Effective-dated field per collection (<field>_history, see backend.tables)
+_DATED_FIELDS = {"consultants": "salary", "projects": "hourly_rate"}
+
+
+def _imported_history(versions: Optional[list], field: str) -> Optional[List[dict]]:
+    """Validated, sorted versions from an imported history column."""
+    if not versions:
+        return None
+    out = []
+    for v in versions:
+        value = v.get(field)
+        if value is None or not value >= 0:
+            raise HTTPException(422, f"Kolonne '{field}_history' har ugyldige verdier")
+        effective_from = v.get("effective_from")
+        out.append({"effective_from": None if effective_from is None
+                    else _effective_date(effective_from), field: value})
+    return sorted(out, key=lambda h: h["effective_from"] or "")
+
+
+_EXPORT_FIELDS = {
+    "consultants": ["id", *formats.CONSULTANT_COLUMNS],
+    "projects": ["id", *formats.PROJECT_COLUMNS],
+    "settings": list(Settings.__fields__),
+    "scenario": ["id", *ScenarioRowIn.__fields__],
+}
+
+
+def _scenario_results() -> dict:
+    # /calculate-ebit for the stored scenario rows (rows of deleted consultants/projects skipped)
+    rows, cols = scenario_columns(_load("scenario")["items"],
+                                  _table("consultants"), _table("projects"))
+    results = _calculate(cols, CalculateParams())["results"]
+    return {"scenario_row_id": np.array([r["id"] for r in rows], dtype=np.int64), **results}
+
+
+def export_table(name: str):
+    """One export table as an Arrow table (see backend.export)."""
+    if name not in EXPORT_TABLES:
+        raise HTTPException(404, f"Tabell {name} finnes ikke")
+    with _lock:
+        if name == "results":
+            return table_from_columns(_scenario_results())
+        if name == "trends":
+            return table_from_columns(_get_cube().cells())
+        if name in TABLE_COLUMNS:
+            table = _table(name)
+            field = _DATED_FIELDS[name]
+            items = {x["id"]: x for x in _load(name)["items"]}
+            histories = [items[i].get(f"{field}_history") for i in table.ids.tolist()]
+            return table_from_columns({"id": table.ids, "name": table.names, **table.columns,
+                                       f"{field}_history": history_column(histories, field)})
+        if name == "settings":
+            rows = [_load("settings")]
+        else:
+            rows = sorted(_load(name)["items"], key=lambda x: x["id"])
+    return table_from_rows(rows, _EXPORT_FIELDS[name])
+
+
+def import_table(name: str, table, mode: str = "replace") -> dict:
+    """Load consultants/projects/settings from an Arrow table.
+
+    `replace` swaps the whole collection and keeps an `id` column if present
+    (so scenario rows still match); `append` adds rows with new ids.
+    """
+    if name not in IMPORT_TABLES:
+        raise HTTPException(404, f"Tabell {name} kan ikke importeres")
+    columns = table_columns(table)
+
+    if name == "settings":
+        rows = _column_rows(_columns(columns, {
+            k: formats.Column("float") for k in _EXPORT_FIELDS["settings"]}))
+        if len(rows) != 1:
+            raise HTTPException(422, "Innstillinger må være nøyaktig én rad")
+        settings = _parse(Settings, rows[0])
+        with _lock:
+            version = _commit("settings", settings.dict())
+            _cube_refresh(rebuild=True)
+        return {"status": "ok", "table": name, "mode": mode, "imported": 1, "version": version}
+
+    spec = formats.CONSULTANT_COLUMNS if name == "consultants" else formats.PROJECT_COLUMNS
+    rows = _column_rows(_columns(columns, spec))
+    field = _DATED_FIELDS[name]
+    for row, versions in zip(rows, history_lists(table, f"{field}_history") or ()):
+        history = _imported_history(versions, field)
+        if history is not None:
+            row[f"{field}_history"] = history
+    ids = None
+    if mode == "replace" and "id" in columns:
+        ids = _columns({"id": columns["id"]}, {"id": formats.Column("int", ge=1)})["id"]
+        if len(np.unique(ids)) != len(ids):
+            raise HTTPException(422, "Kolonne 'id' har duplikater")
+
+    with _lock:
+        data = {"last_id": 0, "items": []} if mode == "replace" else _load(name)
+        if ids is None:
+            ids = data["last_id"] + 1 + np.arange(len(rows))
+        items = [{"id": i, **row} for i, row in zip(ids.tolist(), rows)]
+        data["items"].extend(items)
+        if items:
+            data["last_id"] = max(data["last_id"], int(ids.max()))
+        version = _commit(name, data, upserts=items, reset=mode == "replace")
+        if mode == "replace":
+            _cube_refresh(rebuild=True)
+    return {"status": "ok", "table": name, "mode": mode, "imported": len(items), "version": version}
+
+
+@app.get("/export/{table}")
+def export_data(
+    table: Literal["consultants", "projects", "settings", "scenario", "results", "trends"],
+    fmt: Literal["parquet", "arrow"] = Query("parquet", alias="format"),
+):
+    try:
+        body = write_table(export_table(table), fmt)
+    except formats.UnsupportedFormat as e:
+        raise HTTPException(406, str(e))
+    media, suffix = FILE_FORMATS[fmt]
+    return Response(body, media_type=media, headers={
+        "Content-Disposition": f'attachment; filename="{table}{suffix}"'})
+
+
+@app.post("/import/{table}", openapi_extra={"requestBody": {"required": True, "content": {
+    media: {"schema": {"type": "string", "format": "binary"}}
+    for media, _ in FILE_FORMATS.values()}}})
+async def import_data(
+    table: Literal["consultants", "projects", "settings"],
+    request: Request,
+    mode: Literal["replace", "append"] = "replace",
+    background: bool = False,
+):
+    raw = await request.body()
+    try:
+        arrow = await run_in_threadpool(read_table, raw)
+    except formats.UnsupportedFormat as e:
+        raise HTTPException(415, str(e))
+    except Exception as e:
+        raise HTTPException(422, f"Kunne ikke lese filen: {e}")
+    if background or arrow.num_rows >= BACKGROUND_ROWS:
+        return _submit_job("import", _import_job, table, arrow, mode)
+    return await run_in_threadpool(import_table, table, arrow, mode)
+
+
+def _import_job(job: Job, table: str, arrow, mode: str) -> dict:
+    job.report(0.0, f"Importerer {arrow.num_rows} rader")
+    return import_table(table, arrow, mode)
@@ -0,0 +1,142 @@
+"""Staffing optimizer: assign project_percent per consultant/project to maximize EBIT.
+
+Income for consultant c on project p is ``hours * u_c * x_cp * rate_p``, so the
+value of a unit of allocation is the product ``u_c * rate_p``. For product
+weights the transportation LP (consultant capacity <= 1, project demand <=
+max_fte) is solved exactly by pairing consultants sorted by utilization with
+projects sorted by rate (north-west corner fill), which we do vectorized with
+cumulative sums instead of a simplex.
+
+Salary is charged once per staffed consultant, which makes the real problem a
+fixed-charge one. A local search on top of the fill un-staffs consultants whose
+income does not cover their cost and refills the freed demand, until stable.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_EPS = 1e-9
+
+
+def _fill(cap: np.ndarray, demand: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """North-west corner fill of `cap` (sorted consultants) into `demand` (sorted projects).
+
+    Returns (consultant_pos, project_pos, amount) for every non-empty segment.
+    """
+    if len(cap) == 0 or len(demand) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    c_end = np.cumsum(cap)
+    d_end = np.cumsum(np.minimum(demand, c_end[-1]))
+    total = min(c_end[-1], d_end[-1])
+    cuts = np.union1d(c_end, d_end)
+    cuts = cuts[cuts <= total + _EPS]
+    starts = np.concatenate(([0.0], cuts[:-1]))
+    amount = cuts - starts
+    keep = amount > _EPS
+    starts, amount = starts[keep], amount[keep]
+    mid = starts + amount / 2
+    c_pos = np.searchsorted(c_end, mid)
+    d_pos = np.searchsorted(d_end, mid)
+    return c_pos, d_pos, amount
+
+
+def optimize_staffing(
+    consultant_ids: Sequence[int],
+    utilization: Sequence[float],
+    cost: Sequence[float],
+    project_ids: Sequence[int],
+    hourly_rate: Sequence[float],
+    yearly_work_hours: float,
+    max_fte: Optional[Dict[int, float]] = None,
+    pinned: Sequence[Tuple[int, int, float]] = (),
+    max_rounds: int = 100,
+) -> dict:
+    """Propose project_percent per (consultant, project) maximizing department EBIT.
+
+    `max_fte` limits the summed project_percent per project (missing = unlimited).
+    `pinned` rows (consultant_id, project_id, project_percent) are kept as-is and
+    consume capacity/demand first. Raises ValueError if pins exceed capacity or
+    reference unknown ids.
+    """
+    cids = np.asarray(consultant_ids, dtype=np.int64)
+    util = np.asarray(utilization, dtype=float)
+    cost = np.asarray(cost, dtype=float)
+    pids = np.asarray(project_ids, dtype=np.int64)
+    rate = np.asarray(hourly_rate, dtype=float)
+    max_fte = max_fte or {}
+
+    c_row = {int(c): i for i, c in enumerate(cids)}
+    p_row = {int(p): i for i, p in enumerate(pids)}
+
+    cap = np.ones(len(cids))
+    demand = np.array([max_fte.get(int(p), np.inf) for p in pids], dtype=float)
+    is_pinned = np.zeros(len(cids), dtype=bool)
+    for cid, pid, pct in pinned:
+        if cid not in c_row:
+            raise ValueError(f"Konsulent {cid} finnes ikke")
+        if pid not in p_row:
+            raise ValueError(f"Prosjekt {pid} finnes ikke")
+        cap[c_row[cid]] -= pct
+        demand[p_row[pid]] -= pct
+        is_pinned[c_row[cid]] = True
+    if (cap < -_EPS).any():
+        bad = cids[cap < -_EPS].tolist()
+        raise ValueError(f"Låste tildelinger overstiger 100% for konsulent(er) {bad}")
+    cap = np.clip(cap, 0.0, None)
+    demand = np.clip(demand, 0.0, None)
+
+    pinned_income = np.zeros(len(cids))
+    for cid, pid, pct in pinned:
+        i = c_row[cid]
+        pinned_income[i] += yearly_work_hours * util[i] * pct * rate[p_row[pid]]
+
+    # Highest utilization is paired with the highest rate; ids break ties
+    c_order = np.lexsort((cids, -util))
+    p_order = np.lexsort((pids, -rate))
+    p_order = p_order[rate[p_order] > 0]
+
+    # A non-pinned consultant who can't cover cost even on the best project is never staffed
+    best_rate = rate[p_order[0]] if len(p_order) else 0.0
+    active = is_pinned | (yearly_work_hours * util * cap * best_rate > cost + _EPS)
+
+    for _ in range(max_rounds):
+        order = c_order[active[c_order] & (cap[c_order] > _EPS)]
+        c_pos, d_pos, amount = _fill(cap[order], demand[p_order])
+        c_idx = order[c_pos]
+        p_idx = p_order[d_pos]
+        income = pinned_income + np.bincount(
+            c_idx, weights=yearly_work_hours * util[c_idx] * amount * rate[p_idx],
+            minlength=len(cids))
+        staffed = is_pinned | np.isin(np.arange(len(cids)), c_idx)
+        losing = active & staffed & ~is_pinned & (income < cost - _EPS)
+        if not losing.any():
+            break
+        # Un-staff them and refill the demand they held
+        active[losing] = False
+
+    rows: List[dict] = []
+    for cid, pid, pct in pinned:
+        rows.append({"consultant_id": int(cid), "project_id": int(pid),
+                     "project_percent": float(pct), "pinned": True})
+    # Merge segments that hit the same (consultant, project) pair
+    pairs: Dict[Tuple[int, int], float] = {}
+    for ci, pi, amt in zip(c_idx.tolist(), p_idx.tolist(), amount.tolist()):
+        key = (int(cids[ci]), int(pids[pi]))
+        pairs[key] = pairs.get(key, 0.0) + amt
+    for (cid, pid), pct in pairs.items():
+        rows.append({"consultant_id": cid, "project_id": pid,
+                     "project_percent": min(1.0, pct), "pinned": False})
+
+    staffed_ids = {r["consultant_id"] for r in rows}
+    total_income = float(income.sum())
+    total_cost = float(sum(cost[c_row[c]] for c in staffed_ids))
+    return {
+        "rows": rows,
+        "unassigned_consultant_ids": [int(c) for c in cids if int(c) not in staffed_ids],
+        "income": total_income,
+        "cost": total_cost,
+        "ebit": total_income - total_cost,
+    }
@@ -0,0 +1,41 @@
+"""Single-flight coalescing of identical concurrent async computations.
+
+The first caller for a key starts the computation as a task; callers that
+arrive with the same key while it is in flight await that task and share its
+result (or exception) instead of computing again. Nothing is cached: once the
+task finishes the key is free, so the next call computes afresh.
+
+The task is shielded, so a disconnecting first caller does not cancel the
+computation for the others.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `fn()` once per in-flight `key`. Returns (result, shared)."""
+        # Keyed per event loop as well: a task can only be awaited on its own loop
+        slot = (id(asyncio.get_running_loop()), key)
+        task = self._inflight.get(slot)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[slot] = task
+            task.add_done_callback(lambda t: self._forget(slot, t))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, slot, task) -> None:
+        if self._inflight.get(slot) is task:
+            del self._inflight[slot]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers already got it
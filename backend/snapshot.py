@@ -0,0 +1,135 @@
+"""Read-only binary snapshot of consultants, projects and settings.
+
+The backend rewrites ``data/snapshot.bin`` after every commit that touches one
+of these collections (tmp file + ``os.replace``, so readers never see a half
+written file). Any process that can see the data directory can mmap it and do
+id lookups without JSON parsing; the OS shares the pages between processes.
+
+Layout (little-endian, every section 8-byte aligned):
+
+    header       magic, format, per collection (version, count), settings
+    consultants  id i8[n] | salary f8[n] | default_utilization f8[n] | name_offsets i8[n+1]
+    projects     id i8[n] | hourly_rate f8[n] | name_offsets i8[n+1]
+    strings      UTF-8 names; name i is blob[offsets[i]:offsets[i+1]]
+
+Rows are sorted by id, so lookups are a ``searchsorted``.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.tables import TABLE_COLUMNS, ColumnTable
+
+MAGIC = b"EBITSNAP"
+FORMAT_VERSION = 1
+
+# magic, format, consultants (version, n), projects (version, n),
+# settings version, pex_pct, expense_pct, yearly_work_hours
+_HEADER = struct.Struct("<8sI4xQQQQQddd")
+
+SETTINGS_FIELDS = ("pex_pct", "expense_pct", "yearly_work_hours")
+
+
+def _encode(table: ColumnTable, columns, strings: List[bytes], base: int) -> List[bytes]:
+    names = [n.encode("utf-8") for n in table.names_at(range(len(table)))]
+    strings.extend(names)
+    offsets = base + np.concatenate(([0], np.cumsum([len(n) for n in names], dtype=np.int64)))
+    parts = [table.ids.astype("<i8").tobytes()]
+    for col in columns:
+        parts.append(table.columns[col].astype("<f8").tobytes())
+    parts.append(offsets.astype("<i8").tobytes())
+    return parts
+
+
+def write_snapshot(path: str, consultants: ColumnTable, projects: ColumnTable,
+                   settings: dict, versions: Dict[str, int]) -> None:
+    """Atomically replace the snapshot at `path`."""
+    strings: List[bytes] = []
+    body = _encode(consultants, TABLE_COLUMNS["consultants"], strings, 0)
+    body += _encode(projects, TABLE_COLUMNS["projects"], strings, sum(map(len, strings)))
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION,
+        versions.get("consultants", 0), len(consultants),
+        versions.get("projects", 0), len(projects),
+        versions.get("settings", 0), *(float(settings[k]) for k in SETTINGS_FIELDS))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for part in body:
+            f.write(part)
+        f.write(b"".join(strings))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SnapshotTable(ColumnTable):
+    """ColumnTable whose columns are views into the mapped file."""
+
+    def __init__(self, buf, offset: int, n: int, columns, blob_offset: int):
+        self._buf = buf
+        self._blob_offset = blob_offset
+        ids = np.frombuffer(buf, dtype="<i8", count=n, offset=offset)
+        offset += 8 * n
+        data: Dict[str, np.ndarray] = {}
+        for col in columns:
+            data[col] = np.frombuffer(buf, dtype="<f8", count=n, offset=offset)
+            offset += 8 * n
+        self._name_offsets = np.frombuffer(buf, dtype="<i8", count=n + 1, offset=offset)
+        self.end = offset + 8 * (n + 1)
+        super().__init__(ids, data, names=())
+
+    def name(self, pos: int) -> str:
+        start = self._blob_offset + int(self._name_offsets[pos])
+        end = self._blob_offset + int(self._name_offsets[pos + 1])
+        return bytes(self._buf[start:end]).decode("utf-8")
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mm)
+        (magic, fmt, cv, cn, pv, pn, sv, *settings) = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"Ukjent snapshot-format i {path}")
+        self.versions = {"consultants": cv, "projects": pv, "settings": sv}
+        self.settings = dict(zip(SETTINGS_FIELDS, settings))
+
+        # Name offsets are relative to the string table, which follows both tables
+        blob = _HEADER.size + 8 * (cn * (2 + len(TABLE_COLUMNS["consultants"]))
+                                   + pn * (2 + len(TABLE_COLUMNS["projects"])) + 2)
+        self.consultants = SnapshotTable(
+            buf, _HEADER.size, cn, TABLE_COLUMNS["consultants"], blob)
+        self.projects = SnapshotTable(
+            buf, self.consultants.end, pn, TABLE_COLUMNS["projects"], blob)
+
+
+class SnapshotReader:
+    """Keeps the newest snapshot mapped; remaps when the file has been replaced."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._key = None
+        self._snapshot: Optional[Snapshot] = None
+
+    def get(self) -> Optional[Snapshot]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if key != self._key:
+                # The old mapping stays valid for callers still holding it
+                self._snapshot = Snapshot(self.path)
+                self._key = key
+            return self._snapshot
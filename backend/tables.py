@@ -0,0 +1,166 @@
+"""Columnar in-memory copies of the consultant and project collections.
+
+A table keeps one NumPy array per numeric field, sorted by id, plus a list of
+interned names. Joins are ``positions(ids)`` (a ``searchsorted`` on the id
+column) followed by array takes, instead of a dict lookup per row. Records are
+only materialized as dicts at the API edge.
+
+Salaries and hourly rates are effective-dated: a record may carry
+``salary_history`` / ``hourly_rate_history``, a list of
+``{"effective_from": "YYYY-MM-DD" | None, "<field>": value}`` versions
+(None = since the beginning). The plain field holds the newest version.
+``values_at`` resolves the version in effect on given days.
+"""
+from __future__ import annotations
+
+import sys
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# collection -> numeric columns (float64) besides id and name
+TABLE_COLUMNS = {
+    "consultants": ("salary", "default_utilization"),
+    "projects": ("hourly_rate",),
+}
+
+# Days are int64 days since 1970-01-01; versions without a date sort first
+SINCE_FOREVER = -(2 ** 31)
+_DAY_BIAS = 2 ** 31
+
+
+def to_days(dates) -> np.ndarray:
+    """ISO dates (str/date, None = since the beginning) -> int64 day numbers."""
+    dates = list(dates)
+    out = np.full(len(dates), SINCE_FOREVER, dtype=np.int64)
+    known = [i for i, d in enumerate(dates) if d is not None]
+    if known:
+        out[known] = np.array([str(dates[i]) for i in known],
+                              dtype="datetime64[D]").astype(np.int64)
+    return out
+
+
+def _version_keys(positions, days) -> np.ndarray:
+    # (row position, day) packed into one sortable int64
+    return (np.asarray(positions, dtype=np.int64) << 32) + (
+        np.asarray(days, dtype=np.int64) + _DAY_BIAS)
+
+
+class EffectiveHistory:
+    """Effective-dated versions of one column for all rows of a table.
+
+    The versions of every row are stored flat, sorted by (row position,
+    effective day), so the value in effect for any number of (row, day)
+    pairs is one ``searchsorted`` on the packed keys. Days before a row's
+    first version get that first version.
+    """
+
+    def __init__(self, positions: np.ndarray, days: np.ndarray, values: np.ndarray):
+        order = np.lexsort((days, positions))
+        self.positions = positions[order]
+        self.days = days[order]
+        self.values = values[order]
+        self._keys = _version_keys(self.positions, self.days)
+
+    @classmethod
+    def from_lists(cls, histories: Sequence[Optional[list]], field: str
+                   ) -> Optional["EffectiveHistory"]:
+        """Versions per table row (None/[] = no history); None if no row has any."""
+        positions, dates, values = [], [], []
+        for pos, versions in enumerate(histories):
+            for version in versions or ():
+                positions.append(pos)
+                dates.append(version.get("effective_from"))
+                values.append(version[field])
+        if not positions:
+            return None
+        return cls(np.array(positions, dtype=np.int64), to_days(dates),
+                   np.array(values, dtype=float))
+
+    def at(self, positions, days, default) -> np.ndarray:
+        """Values in effect on `days` for rows at `positions`; `default`
+        (per position) for rows without versions."""
+        positions = np.asarray(positions, dtype=np.int64)
+        days = np.broadcast_to(np.asarray(days, dtype=np.int64), positions.shape)
+        out = np.array(np.broadcast_to(default, positions.shape), dtype=float)
+        if not len(positions):
+            return out
+        first = np.searchsorted(self._keys, _version_keys(positions, SINCE_FOREVER))
+        has = self.positions[np.minimum(first, len(self._keys) - 1)] == positions
+        has &= first < len(self._keys)
+        idx = np.searchsorted(self._keys, _version_keys(positions, days), side="right") - 1
+        idx = np.maximum(idx, first)
+        out[has] = self.values[idx[has]]
+        return out
+
+
+class ColumnTable:
+    def __init__(self, ids: np.ndarray, columns: Dict[str, np.ndarray], names: Sequence[str],
+                 histories: Optional[Dict[str, EffectiveHistory]] = None):
+        self.ids = ids
+        self.columns = columns
+        self.names = names
+        self.histories = histories or {}
+
+    @classmethod
+    def from_records(cls, items: Iterable[dict], columns: Sequence[str]) -> "ColumnTable":
+        items = sorted(items, key=lambda x: x["id"])
+        ids = np.array([x["id"] for x in items], dtype=np.int64)
+        data = {col: np.array([np.nan if x.get(col) is None else x[col] for x in items],
+                              dtype=float)
+                for col in columns}
+        histories = {}
+        for col in columns:
+            history = EffectiveHistory.from_lists(
+                [x.get(f"{col}_history") for x in items], col)
+            if history is not None:
+                histories[col] = history
+        return cls(ids, data, [sys.intern(x["name"]) for x in items], histories)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, ids) -> np.ndarray:
+        """Row positions for `ids`; KeyError with the first unknown id."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            if len(ids):
+                raise KeyError(int(ids[0]))
+            return np.zeros(0, dtype=np.intp)
+        pos = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        missing = self.ids[pos] != ids
+        if missing.any():
+            raise KeyError(int(ids[np.flatnonzero(missing)[0]]))
+        return pos
+
+    def position(self, item_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.ids, item_id))
+        if pos < len(self.ids) and self.ids[pos] == item_id:
+            return pos
+        return None
+
+    def values_at(self, col: str, positions, days) -> np.ndarray:
+        """`col` at `positions` as in effect on `days` (see EffectiveHistory)."""
+        current = self.columns[col][np.asarray(positions, dtype=np.intp)]
+        history = self.histories.get(col)
+        return current if history is None else history.at(positions, days, current)
+
+    def name(self, pos: int) -> str:
+        return self.names[pos]
+
+    def names_at(self, positions) -> List[str]:
+        return [self.name(p) for p in np.asarray(positions).tolist()]
+
+    def record(self, pos: int) -> dict:
+        item = {"id": int(self.ids[pos]), "name": self.name(pos)}
+        for col, arr in self.columns.items():
+            value = float(arr[pos])
+            item[col] = None if np.isnan(value) else value
+        return item
+
+    def get(self, item_id: int) -> Optional[dict]:
+        pos = self.position(item_id)
+        return None if pos is None else self.record(pos)
+
+    def records(self) -> List[dict]:
+        return [self.record(i) for i in range(len(self))]
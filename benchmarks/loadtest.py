@@ -0,0 +1,330 @@
+"""Load test: how many concurrent analysts can one backend instance serve?
+
+Replays the traffic the Streamlit pages produce, per virtual analyst:
+
+    lists     GET /consultants, /projects and /settings every --list-interval
+              seconds (page loads / cache refresh)
+    trends    bursts of --burst concurrent POST /calculate-ebit (one per month,
+              the EBIT_Trends.py pattern) every --calc-interval seconds
+    bulk      POST /consultants/bulk + /projects/bulk with --bulk-size items
+              every --bulk-interval seconds (Settings.py imports); only every
+              --bulk-every'th analyst imports
+
+Without --url a local uvicorn is started on a free port against a fresh
+temporary data directory (EBIT_DATA_DIR), seeded through the API, so your
+data/ is never touched.
+
+Reports p50/p95/p99/max latency, throughput and error rate per endpoint, prints
+a table and writes <out>.json and <out>.md.
+
+Usage:
+
+    python -m benchmarks.loadtest --users 20 --duration 120
+    python -m benchmarks.loadtest --url http://localhost:8000 --users 50 \\
+        --calc-interval 10 --out reports/loadtest-50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 95, 99)
+
+
+# ------------------------------
+# Måling
+# ------------------------------
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+    bytes_received: int = 0
+
+    def add(self, seconds: float, error: Optional[str], size: int) -> None:
+        self.latencies.append(seconds)
+        self.bytes_received += size
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+
+class Recorder:
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointStats] = {}
+
+    async def request(self, http: httpx.AsyncClient, method: str, path: str,
+                      label: Optional[str] = None, **kwargs) -> Optional[httpx.Response]:
+        """One timed request; failures are recorded, not raised."""
+        label = label or f"{method} {path}"
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await http.request(method, path, **kwargs)
+            error = None if response.status_code < 400 else str(response.status_code)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        self.endpoints.setdefault(label, EndpointStats()).add(
+            time.perf_counter() - started, error,
+            len(response.content) if response is not None else 0)
+        return response
+
+    def summary(self, duration: float) -> dict:
+        def row(latencies: List[float], errors: int, size: int) -> dict:
+            ms = np.asarray(latencies) * 1000
+            out = {"requests": len(latencies), "errors": errors,
+                   "error_rate": errors / len(latencies) if len(latencies) else 0.0,
+                   "throughput_rps": len(latencies) / duration,
+                   "mean_kib": size / 1024 / len(latencies) if len(latencies) else 0.0}
+            for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES) if len(ms)
+                                else [None] * len(PERCENTILES)):
+                out[f"p{p}_ms"] = None if value is None else float(value)
+            out["max_ms"] = float(ms.max()) if len(ms) else None
+            return out
+
+        endpoints = {}
+        for label in sorted(self.endpoints):
+            s = self.endpoints[label]
+            endpoints[label] = {**row(s.latencies, sum(s.errors.values()), s.bytes_received),
+                                "error_kinds": s.errors}
+        every = [x for s in self.endpoints.values() for x in s.latencies]
+        total = row(every, sum(sum(s.errors.values()) for s in self.endpoints.values()),
+                    sum(s.bytes_received for s in self.endpoints.values()))
+        return {"endpoints": endpoints, "total": total}
+
+
+# ------------------------------
+# Trafikk per analytiker
+# ------------------------------
+
+
+class Analyst:
+    def __init__(self, number: int, http: httpx.AsyncClient, recorder: Recorder,
+                 args: argparse.Namespace, ids: dict, deadline: float):
+        self.number = number
+        self.http = http
+        self.recorder = recorder
+        self.args = args
+        self.ids = ids
+        self.deadline = deadline
+        self.rng = random.Random(args.seed + number)
+
+    async def _sleep(self, seconds: float) -> bool:
+        # Jittered wait; False once the test is over
+        seconds *= self.rng.uniform(0.8, 1.2)
+        remaining = self.deadline - time.monotonic()
+        await asyncio.sleep(max(0.0, min(seconds, remaining)))
+        return time.monotonic() < self.deadline
+
+    async def lists(self) -> None:
+        while True:
+            for path in ("/consultants", "/projects", "/settings"):
+                await self.recorder.request(self.http, "GET", path)
+            if not await self._sleep(self.args.list_interval):
+                return
+
+    def _assignments(self) -> List[dict]:
+        return [{"consultant_id": self.rng.choice(self.ids["consultants"]),
+                 "project_id": self.rng.choice(self.ids["projects"]),
+                 "utilization": round(self.rng.uniform(0.5, 1.0), 2),
+                 "project_percent": round(self.rng.uniform(0.2, 1.0), 2)}
+                for _ in range(self.args.rows)]
+
+    async def trends(self) -> None:
+        while True:
+            assignments = self._assignments()
+            await asyncio.gather(*(
+                self.recorder.request(self.http, "POST", "/calculate-ebit", json={
+                    "assignments": assignments, "month": month})
+                for month in range(1, self.args.burst + 1)))
+            if not await self._sleep(self.args.calc_interval):
+                return
+
+    async def bulk(self) -> None:
+        while await self._sleep(self.args.bulk_interval):
+            n = self.args.bulk_size
+            await self.recorder.request(self.http, "POST", "/consultants/bulk", json={
+                "items": [{"name": f"Last {self.number}-{i}",
+                           "salary": self.rng.randint(600_000, 900_000),
+                           "default_utilization": 0.8} for i in range(n)]})
+            await self.recorder.request(self.http, "POST", "/projects/bulk", json={
+                "items": [{"name": f"Last {self.number}-{i}",
+                           "hourly_rate": self.rng.randint(900, 1600)} for i in range(n)]})
+
+    async def run(self) -> None:
+        # Staggered start: analysts open the app over the ramp-up period
+        await asyncio.sleep(self.args.ramp * self.number / max(1, self.args.users))
+        tasks = [self.lists(), self.trends()]
+        if self.args.bulk_every and self.number % self.args.bulk_every == 0:
+            tasks.append(self.bulk())
+        await asyncio.gather(*tasks)
+
+
+async def _probe(http: httpx.AsyncClient, recorder: Recorder, deadline: float,
+                 interval: float) -> None:
+    # Like the docker-compose healthcheck: cheap requests should stay cheap
+    while time.monotonic() < deadline:
+        await recorder.request(http, "GET", "/health")
+        await asyncio.sleep(interval)
+
+
+async def run_load(base_url: str, args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=args.users * args.burst + 10,
+                          max_keepalive_connections=args.users * args.burst + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                 timeout=args.timeout) as http:
+        ids = {
+            "consultants": [c["id"] for c in (await http.get("/consultants")).json()],
+            "projects": [p["id"] for p in (await http.get("/projects")).json()],
+        }
+        if not ids["consultants"] or not ids["projects"]:
+            raise RuntimeError("backend har ingen konsulenter/prosjekter (kjør /seed)")
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(
+            _probe(http, recorder, deadline, 1.0),
+            *(Analyst(i, http, recorder, args, ids, deadline).run()
+              for i in range(args.users)))
+        duration = time.monotonic() - started
+    return {"duration_s": duration, **recorder.summary(duration)}
+
+
+# ------------------------------
+# Lokal server
+# ------------------------------
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir: str, workers: int, timeout: float = 60):
+    """uvicorn on a free port against `data_dir`; returns (process, base URL)."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "EBIT_DATA_DIR": data_dir}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"], cwd=ROOT, env=env)
+    started = time.monotonic()
+    while True:
+        try:
+            if httpx.get(f"{base}/ready", timeout=1).status_code == 200:
+                break
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() - started > timeout or proc.poll() is not None:
+            proc.terminate()
+            raise RuntimeError("backend ble ikke klar")
+        time.sleep(0.05)
+    # 25 consultants and projects, the largest /seed size
+    for path in ("/seed/consultants", "/seed/projects"):
+        httpx.post(f"{base}{path}", params={"count": 25, "reset": True}, timeout=10)
+    return proc, base
+
+
+# ------------------------------
+# Rapport
+# ------------------------------
+
+
+def _fmt(value, pattern: str) -> str:
+    return "–" if value is None else pattern.format(value)
+
+
+def markdown(report: dict) -> str:
+    cfg = report["config"]
+    lines = [
+        f"# Lasttest {report['started']}",
+        "",
+        f"{cfg['users']} analytikere i {report['duration_s']:.0f} s mot {report['url']} "
+        f"(lister hvert {cfg['list_interval']:g}. s, {cfg['burst']} x /calculate-ebit "
+        f"med {cfg['rows']} rader hvert {cfg['calc_interval']:g}. s, bulk {cfg['bulk_size']} "
+        f"hvert {cfg['bulk_interval']:g}. s).",
+        "",
+        "| Endepunkt | Antall | req/s | Feil | p50 ms | p95 ms | p99 ms | maks ms |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    rows = list(report["endpoints"].items()) + [("**Totalt**", report["total"])]
+    for label, s in rows:
+        lines.append(
+            f"| {label} | {s['requests']} | {s['throughput_rps']:.1f} | "
+            f"{100 * s['error_rate']:.1f} % | {_fmt(s['p50_ms'], '{:.1f}')} | "
+            f"{_fmt(s['p95_ms'], '{:.1f}')} | {_fmt(s['p99_ms'], '{:.1f}')} | "
+            f"{_fmt(s['max_ms'], '{:.1f}')} |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="eksisterende backend (standard: start en lokal)")
+    parser.add_argument("--server-workers", type=int, default=1,
+                        help="uvicorn --workers for den lokale backenden")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="sekunder")
+    parser.add_argument("--ramp", type=float, default=10, help="sekunder til alle er i gang")
+    parser.add_argument("--list-interval", type=float, default=60)
+    parser.add_argument("--calc-interval", type=float, default=15)
+    parser.add_argument("--burst", type=int, default=12)
+    parser.add_argument("--rows", type=int, default=20, help="rader per /calculate-ebit")
+    parser.add_argument("--bulk-interval", type=float, default=120)
+    parser.add_argument("--bulk-size", type=int, default=200)
+    parser.add_argument("--bulk-every", type=int, default=10,
+                        help="hver n-te analytiker importerer (0 = ingen)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="reports/loadtest",
+                        help="skriver <out>.json og <out>.md")
+    args = parser.parse_args(argv)
+
+    started = datetime.datetime.now().isoformat(timespec="seconds")
+    proc = None
+    tmp = None
+    try:
+        if args.url:
+            base = args.url.rstrip("/")
+        else:
+            tmp = tempfile.TemporaryDirectory(prefix="ebit-loadtest-")
+            proc, base = start_server(os.path.join(tmp.name, "data"), args.server_workers)
+        report = asyncio.run(run_load(base, args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = {"started": started, "url": base,
+              "config": {k: v for k, v in vars(args).items() if k not in ("url", "out")},
+              **report}
+    text = markdown(report)
+    print(text)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(f"{args.out}.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with open(f"{args.out}.md", "w", encoding="utf-8") as f:
+        f.write(text)
+    return 1 if report["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Response encoding benchmark for large /calculate-ebit payloads.
+
+For a synthetic N-row result (same shape as /calculate-ebit returns) measures:
+
+    render    jsonable_encoder + json.dumps (FastAPI's default JSONResponse)
+              vs FastJSONResponse (orjson, no encoder pass)
+    size      raw JSON vs gzip vs brotli, and the time to compress
+
+Usage:
+
+    python -m benchmarks.payloads [--rows 1000 10000 100000] [--repeat 5]
+                                  [--out reports/payload-benchmark.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.compression import available_encodings, compress
+from backend.formats import FastJSONResponse
+
+
+def synthetic_result(n: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    hours = rng.uniform(0, 1625, n)
+    income = hours * rng.uniform(900, 1600, n)
+    cost = rng.uniform(400_000, 900_000, n) * 1.3 / 12
+    ebit = income - cost
+    results = [
+        {"consultant_id": int(i % 500) + 1, "consultant_name": f"Konsulent {i % 500 + 1}",
+         "project_id": int(i % 80) + 1, "project_name": f"Prosjekt {i % 80 + 1}",
+         "billable_hours": float(h), "income": float(inc), "cost": float(c), "ebit": float(e)}
+        for i, (h, inc, c, e) in enumerate(zip(hours, income, cost, ebit))
+    ]
+    return {
+        "settings_used": {"pex_pct": 0.3, "expense_pct": 0.1, "yearly_work_hours": 1625},
+        "results": results,
+        "department": {"income": float(income.sum()), "cost": float(cost.sum()),
+                       "ebit": float(ebit.sum())},
+    }
+
+
+def _best(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def measure(n: int, repeat: int) -> dict:
+    payload = synthetic_result(n)
+    out = {
+        "rows": n,
+        "render_default_ms": 1000 * _best(
+            lambda: JSONResponse(jsonable_encoder(payload)).body, repeat),
+        "render_fast_ms": 1000 * _best(lambda: FastJSONResponse(payload).body, repeat),
+    }
+    body = FastJSONResponse(payload).body
+    out["json_bytes"] = len(body)
+    for encoding in available_encodings():
+        out[f"{encoding}_bytes"] = len(compress(body, encoding))
+        out[f"{encoding}_ms"] = 1000 * _best(lambda: compress(body, encoding), repeat)
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="skriv resultatene som JSON hit")
+    args = parser.parse_args(argv)
+
+    rows = [measure(n, args.repeat) for n in args.rows]
+    for r in rows:
+        sizes = "  ".join(f"{e} {r[f'{e}_bytes'] / 1024:9.1f} KiB ({r[f'{e}_ms']:6.1f} ms)"
+                          for e in available_encodings())
+        print(f"{r['rows']:>7} rader  render {r['render_default_ms']:8.1f} -> "
+              f"{r['render_fast_ms']:7.1f} ms   json {r['json_bytes'] / 1024:9.1f} KiB  {sizes}")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"repeat": args.repeat, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Startup-time benchmark for the backend.
+
+Measures, over a few fresh processes:
+
+    import      `import backend.main` in a new interpreter
+    ready       uvicorn launch -> first 200 from /ready (lifespan warm-up done)
+    first_*     latency of the first /consultants and /calculate-ebit request
+
+Each server run gets a fresh temporary data directory (EBIT_DATA_DIR) seeded
+with the JSON files from ./data, which is left untouched.
+
+Usage:
+
+    python -m benchmarks.startup [--runs 5] [--out reports/startup-benchmark.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_DIR = os.path.join(ROOT, "data")
+_SEED_FILES = ("consultants.json", "projects.json", "settings.json")
+
+_IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import backend.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(url: str, body: dict = None, timeout: float = 10) -> float:
+    data = None if body is None else json.dumps(body).encode()
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        r.read()
+    return time.perf_counter() - started
+
+
+def measure_import() -> float:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET], cwd=ROOT,
+                         check=True, capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _seed(data_dir: str) -> list:
+    """Copy the seed files into `data_dir`; returns a one-row /calculate-ebit
+    payload for their first consultant and project."""
+    os.makedirs(data_dir, exist_ok=True)
+    for name in _SEED_FILES:
+        shutil.copy(os.path.join(SEED_DIR, name), data_dir)
+    first = {}
+    for kind in ("consultants", "projects"):
+        with open(os.path.join(data_dir, f"{kind}.json"), encoding="utf-8") as f:
+            first[kind] = json.load(f)["items"][0]["id"]
+    return [{"consultant_id": first["consultants"], "project_id": first["projects"],
+             "utilization": 0.8, "project_percent": 1.0}]
+
+
+def measure_server(timeout: float = 60) -> dict:
+    with tempfile.TemporaryDirectory(prefix="ebit-startup-") as tmp:
+        data_dir = os.path.join(tmp, "data")
+        assignments = _seed(data_dir)
+        return _measure_server(data_dir, assignments, timeout)
+
+
+def _measure_server(data_dir: str, assignments: list, timeout: float) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "EBIT_DATA_DIR": data_dir}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port),
+         "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        while True:
+            try:
+                _request(f"{base}/ready", timeout=1)
+                break
+            except Exception:
+                if time.perf_counter() - started > timeout or proc.poll() is not None:
+                    raise RuntimeError("backend ble ikke klar")
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+
+        first_consultants = _request(f"{base}/consultants")
+        first_calculate = _request(f"{base}/calculate-ebit", {"assignments": assignments})
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return {"ready": ready, "first_consultants": first_consultants,
+            "first_calculate": first_calculate}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", help="skriv resultatene som JSON hit")
+    args = parser.parse_args(argv)
+
+    samples = {"import": [], "ready": [], "first_consultants": [], "first_calculate": []}
+    for _ in range(args.runs):
+        samples["import"].append(measure_import())
+        for key, value in measure_server().items():
+            samples[key].append(value)
+
+    summary = {key: {"median_ms": 1000 * statistics.median(v), "max_ms": 1000 * max(v)}
+               for key, v in samples.items()}
+    for key, s in summary.items():
+        print(f"{key:<18} median {s['median_ms']:8.1f} ms   max {s['max_ms']:8.1f} ms")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"runs": args.runs, "summary": summary, "samples": samples}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
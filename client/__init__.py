@@ -0,0 +1,15 @@
+"""Python client for the EBIT backend.
+
+    from client import EbitClient, AsyncEbitClient
+
+Both share one pooled keep-alive connection per client, retry 503s (any
+method) and transport errors/502/504 (idempotent methods) with backoff and
+Retry-After, split bulk uploads into chunks, cache GET /consultants,
+/projects, /settings and /scenario/rows by ETag, and call timing hooks once
+per HTTP attempt.
+"""
+from client.aio import AsyncEbitClient
+from client.base import CallTiming, EbitAPIError
+from client.sync import EbitClient
+
+__all__ = ["AsyncEbitClient", "CallTiming", "EbitAPIError", "EbitClient"]
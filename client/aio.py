@@ -0,0 +1,125 @@
+"""asyncio client: the same endpoint methods as EbitClient, awaitable."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import (Any, AsyncIterator, Awaitable, Callable, Iterable, List, Optional,
+                    TypeVar)
+
+import httpx
+
+from client.base import (DEFAULT_URL, Call, ClientBase, Endpoints, SSEParser, _chunks)
+from client.types import CalculateResult, Consultant, ConsultantIn, JobInfo, Project, ProjectIn
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AsyncEbitClient(ClientBase, Endpoints):
+    """
+    >>> async with AsyncEbitClient("http://localhost:8000") as api:
+    ...     results = await api.calculate_many(scenarios, concurrency=16)
+
+    Pass `http=` to use an existing httpx.AsyncClient (e.g. with ASGITransport).
+    """
+
+    def __init__(self, base_url: str = DEFAULT_URL, *,
+                 http: Optional[httpx.AsyncClient] = None, **options):
+        super().__init__(base_url, **options)
+        self._owns_http = http is None
+        self._http = http or httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                               limits=self.limits)
+
+    async def aclose(self) -> None:
+        if self._owns_http:
+            await self._http.aclose()
+
+    async def __aenter__(self) -> "AsyncEbitClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def _call(self, call: Call) -> Any:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self._http.request(call.method, call.path,
+                                                    **self._request_kwargs(call))
+            except httpx.TransportError:
+                self._timing(call, attempt, started, None)
+                delay = self._retry_delay(call, attempt, None)
+                if delay is None:
+                    raise
+            else:
+                self._timing(call, attempt, started, response)
+                delay = self._retry_delay(call, attempt, response)
+                if delay is None:
+                    result = self._result(call, response)
+                    if call.follow_job and response.status_code == 202:
+                        return self._job_result(call, await self.wait_for_job(result["job_id"]))
+                    return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # Bulk-opplasting i biter
+
+    async def _bulk(self, path: str, items: List[dict]) -> List[dict]:
+        out: List[dict] = []
+        # Sequential, so ids come back in input order
+        for chunk in _chunks(items, self.bulk_chunk_size):
+            out.extend(await self._call(Call("POST", path, json={"items": list(chunk)})))
+        return out
+
+    async def create_consultants_bulk(self, items: List[ConsultantIn]) -> List[Consultant]:
+        return await self._bulk("/consultants/bulk", items)
+
+    async def create_projects_bulk(self, items: List[ProjectIn]) -> List[Project]:
+        return await self._bulk("/projects/bulk", items)
+
+    # Parallelle kall
+
+    async def fan_out(self, fn: Callable[[T], Awaitable[R]], items: Iterable[T],
+                      concurrency: Optional[int] = None) -> List[R]:
+        """`await fn(item)` for every item, at most `concurrency` in flight
+        (bounded semaphore); results in input order."""
+        semaphore = asyncio.BoundedSemaphore(concurrency or self.concurrency)
+
+        async def run(item):
+            async with semaphore:
+                return await fn(item)
+
+        return list(await asyncio.gather(*(run(item) for item in items)))
+
+    async def calculate_many(self, scenarios: Iterable[dict],
+                             concurrency: Optional[int] = None) -> List[CalculateResult]:
+        """One /calculate-ebit per scenario (keyword arguments of calculate_ebit)."""
+        return await self.fan_out(lambda s: self.calculate_ebit(**s), scenarios, concurrency)
+
+    # Jobber og hendelser
+
+    async def wait_for_job(self, job_id: str, poll: float = 0.5,
+                           timeout: Optional[float] = None) -> JobInfo:
+        """Poll until the job is done/failed/cancelled; returns the final state."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await self.job(job_id)
+            if job["status"] in ("done", "failed", "cancelled"):
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Jobb {job_id} ble ikke ferdig")
+            await asyncio.sleep(poll)
+
+    async def events(self) -> AsyncIterator[dict]:
+        """Server-sent events from /events: {"event", "id", "data"} dicts."""
+        parser = SSEParser()
+        async with self._http.stream("GET", "/events", timeout=httpx.Timeout(
+                self.timeout, read=None)) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                self._result(Call("GET", "/events"), response)
+            async for line in response.aiter_lines():
+                event = parser.feed(line)
+                if event is not None:
+                    yield event
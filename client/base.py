@@ -0,0 +1,388 @@
+"""Pieces shared by the sync and async clients.
+
+Every endpoint is described once, in ``Endpoints``, as a ``Call`` (method,
+path, body, how to read the response). ``EbitClient._call`` sends it and
+returns the result; ``AsyncEbitClient._call`` returns a coroutine. Retries,
+the ETag cache and timing hooks live in ``ClientBase`` and work the same in
+both.
+"""
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from client.types import (Assignment, CalculateResult, Consultant, JobInfo, Project,
+                          ScenarioRow, ScenarioRowIn, Settings)
+
+DEFAULT_URL = "http://localhost:8000"
+
+# Retried on any method: the server turned the request away before doing anything
+_RETRY_ALWAYS = (503,)
+# Retried only on idempotent methods
+_RETRY_IDEMPOTENT = (502, 504)
+_IDEMPOTENT = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+
+class EbitAPIError(Exception):
+    """Non-2xx response; `detail` is the backend's error message."""
+
+    def __init__(self, status_code: int, detail: Any, method: str, path: str):
+        super().__init__(f"{method} {path}: {status_code} {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.method = method
+        self.path = path
+
+
+@dataclass
+class Call:
+    method: str
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    json: Any = None
+    content: Optional[bytes] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    etag: bool = False  # GET answered from the ETag cache on 304
+    raw: bool = False  # return the body as bytes
+    # A 202 job (large requests run in the background) is awaited and its result returned
+    follow_job: bool = False
+
+
+@dataclass
+class CallTiming:
+    """Passed to timing hooks once per HTTP attempt."""
+    method: str
+    path: str
+    status_code: Optional[int]  # None: transport error
+    seconds: float
+    attempt: int
+    bytes_sent: int
+    bytes_received: int
+    cached: bool  # 304 served from the ETag cache
+
+
+TimingHook = Callable[[CallTiming], None]
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SSEParser:
+    """Incremental text/event-stream parser: feed lines, get events."""
+
+    def __init__(self):
+        self._event, self._data, self._id = None, [], None
+
+    def feed(self, line: str) -> Optional[dict]:
+        if line == "":
+            if not self._data:
+                return None
+            event = {"event": self._event or "message", "id": self._id,
+                     "data": json.loads("\n".join(self._data))}
+            self._event, self._data, self._id = None, [], None
+            return event
+        if line.startswith(":"):
+            return None  # keepalive comment
+        name, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if name == "event":
+            self._event = value
+        elif name == "data":
+            self._data.append(value)
+        elif name == "id":
+            self._id = value
+        return None
+
+
+class ClientBase:
+    def __init__(self, base_url: str = DEFAULT_URL, *, timeout: float = 30.0,
+                 max_connections: int = 10, retries: int = 3, backoff: float = 0.2,
+                 bulk_chunk_size: int = 5000, concurrency: int = 8,
+                 timing_hooks: Sequence[TimingHook] = ()):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # HTTP/1.1 keep-alive pool; every call reuses these connections
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.retries = retries
+        self.backoff = backoff
+        self.bulk_chunk_size = bulk_chunk_size
+        self.concurrency = concurrency
+        self.timing_hooks: List[TimingHook] = list(timing_hooks)
+        # path (+ query) -> (etag, body)
+        self._etags: Dict[str, Tuple[str, bytes]] = {}
+
+    def add_timing_hook(self, hook: TimingHook) -> None:
+        self.timing_hooks.append(hook)
+
+    def clear_cache(self) -> None:
+        self._etags.clear()
+
+    @staticmethod
+    def _cache_key(call: Call) -> str:
+        return call.path + ("?" + str(httpx.QueryParams(call.params)) if call.params else "")
+
+    def _request_kwargs(self, call: Call) -> dict:
+        headers = dict(call.headers)
+        if call.etag and self._cache_key(call) in self._etags:
+            headers["If-None-Match"] = self._etags[self._cache_key(call)][0]
+        return {"params": call.params, "json": call.json,
+                "content": call.content, "headers": headers}
+
+    def _retry_delay(self, call: Call, attempt: int,
+                     response: Optional[httpx.Response]) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to stop."""
+        if attempt >= self.retries:
+            return None
+        idempotent = call.method in _IDEMPOTENT
+        if response is None:
+            retry = idempotent
+        else:
+            retry = (response.status_code in _RETRY_ALWAYS
+                     or (idempotent and response.status_code in _RETRY_IDEMPOTENT))
+        if not retry:
+            return None
+        delay = self.backoff * 2 ** attempt
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get("retry-after", 0)))
+            except ValueError:
+                pass
+        return delay
+
+    def _timing(self, call: Call, attempt: int, started: float,
+                response: Optional[httpx.Response]) -> None:
+        if not self.timing_hooks:
+            return
+        timing = CallTiming(
+            method=call.method, path=call.path,
+            status_code=None if response is None else response.status_code,
+            seconds=time.perf_counter() - started, attempt=attempt,
+            bytes_sent=len(call.content or b"") or (
+                0 if response is None else len(response.request.content)),
+            bytes_received=0 if response is None else response.num_bytes_downloaded,
+            cached=response is not None and response.status_code == 304)
+        for hook in self.timing_hooks:
+            hook(timing)
+
+    def _result(self, call: Call, response: httpx.Response) -> Any:
+        if response.status_code == 304 and call.etag:
+            body = self._etags[self._cache_key(call)][1]
+        else:
+            if response.status_code >= 400:
+                try:
+                    detail = response.json()
+                except ValueError:
+                    detail = response.text
+                if isinstance(detail, dict):
+                    detail = detail.get("detail", detail)
+                raise EbitAPIError(response.status_code, detail, call.method, call.path)
+            body = response.content
+            if call.etag and response.headers.get("etag"):
+                self._etags[self._cache_key(call)] = (response.headers["etag"], body)
+        if call.raw:
+            return body
+        # Parsed on every call, so callers can't mutate the cached copy
+        return json.loads(body) if body else None
+
+    @staticmethod
+    def _job_result(call: Call, job: JobInfo) -> Any:
+        if job["status"] != "done":
+            raise EbitAPIError(500, job.get("error") or f"Jobb {job['status']}",
+                               call.method, call.path)
+        return job["result"]
+
+
+def _drop_none(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in fields.items() if v is not None}
+
+
+class Endpoints:
+    """One method per backend endpoint. `_call` is sync or async per client."""
+
+    def _call(self, call: Call) -> Any:  # pragma: no cover - implemented by clients
+        raise NotImplementedError
+
+    # Helse / endringer
+
+    def health(self) -> dict:
+        return self._call(Call("GET", "/health"))
+
+    def ready(self) -> dict:
+        return self._call(Call("GET", "/ready"))
+
+    def versions(self) -> Dict[str, int]:
+        return self._call(Call("GET", "/versions"))
+
+    def changes(self, collection: str, since: int = 0) -> dict:
+        return self._call(Call("GET", "/changes",
+                               params={"collection": collection, "since": since}))
+
+    # Settings
+
+    def settings(self) -> Settings:
+        return self._call(Call("GET", "/settings", etag=True))
+
+    def save_settings(self, pex_pct: float, expense_pct: float,
+                      yearly_work_hours: float) -> Settings:
+        return self._call(Call("POST", "/settings", json={
+            "pex_pct": pex_pct, "expense_pct": expense_pct,
+            "yearly_work_hours": yearly_work_hours}))
+
+    # Konsulenter
+
+    def consultants(self) -> List[Consultant]:
+        return self._call(Call("GET", "/consultants", etag=True))
+
+    def create_consultant(self, name: str, salary: float,
+                          default_utilization: float = 0.8) -> Consultant:
+        return self._call(Call("POST", "/consultants", json={
+            "name": name, "salary": salary, "default_utilization": default_utilization}))
+
+    def update_consultant(self, consultant_id: int, **fields) -> Consultant:
+        return self._call(Call("PATCH", f"/consultants/{consultant_id}", json=fields))
+
+    def salary_history(self, consultant_id: int) -> List[dict]:
+        return self._call(Call("GET", f"/consultants/{consultant_id}/salary-history"))
+
+    def delete_consultant(self, consultant_id: int) -> dict:
+        return self._call(Call("DELETE", f"/consultants/{consultant_id}"))
+
+    # Prosjekter
+
+    def projects(self) -> List[Project]:
+        return self._call(Call("GET", "/projects", etag=True))
+
+    def create_project(self, name: str, hourly_rate: float) -> Project:
+        return self._call(Call("POST", "/projects",
+                               json={"name": name, "hourly_rate": hourly_rate}))
+
+    def update_project(self, project_id: int, **fields) -> Project:
+        return self._call(Call("PATCH", f"/projects/{project_id}", json=fields))
+
+    def rate_history(self, project_id: int) -> List[dict]:
+        return self._call(Call("GET", f"/projects/{project_id}/rate-history"))
+
+    def delete_project(self, project_id: int) -> dict:
+        return self._call(Call("DELETE", f"/projects/{project_id}"))
+
+    # Seed
+
+    def seed_consultants(self, count: int = 10, reset: bool = False) -> dict:
+        return self._call(Call("POST", "/seed/consultants",
+                               params={"count": count, "reset": reset}))
+
+    def seed_projects(self, count: int = 10, reset: bool = False) -> dict:
+        return self._call(Call("POST", "/seed/projects",
+                               params={"count": count, "reset": reset}))
+
+    def seed(self) -> dict:
+        return self._call(Call("POST", "/seed"))
+
+    # Beregning
+
+    def calculate_ebit(self, assignments: List[Assignment], *,
+                       yearly_work_hours: Optional[float] = None,
+                       pex_pct: Optional[float] = None,
+                       expense_pct: Optional[float] = None,
+                       month: Optional[int] = None,
+                       as_of: Optional[str] = None,
+                       cost_mode: Optional[str] = None) -> CalculateResult:
+        return self._call(Call("POST", "/calculate-ebit", json={
+            "assignments": assignments, **_drop_none({
+                "yearly_work_hours": yearly_work_hours, "pex_pct": pex_pct,
+                "expense_pct": expense_pct, "month": month, "as_of": as_of,
+                "cost_mode": cost_mode})}, follow_job=True))
+
+    def goal_seek(self, assignments: List[Assignment], target_margin: float = 0.15,
+                  **settings) -> dict:
+        return self._call(Call("POST", "/goal-seek", json={
+            "assignments": assignments, "target_margin": target_margin,
+            **_drop_none(settings)}))
+
+    def optimize_staffing(self, **body) -> dict:
+        """Body as OptimizeInput: consultant_ids, project_ids, demands, pinned, settings."""
+        return self._call(Call("POST", "/optimize-staffing", json=_drop_none(body)))
+
+    def capacity_check(self, assignments: List[Assignment], capacity: float = 1.0) -> dict:
+        return self._call(Call("POST", "/capacity-check",
+                               json={"assignments": assignments, "capacity": capacity}))
+
+    # Scenario + kube
+
+    def scenario_rows(self) -> List[ScenarioRow]:
+        return self._call(Call("GET", "/scenario/rows", etag=True))
+
+    def create_scenario_row(self, row: ScenarioRowIn) -> ScenarioRow:
+        return self._call(Call("POST", "/scenario/rows", json=row))
+
+    def replace_scenario_rows(self, rows: List[ScenarioRowIn]) -> List[ScenarioRow]:
+        return self._call(Call("PUT", "/scenario/rows", json={"items": rows}))
+
+    def update_scenario_row(self, row_id: int, **fields) -> ScenarioRow:
+        return self._call(Call("PATCH", f"/scenario/rows/{row_id}", json=fields))
+
+    def delete_scenario_row(self, row_id: int) -> dict:
+        return self._call(Call("DELETE", f"/scenario/rows/{row_id}"))
+
+    def cube(self, group_by: str = "month", *,
+             consultant_id: Optional[List[int]] = None,
+             project_id: Optional[List[int]] = None,
+             start: Optional[str] = None, end: Optional[str] = None,
+             ytd: bool = False) -> dict:
+        return self._call(Call("GET", "/cube", params=_drop_none({
+            "group_by": group_by, "consultant_id": consultant_id,
+            "project_id": project_id, "start": start, "end": end, "ytd": ytd})))
+
+    # Avdelinger
+
+    def departments(self) -> List[dict]:
+        return self._call(Call("GET", "/departments"))
+
+    def create_department(self, name: str, settings: Optional[Settings] = None) -> dict:
+        return self._call(Call("POST", "/departments",
+                               json=_drop_none({"name": name, "settings": settings})))
+
+    def department_call(self, department: str, method: str, path: str, **kwargs) -> Any:
+        """Any department-scoped endpoint, e.g.
+        department_call("salg", "POST", "/consultants", json={...})."""
+        return self._call(Call(method, f"/departments/{department}{path}", **kwargs))
+
+    def company_ebit(self, as_of: Optional[str] = None) -> dict:
+        return self._call(Call("GET", "/company/ebit", params=_drop_none({"as_of": as_of})))
+
+    # Bakgrunnsjobber
+
+    def submit_trend_job(self, rows: List[ScenarioRowIn], year: int, **options) -> JobInfo:
+        """Options as TrendJobInput: start_month, end_month, filters, settings."""
+        return self._call(Call("POST", "/jobs/trend",
+                               json={"rows": rows, "year": year, **_drop_none(options)}))
+
+    def jobs(self) -> List[JobInfo]:
+        return self._call(Call("GET", "/jobs"))
+
+    def job(self, job_id: str) -> JobInfo:
+        return self._call(Call("GET", f"/jobs/{job_id}"))
+
+    def cancel_job(self, job_id: str) -> JobInfo:
+        return self._call(Call("DELETE", f"/jobs/{job_id}"))
+
+    # Eksport / import
+
+    def export_table(self, table: str, format: str = "parquet") -> bytes:
+        return self._call(Call("GET", f"/export/{table}", params={"format": format}, raw=True))
+
+    def import_table(self, table: str, data: bytes, mode: str = "replace",
+                     background: bool = False) -> dict:
+        """`data` is a Parquet or Arrow file (the backend sniffs which)."""
+        return self._call(Call("POST", f"/import/{table}",
+                               params={"mode": mode, "background": background},
+                               content=data,
+                               headers={"Content-Type": "application/octet-stream"},
+                               follow_job=not background))
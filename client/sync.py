@@ -0,0 +1,123 @@
+"""Blocking client. Thread-safe: one instance (one connection pool) can be
+shared by threads, which is what ``fan_out`` does."""
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, TypeVar
+
+import httpx
+
+from client.base import (DEFAULT_URL, Call, ClientBase, Endpoints, SSEParser, _chunks)
+from client.types import CalculateResult, Consultant, ConsultantIn, JobInfo, Project, ProjectIn
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class EbitClient(ClientBase, Endpoints):
+    """
+    >>> with EbitClient("http://localhost:8000") as api:
+    ...     consultants = api.consultants()      # 304 + cache on repeat calls
+    ...     result = api.calculate_ebit([{"consultant_id": 1, "project_id": 1,
+    ...                                   "utilization": 0.8, "project_percent": 1.0}])
+
+    Pass `http=` to use an existing httpx.Client (e.g. FastAPI's TestClient).
+    """
+
+    def __init__(self, base_url: str = DEFAULT_URL, *, http: Optional[httpx.Client] = None,
+                 **options):
+        super().__init__(base_url, **options)
+        self._owns_http = http is None
+        self._http = http or httpx.Client(base_url=self.base_url, timeout=self.timeout,
+                                          limits=self.limits)
+
+    def close(self) -> None:
+        if self._owns_http:
+            self._http.close()
+
+    def __enter__(self) -> "EbitClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _call(self, call: Call) -> Any:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self._http.request(call.method, call.path,
+                                              **self._request_kwargs(call))
+            except httpx.TransportError:
+                self._timing(call, attempt, started, None)
+                delay = self._retry_delay(call, attempt, None)
+                if delay is None:
+                    raise
+            else:
+                self._timing(call, attempt, started, response)
+                delay = self._retry_delay(call, attempt, response)
+                if delay is None:
+                    result = self._result(call, response)
+                    if call.follow_job and response.status_code == 202:
+                        return self._job_result(call, self.wait_for_job(result["job_id"]))
+                    return result
+            time.sleep(delay)
+            attempt += 1
+
+    # Bulk-opplasting i biter
+
+    def _bulk(self, path: str, items: List[dict]) -> List[dict]:
+        out: List[dict] = []
+        # Sequential, so ids come back in input order
+        for chunk in _chunks(items, self.bulk_chunk_size):
+            out.extend(self._call(Call("POST", path, json={"items": list(chunk)})))
+        return out
+
+    def create_consultants_bulk(self, items: List[ConsultantIn]) -> List[Consultant]:
+        return self._bulk("/consultants/bulk", items)
+
+    def create_projects_bulk(self, items: List[ProjectIn]) -> List[Project]:
+        return self._bulk("/projects/bulk", items)
+
+    # Parallelle kall
+
+    def fan_out(self, fn: Callable[[T], R], items: Iterable[T],
+                concurrency: Optional[int] = None) -> List[R]:
+        """`fn(item)` for every item, at most `concurrency` at a time; results
+        in input order. The first exception is raised after all calls finish."""
+        with ThreadPoolExecutor(max_workers=concurrency or self.concurrency) as pool:
+            futures = [pool.submit(fn, item) for item in items]
+        return [f.result() for f in futures]
+
+    def calculate_many(self, scenarios: Iterable[dict],
+                       concurrency: Optional[int] = None) -> List[CalculateResult]:
+        """One /calculate-ebit per scenario (keyword arguments of calculate_ebit)."""
+        return self.fan_out(lambda s: self.calculate_ebit(**s), scenarios, concurrency)
+
+    # Jobber og hendelser
+
+    def wait_for_job(self, job_id: str, poll: float = 0.5,
+                     timeout: Optional[float] = None) -> JobInfo:
+        """Poll until the job is done/failed/cancelled; returns the final state."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.job(job_id)
+            if job["status"] in ("done", "failed", "cancelled"):
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Jobb {job_id} ble ikke ferdig")
+            time.sleep(poll)
+
+    def events(self) -> Iterator[dict]:
+        """Server-sent events from /events: {"event", "id", "data"} dicts."""
+        parser = SSEParser()
+        with self._http.stream("GET", "/events", timeout=httpx.Timeout(
+                self.timeout, read=None)) as response:
+            if response.status_code >= 400:
+                response.read()
+                self._result(Call("GET", "/events"), response)
+            for line in response.iter_lines():
+                event = parser.feed(line)
+                if event is not None:
+                    yield event
@@ -0,0 +1,107 @@
+"""Typed shapes of the backend's JSON payloads (see the pydantic models in
+backend/main.py). TypedDicts, so responses stay plain dicts at runtime."""
+from __future__ import annotations
+
+from typing import List, Optional, TypedDict
+
+
+class ConsultantIn(TypedDict, total=False):
+    name: str
+    salary: float
+    default_utilization: float
+
+
+class Consultant(ConsultantIn):
+    id: int
+
+
+class ProjectIn(TypedDict, total=False):
+    name: str
+    hourly_rate: float
+
+
+class Project(ProjectIn):
+    id: int
+
+
+class Settings(TypedDict):
+    pex_pct: float
+    expense_pct: float
+    yearly_work_hours: float
+
+
+class ManualExpense(TypedDict, total=False):
+    type: str
+    amount: float
+
+
+class Assignment(TypedDict, total=False):
+    row_index: Optional[int]
+    consultant_id: int
+    project_id: int
+    utilization: float
+    project_percent: float
+    consultant_work_pct: Optional[float]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    utlegg_mode: Optional[str]
+    expense_pct: Optional[float]
+    manual_expenses: List[ManualExpense]
+
+
+class ResultRow(TypedDict):
+    consultant_id: int
+    consultant_name: str
+    project_id: int
+    project_name: str
+    billable_hours: float
+    income: float
+    cost: float
+    utlegg: float
+    ebit: float
+
+
+class Totals(TypedDict, total=False):
+    income: float
+    cost: float
+    utlegg: float
+    utlegg_by_type: dict
+    ebit: float
+
+
+class CalculateResult(TypedDict):
+    settings_used: dict
+    results: List[ResultRow]
+    consultants: List[dict]
+    projects: List[dict]
+    department: Totals
+
+
+class ScenarioRowIn(TypedDict, total=False):
+    consultant_id: int
+    project_id: int
+    utilization: float
+    project_percent: float
+    consultant_work_pct: Optional[float]
+    start_date: str
+    end_date: str
+    utlegg_mode: Optional[str]
+    expense_pct: Optional[float]
+    manual_expenses: List[ManualExpense]
+
+
+class ScenarioRow(ScenarioRowIn):
+    id: int
+
+
+class JobInfo(TypedDict, total=False):
+    job_id: str
+    kind: str
+    status: str
+    progress: float
+    message: Optional[str]
+    error: Optional[str]
+    created: float
+    started: Optional[float]
+    finished: Optional[float]
+    result: object
@@ -3,8 +3,11 @@
 # Start backend in background
 uvicorn backend.main:app --host 0.0.0.0 --port 8000 &
 
-# Wait for backend to be ready
-sleep 5
+# Wait for backend to be ready (data loaded, caches warm) instead of a fixed sleep
+for _ in $(seq 1 300); do
+    python -c "import urllib.request; urllib.request.urlopen('http://localhost:8000/ready', timeout=1)" 2>/dev/null && break
+    sleep 0.2
+done
 
 # Start frontend
 streamlit run frontend/Hovedside.py --server.port 8501 --server.address 0.0.0.0
@@ -3,7 +3,11 @@
 import streamlit as st
 import requests
 import datetime
+import json
 import os
+import time
+
+from change_events import data_versions, get_replica
 
 # Use environment variable for backend URL in production
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
@@ -11,11 +15,6 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 # Toggle: send month as index (1–12) or as Norwegian name ("Januar" ...)
 SEND_MONTH_AS_INDEX = True
 
-# IMPORTANT: Does your backend already include utlegg in its EBIT?
-# - If True: we will display EBIT exactly as returned by backend (no extra subtraction)
-# - If False: we will compute "EBIT (inkl. utlegg)" = backend EBIT - utlegg_cost
-BACKEND_EBIT_INCLUDES_UTLEGG = False
-
 st.set_page_config(page_title="EBIT Kalkulator", page_icon="💰", layout="wide")
 st.title("💰 EBIT Kalkulator – Hovedside")
 
@@ -28,36 +27,28 @@ st.write(
 # ========== Helpers & caching ==========
 
 
-@st.cache_data(ttl=60)
-def fetch_consultants():
-    r = requests.get(f"{BACKEND_URL}/consultants", timeout=10)
-    r.raise_for_status()
-    return r.json()
+# Listene holdes som lokale kopier (se change_events.py) og oppdateres
+# med endringssett kun når dataversjonen fra backend har endret seg.
+def fetch_consultants(version=None):
+    return get_replica(BACKEND_URL, "consultants").get(version)
 
 
-@st.cache_data(ttl=60)
-def fetch_projects():
-    r = requests.get(f"{BACKEND_URL}/projects", timeout=10)
-    r.raise_for_status()
-    return r.json()
+def fetch_projects(version=None):
+    return get_replica(BACKEND_URL, "projects").get(version)
 
 
 def invalidate_caches():
-    try:
-        fetch_consultants.clear()
-    except Exception:
-        pass
-    try:
-        fetch_projects.clear()
-    except Exception:
-        pass
+    # Neste henting tar et fullt øyeblikksbilde
+    get_replica(BACKEND_URL, "consultants").version = None
+    get_replica(BACKEND_URL, "projects").version = None
 
 
 # ========== Fetch data ==========
 consultants = []
 projects = []
+versions = data_versions(BACKEND_URL)
 try:
-    consultants = fetch_consultants()
+    consultants = fetch_consultants(versions.get("consultants"))
 except requests.HTTPError as e:
     st.error(
         f"Feil ved henting av konsulenter ({e.response.status_code}): {e.response.text}")
@@ -65,7 +56,7 @@ except Exception as e:
     st.error(f"Feil ved henting av konsulenter: {e}")
 
 try:
-    projects = fetch_projects()
+    projects = fetch_projects(versions.get("projects"))
 except requests.HTTPError as e:
     st.error(
         f"Feil ved henting av prosjekter ({e.response.status_code}): {e.response.text}")
@@ -177,320 +168,533 @@ def toggle_proj_info():
 
 # ========== Header ==========
 st.header("Valg per rad")
-col1, col2, col3 = st.columns([1, 1, 8])
-with col1:
-    st.button("+ Legg til rad", on_click=add_row, key="add_row")
-with col2:
-    if st.button("🗑️ Slett all data", key="clear_all_btn"):
-        clear_all_data()
-        st.rerun()
+# Rutenett: ett st.data_editor-widget for alle rader, i stedet for ~10 per rad
+edit_mode = st.radio(
+    "Visning", ["Skjema", "Rutenett"], horizontal=True, key="edit_mode",
+    help="Rutenett egner seg for store scenarier: endringer lagres samlet.")
 
 consultant_label_by_id = {v: k for k, v in consultant_options.items()}
 project_label_by_id = {v: k for k, v in project_options.items()}
 
+# Label-lister og -indekser bygges én gang per kjøring, ikke per rad
+consultant_labels = list(consultant_options.keys())
+project_labels = list(project_options.keys())
+consultant_label_index = {label: i for i, label in enumerate(consultant_labels)}
+project_label_index = {label: i for i, label in enumerate(project_labels)}
+
 manual_expense_types = ["Transport", "Reise",
                         "Mat", "Hotell", "Taxi", "Kurs", "Annet"]
+utlegg_modes = ["Prosent", "Manuelt"]
 
-# # | Konsulent | Prosjekt | Utnyttelsesgrad | Prosjektbelastning
-cols_spec = [1, 3, 4, 2, 2]
-hcols = st.columns(cols_spec)
-hcols[0].markdown("**#**")
-hcols[1].markdown("**Konsulent**")
-hcols[2].markdown("**Prosjekt**")
-
-hcols[3].markdown("**Utnyttelsesgrad**")
-if hcols[3].button("i", key="util_info_btn", help="Hva betyr Utnyttelsesgrad?"):
-    toggle_util_info()
-
-hcols[4].markdown("**Prosjektbelastning**")
-if hcols[4].button("i", key="proj_info_btn", help="Hva betyr Prosjektbelastning?"):
-    toggle_proj_info()
-
-if st.session_state.get("show_util_info"):
-    st.info(
-        "**Utnyttelsesgrad:** Andel av en konsulents arbeidstid brukt til arbeid i perioden.\n"
-        "Eksempel: `0.8` betyr 80% av tiden er utnyttet (tilgjengelige fakturerbare timer påvirkes)."
-    )
-if st.session_state.get("show_proj_info"):
-    st.info(
-        "**Prosjektbelastning:** Andel av den utnyttede tiden som går til dette prosjektet.\n"
-        "Eksempel: `utnyttelse=0.8`, `prosjektbelastning=0.5` → 0.8 * 0.5 = 0.4 (40% av totaltid)."
-    )
 
-# ========== Render dynamic rows ==========
-for i, row in enumerate(list(st.session_state.rows)):
-    cols = st.columns(cols_spec)
+def render_form_rows():
+    # # | Konsulent | Prosjekt | Utnyttelsesgrad | Prosjektbelastning
+    cols_spec = [1, 3, 4, 2, 2]
+    hcols = st.columns(cols_spec)
+    hcols[0].markdown("**#**")
+    hcols[1].markdown("**Konsulent**")
+    hcols[2].markdown("**Prosjekt**")
 
-    # remove
-    if cols[0].button("–", key=f"remove_{i}"):
-        remove_row(i)
-        st.rerun()
+    hcols[3].markdown("**Utnyttelsesgrad**")
+    if hcols[3].button("i", key="util_info_btn", help="Hva betyr Utnyttelsesgrad?"):
+        toggle_util_info()
 
-    # consultant
-    current_consultant_label = consultant_label_by_id.get(
-        row["consultant_id"], list(consultant_options.keys())[0]
-    )
-    consul_label = cols[1].selectbox(
-        "", options=list(consultant_options.keys()),
-        index=list(consultant_options.keys()).index(current_consultant_label),
-        key=f"consultant_{i}"
-    )
-    consul_id = consultant_options[consul_label]
-    consul = consultant_by_id[consul_id]
-    cols[1].caption(
-        f"Årslønn: **{int(consul['salary']):,} kr**".replace(",", " "))
-
-    # dates under consultant
-    date_cols = cols[1].columns(2)
-    start_date = date_cols[0].date_input("Fra", value=row.get(
-        "start_date", datetime.date.today()), key=f"start_date_{i}")
-    end_date = date_cols[1].date_input(
-        "Til", value=row.get("end_date", datetime.date.today() + datetime.timedelta(days=30)), key=f"end_date_{i}"
-    )
-    if start_date > end_date:
-        cols[1].error("Ugyldig datointervall (Fra > Til).")
-
-    # project select
-    current_project_label = project_label_by_id.get(
-        row["project_id"], list(project_options.keys())[0])
-    proj_label = cols[2].selectbox(
-        "", options=list(project_options.keys()),
-        index=list(project_options.keys()).index(current_project_label),
-        key=f"project_{i}"
-    )
-    proj_id = project_options[proj_label]
-    proj = project_by_id[proj_id]
-    cols[2].caption(
-        f"Timepris: **{int(proj['hourly_rate']):,} kr**".replace(",", " "))
-
-    # work percent (%) under project
-    work_pct = cols[2].slider(
-        "Arbeidsprosent (%)", 0, 100, value=row.get("consultant_work_pct", 100), step=5, key=f"workpct_row_{i}",
-        help="Andel av tiden som faktisk jobbes i perioden (tar høyde for ferie/sykefravær)."
-    )
+    hcols[4].markdown("**Prosjektbelastning**")
+    if hcols[4].button("i", key="proj_info_btn", help="Hva betyr Prosjektbelastning?"):
+        toggle_proj_info()
 
-    # utilization (0–1)
-    util_default = float(
-        row.get("utilization", consul.get("default_utilization", 0.8)))
-    util = cols[3].slider("", 0.0, 1.0, value=util_default,
-                          step=0.05, key=f"util_{i}")
+    if st.session_state.get("show_util_info"):
+        st.info(
+            "**Utnyttelsesgrad:** Andel av en konsulents arbeidstid brukt til arbeid i perioden.\n"
+            "Eksempel: `0.8` betyr 80% av tiden er utnyttet (tilgjengelige fakturerbare timer påvirkes)."
+        )
+    if st.session_state.get("show_proj_info"):
+        st.info(
+            "**Prosjektbelastning:** Andel av den utnyttede tiden som går til dette prosjektet.\n"
+            "Eksempel: `utnyttelse=0.8`, `prosjektbelastning=0.5` → 0.8 * 0.5 = 0.4 (40% av totaltid)."
+        )
 
-    # project load (0–1)
-    project_percent = cols[4].slider(
-        "Prosjektbelastning", 0.0, 1.0, value=row.get("project_percent", 1.0), step=0.05, key=f"proj_pct_{i}"
-    )
+    for i, row in enumerate(list(st.session_state.rows)):
+        cols = st.columns(cols_spec)
 
-    # ---------- Utlegg (inline, no expander) ----------
-    cols[2].markdown("**Utlegg**")
-    utlegg_mode = cols[2].selectbox(
-        "Modus", ["Prosent", "Manuelt"],
-        index=["Prosent", "Manuelt"].index(row.get("utlegg_mode", "Prosent")),
-        key=f"utlegg_mode_{i}"
-    )
-    expense_pct = row.get("expense_pct", 0.0)
-
-    if utlegg_mode == "Prosent":
-        expense_pct = cols[2].number_input(
-            "Utlegg (%)",
-            min_value=0.0, max_value=1.0,
-            value=float(expense_pct), step=0.01,
-            key=f"expense_pct_{i}",
-            help="Andel (0–1) av inntekt som utlegg."
+        # remove
+        if cols[0].button("–", key=f"remove_{i}"):
+            remove_row(i)
+            st.rerun(scope="fragment")
+
+        # consultant
+        current_consultant_label = consultant_label_by_id.get(
+            row["consultant_id"], consultant_labels[0]
         )
-    else:
-        # Manual inline entries
-        while len(st.session_state.manual_expenses) < len(st.session_state.rows):
-            st.session_state.manual_expenses.append([])
-
-        cols[2].markdown(
-            "_Legg til én eller flere linjer med Type og Beløp (kr)._")
-
-        if cols[2].button("+ Legg til utlegg", key=f"add_manual_exp_inline_{i}"):
-            st.session_state.manual_expenses[i].append(
-                {"type": manual_expense_types[0], "amount": 0.0})
-            st.rerun()
-
-        for ei, exp in enumerate(list(st.session_state.manual_expenses[i])):
-            il_cols = cols[2].columns([3, 2, 1])  # Type | Amount | remove
-            etype = il_cols[0].selectbox(
-                "Type", options=manual_expense_types,
-                index=manual_expense_types.index(
-                    exp.get("type", manual_expense_types[0])),
-                key=f"exp_type_inline_{i}_{ei}"
-            )
-            eamount = il_cols[1].number_input(
-                "Beløp (kr)", min_value=0.0, value=float(exp.get("amount", 0.0)), key=f"exp_amount_inline_{i}_{ei}"
-            )
-            if il_cols[2].button("–", key=f"exp_remove_inline_{i}_{ei}"):
-                st.session_state.manual_expenses[i].pop(ei)
-                st.rerun()
-            # update item
-            st.session_state.manual_expenses[i][ei] = {
-                "type": etype, "amount": float(eamount)}
-
-        # Local sum for manual utlegg on this row
-        manual_sum = sum(exp.get("amount", 0.0)
-                         for exp in st.session_state.manual_expenses[i])
+        consul_label = cols[1].selectbox(
+            "", options=consultant_labels,
+            index=consultant_label_index[current_consultant_label],
+            key=f"consultant_{i}"
+        )
+        consul_id = consultant_options[consul_label]
+        consul = consultant_by_id[consul_id]
+        cols[1].caption(
+            f"Årslønn: **{int(consul['salary']):,} kr**".replace(",", " "))
+
+        # dates under consultant
+        date_cols = cols[1].columns(2)
+        start_date = date_cols[0].date_input("Fra", value=row.get(
+            "start_date", datetime.date.today()), key=f"start_date_{i}")
+        end_date = date_cols[1].date_input(
+            "Til", value=row.get("end_date", datetime.date.today() + datetime.timedelta(days=30)), key=f"end_date_{i}"
+        )
+        if start_date > end_date:
+            cols[1].error("Ugyldig datointervall (Fra > Til).")
+
+        # project select
+        current_project_label = project_label_by_id.get(
+            row["project_id"], project_labels[0])
+        proj_label = cols[2].selectbox(
+            "", options=project_labels,
+            index=project_label_index[current_project_label],
+            key=f"project_{i}"
+        )
+        proj_id = project_options[proj_label]
+        proj = project_by_id[proj_id]
         cols[2].caption(
-            f"**Sum utlegg (manuelt): {manual_sum:,.0f} kr**".replace(",", " "))
-
-    # Update state row
-    st.session_state.rows[i] = {
-        "consultant_id": consul_id,
-        "project_id": proj_id,
-        "utilization": util,
-        "project_percent": project_percent,
-        "consultant_work_pct": work_pct,
-        "start_date": start_date,
-        "end_date": end_date,
-        "utlegg_mode": utlegg_mode,
-        "expense_pct": expense_pct,
+            f"Timepris: **{int(proj['hourly_rate']):,} kr**".replace(",", " "))
+
+        # work percent (%) under project
+        work_pct = cols[2].slider(
+            "Arbeidsprosent (%)", 0, 100, value=row.get("consultant_work_pct", 100), step=5, key=f"workpct_row_{i}",
+            help="Andel av tiden som faktisk jobbes i perioden (tar høyde for ferie/sykefravær)."
+        )
+
+        # utilization (0–1)
+        util_default = float(
+            row.get("utilization", consul.get("default_utilization", 0.8)))
+        util = cols[3].slider("", 0.0, 1.0, value=util_default,
+                              step=0.05, key=f"util_{i}")
+
+        # project load (0–1)
+        project_percent = cols[4].slider(
+            "Prosjektbelastning", 0.0, 1.0, value=row.get("project_percent", 1.0), step=0.05, key=f"proj_pct_{i}"
+        )
+
+        # ---------- Utlegg (inline, no expander) ----------
+        cols[2].markdown("**Utlegg**")
+        utlegg_mode = cols[2].selectbox(
+            "Modus", utlegg_modes,
+            index=utlegg_modes.index(row.get("utlegg_mode", "Prosent")),
+            key=f"utlegg_mode_{i}"
+        )
+        expense_pct = row.get("expense_pct", 0.0)
+
+        if utlegg_mode == "Prosent":
+            expense_pct = cols[2].number_input(
+                "Utlegg (%)",
+                min_value=0.0, max_value=1.0,
+                value=float(expense_pct), step=0.01,
+                key=f"expense_pct_{i}",
+                help="Andel (0–1) av inntekt som utlegg."
+            )
+        else:
+            # Manual inline entries
+            while len(st.session_state.manual_expenses) < len(st.session_state.rows):
+                st.session_state.manual_expenses.append([])
+
+            cols[2].markdown(
+                "_Legg til én eller flere linjer med Type og Beløp (kr)._")
+
+            if cols[2].button("+ Legg til utlegg", key=f"add_manual_exp_inline_{i}"):
+                st.session_state.manual_expenses[i].append(
+                    {"type": manual_expense_types[0], "amount": 0.0})
+                st.rerun(scope="fragment")
+
+            for ei, exp in enumerate(list(st.session_state.manual_expenses[i])):
+                il_cols = cols[2].columns([3, 2, 1])  # Type | Amount | remove
+                etype = il_cols[0].selectbox(
+                    "Type", options=manual_expense_types,
+                    index=manual_expense_types.index(
+                        exp.get("type", manual_expense_types[0])),
+                    key=f"exp_type_inline_{i}_{ei}"
+                )
+                eamount = il_cols[1].number_input(
+                    "Beløp (kr)", min_value=0.0, value=float(exp.get("amount", 0.0)), key=f"exp_amount_inline_{i}_{ei}"
+                )
+                if il_cols[2].button("–", key=f"exp_remove_inline_{i}_{ei}"):
+                    st.session_state.manual_expenses[i].pop(ei)
+                    st.rerun(scope="fragment")
+                # update item
+                st.session_state.manual_expenses[i][ei] = {
+                    "type": etype, "amount": float(eamount)}
+
+            # Local sum for manual utlegg on this row
+            manual_sum = sum(exp.get("amount", 0.0)
+                             for exp in st.session_state.manual_expenses[i])
+            cols[2].caption(
+                f"**Sum utlegg (manuelt): {manual_sum:,.0f} kr**".replace(",", " "))
+
+        # Update state row
+        st.session_state.rows[i] = {
+            "consultant_id": consul_id,
+            "project_id": proj_id,
+            "utilization": util,
+            "project_percent": project_percent,
+            "consultant_work_pct": work_pct,
+            "start_date": start_date,
+            "end_date": end_date,
+            "utlegg_mode": utlegg_mode,
+            "expense_pct": expense_pct,
+        }
+
+
+# ========== Rutenett (st.data_editor) ==========
+GRID_COLUMNS = {
+    # kolonne i rutenettet -> felt i st.session_state.rows
+    "Konsulent": "consultant_id",
+    "Prosjekt": "project_id",
+    "Fra": "start_date",
+    "Til": "end_date",
+    "Arbeidsprosent (%)": "consultant_work_pct",
+    "Utnyttelsesgrad": "utilization",
+    "Prosjektbelastning": "project_percent",
+    "Utlegg modus": "utlegg_mode",
+    "Utlegg (%)": "expense_pct",
+}
+
+
+def _missing(value):
+    # None, NaN, NaT og pd.NA (som ikke kan sammenlignes)
+    try:
+        return value is None or bool(value != value)
+    except TypeError:
+        return True
+
+
+def _as_date(value, default):
+    # data_editor kan gi tilbake pandas.Timestamp, datetime eller None
+    if _missing(value):
+        return default
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def _grid_rows_from_frame(frame):
+    """Redigert DataFrame -> (rows, manual_expenses). `_rad` er opprinnelig
+    radnummer (tomt for nye rader), slik at manuelle utlegg følger raden."""
+    today = datetime.date.today()
+    old_expenses = st.session_state.manual_expenses
+    rows, expenses = [], []
+    for rec in frame.to_dict("records"):
+        consultant_id = consultant_options.get(rec["Konsulent"], consultants[0]["id"])
+        default_util = float(consultant_by_id[consultant_id].get("default_utilization", 0.8))
+
+        def num(column, default):
+            value = rec.get(column)
+            return default if _missing(value) else float(value)
+
+        rows.append({
+            "consultant_id": consultant_id,
+            "project_id": project_options.get(rec["Prosjekt"], projects[0]["id"]),
+            "utilization": num("Utnyttelsesgrad", default_util),
+            "project_percent": num("Prosjektbelastning", 1.0),
+            "consultant_work_pct": int(num("Arbeidsprosent (%)", 100)),
+            "start_date": _as_date(rec.get("Fra"), today),
+            "end_date": _as_date(rec.get("Til"), today + datetime.timedelta(days=30)),
+            "utlegg_mode": rec.get("Utlegg modus") or "Prosent",
+            "expense_pct": num("Utlegg (%)", 0.0),
+        })
+        old = rec.get("_rad")
+        keep = not _missing(old) and int(old) < len(old_expenses)
+        expenses.append(old_expenses[int(old)] if keep else [])
+    return rows, expenses
+
+
+def render_grid_editor():
+    import pandas as pd  # tung import, kun i rutenett-modus
+
+    records = []
+    for i, row in enumerate(st.session_state.rows):
+        rec = {col: row.get(field) for col, field in GRID_COLUMNS.items()}
+        rec["Konsulent"] = consultant_label_by_id.get(row["consultant_id"], consultant_labels[0])
+        rec["Prosjekt"] = project_label_by_id.get(row["project_id"], project_labels[0])
+        rec["Manuelle utlegg (kr)"] = sum(
+            float(x.get("amount", 0.0)) for x in st.session_state.manual_expenses[i])
+        rec["_rad"] = i
+        records.append(rec)
+    frame = pd.DataFrame(records, columns=[*GRID_COLUMNS, "Manuelle utlegg (kr)", "_rad"])
+
+    today = datetime.date.today()
+    column_config = {
+        "Konsulent": st.column_config.SelectboxColumn(
+            options=consultant_labels, required=True, default=consultant_labels[0], width="medium"),
+        "Prosjekt": st.column_config.SelectboxColumn(
+            options=project_labels, required=True, default=project_labels[0], width="medium"),
+        "Fra": st.column_config.DateColumn(format="DD.MM.YYYY", default=today, required=True),
+        "Til": st.column_config.DateColumn(
+            format="DD.MM.YYYY", default=today + datetime.timedelta(days=30), required=True),
+        "Arbeidsprosent (%)": st.column_config.NumberColumn(
+            min_value=0, max_value=100, step=5, default=100, format="%d %%",
+            help="Andel av tiden som faktisk jobbes i perioden (tar høyde for ferie/sykefravær)."),
+        "Utnyttelsesgrad": st.column_config.NumberColumn(
+            min_value=0.0, max_value=1.0, step=0.05, default=0.8, format="%.2f",
+            help="Andel av en konsulents arbeidstid brukt til arbeid i perioden (0–1)."),
+        "Prosjektbelastning": st.column_config.NumberColumn(
+            min_value=0.0, max_value=1.0, step=0.05, default=1.0, format="%.2f",
+            help="Andel av den utnyttede tiden som går til dette prosjektet (0–1)."),
+        "Utlegg modus": st.column_config.SelectboxColumn(
+            options=utlegg_modes, default="Prosent", required=True),
+        "Utlegg (%)": st.column_config.NumberColumn(
+            min_value=0.0, max_value=1.0, step=0.01, default=0.0, format="%.2f",
+            help="Andel (0–1) av inntekt som utlegg (modus Prosent)."),
+        "Manuelle utlegg (kr)": st.column_config.NumberColumn(
+            disabled=True, format="%.0f",
+            help="Manuelle utleggslinjer redigeres i Skjema-visningen."),
+        "_rad": None,  # skjult: opprinnelig radnummer
     }
 
+    # Skjemaet samler alle endringer: ingen ny kjøring per celle, bare ved lagring
+    with st.form("grid_editor"):
+        edited = st.data_editor(
+            frame, column_config=column_config, num_rows="dynamic",
+            hide_index=True, use_container_width=True,
+            # Ny nøkkel etter lagring, så gamle celleendringer ikke legges på de nye radene
+            key=f"grid_editor_{st.session_state.get('grid_version', 0)}")
+        saved = st.form_submit_button("Lagre endringer")
+
+    if saved:
+        rows, expenses = _grid_rows_from_frame(edited)
+        st.session_state.rows = rows
+        st.session_state.manual_expenses = expenses
+        st.session_state.grid_version = st.session_state.get("grid_version", 0) + 1
+        st.rerun(scope="fragment")
+
+    invalid = [i + 1 for i, r in enumerate(st.session_state.rows)
+               if r["start_date"] > r["end_date"]]
+    if invalid:
+        st.error(f"Ugyldig datointervall (Fra > Til) på rad {', '.join(map(str, invalid))}.")
+
+
+@st.fragment
+def row_editor():
+    """Radene er et eget fragment: en endret rad kjører bare denne delen på
+    nytt, ikke henting av lister, beregning og resultatvisning."""
+    col1, col2, col3 = st.columns([1, 1, 8])
+    with col1:
+        st.button("+ Legg til rad", on_click=add_row, key="add_row")
+    with col2:
+        if st.button("🗑️ Slett all data", key="clear_all_btn"):
+            clear_all_data()
+            st.rerun(scope="fragment")
+    if edit_mode == "Rutenett":
+        render_grid_editor()
+    else:
+        render_form_rows()
+
+
+row_editor()
+
 # ========== Build assignments (with row_index) ==========
-assignments = []
-for idx, row in enumerate(st.session_state.rows):
-    if row["start_date"] > row["end_date"]:
-        continue
-    work_pct_percent = row.get("consultant_work_pct", 100)
-    work_pct_frac = max(0.0, min(1.0, float(work_pct_percent) / 100.0))
-    assignments.append({
-        "row_index": idx,  # helps match results back to front-end row
-        "consultant_id": row["consultant_id"],
-        "project_id": row["project_id"],
-        "utilization": row["utilization"],
-        "project_percent": row["project_percent"],
-        "consultant_work_pct": work_pct_frac,
-        "start_date": row["start_date"].isoformat(),
-        "end_date": row["end_date"].isoformat(),
-        "utlegg_mode": row.get("utlegg_mode", "Prosent"),
-        "expense_pct": row.get("expense_pct", 0.0),
-    })
+def build_assignments():
+    assignments = []
+    for idx, row in enumerate(st.session_state.rows):
+        if row["start_date"] > row["end_date"]:
+            continue
+        work_pct_percent = row.get("consultant_work_pct", 100)
+        work_pct_frac = max(0.0, min(1.0, float(work_pct_percent) / 100.0))
+        manual = (st.session_state.manual_expenses[idx]
+                  if idx < len(st.session_state.manual_expenses) else [])
+        assignments.append({
+            "row_index": idx,  # helps match results back to front-end row
+            "consultant_id": row["consultant_id"],
+            "project_id": row["project_id"],
+            "utilization": row["utilization"],
+            "project_percent": row["project_percent"],
+            "consultant_work_pct": work_pct_frac,
+            "start_date": row["start_date"].isoformat(),
+            "end_date": row["end_date"].isoformat(),
+            "utlegg_mode": row.get("utlegg_mode", "Prosent"),
+            "expense_pct": row.get("expense_pct", 0.0),
+            # Manuelle utlegg følger raden (også når bare endrede rader sendes)
+            "manual_expenses": list(manual),
+        })
+    return assignments
+
+
+def month_bounds(month_num: int):
+    year = datetime.date.today().year
+    month_start = datetime.date(year, month_num, 1)
+    if month_num == 12:
+        month_end = datetime.date(year, 12, 31)
+    else:
+        month_end = datetime.date(year, month_num + 1, 1) - datetime.timedelta(days=1)
+    return month_start, month_end
+
+
+def assignments_in_month(assignments, month_num: int):
+    # Only assignments that overlap with the selected month
+    month_start, month_end = month_bounds(month_num)
+    return [a for a in assignments
+            if datetime.date.fromisoformat(a["start_date"]) <= month_end
+            and datetime.date.fromisoformat(a["end_date"]) >= month_start]
+
 
 left, right = st.columns([1, 1])
 with left:
-    yearly_hours = st.number_input(
-        "Årlige arbeidstimer", min_value=1000, max_value=2200, value=1625)
+    st.number_input(
+        "Årlige arbeidstimer", min_value=1000, max_value=2200, value=1625, key="yearly_hours")
 with right:
-    pex = st.number_input("PEX (%)", min_value=0.0,
-                          max_value=1.0, value=0.32, help="Sosiale kostnader")
+    st.number_input("PEX (%)", min_value=0.0,
+                    max_value=1.0, value=0.32, help="Sosiale kostnader", key="pex")
 
 # ========== Calculate ==========
-col1, col2, col3 = st.columns([1, 1, 8])
-with col1:
-    if st.button("Beregn EBIT"):
-        # Get selected month as number (1-12)
-        selected_month_num = months.index(selected_month) + 1
+# Resultat per rad caches på en nøkkel av (rad uten row_index, felles parametre,
+# dataversjoner). Endret lønn, timepris eller innstillinger gir nye nøkler.
+# Ny beregning sender bare rader som ikke er beregnet med akkurat disse verdiene;
+# med cost_mode "row" er hver rad uavhengig, så avdelingssummen er summen av radene.
+AUTO_CALC_POLL_SECONDS = 0.5
+AUTO_CALC_DEBOUNCE_SECONDS = 1.0
 
-        # Get current year (or you could add a year selector)
-        current_year = datetime.date.today().year
+if "row_results" not in st.session_state:
+    st.session_state.row_results = {}
 
-        # Get the first and last day of the selected month
-        if selected_month_num == 12:
-            month_start = datetime.date(current_year, 12, 1)
-            month_end = datetime.date(current_year, 12, 31)
-        else:
-            month_start = datetime.date(current_year, selected_month_num, 1)
-            month_end = datetime.date(
-                current_year, selected_month_num + 1, 1) - datetime.timedelta(days=1)
-
-        # Filter assignments to only include those that overlap with selected month
-        filtered_assignments = []
-        for assignment in assignments:
-            start_date = datetime.date.fromisoformat(assignment["start_date"])
-            end_date = datetime.date.fromisoformat(assignment["end_date"])
-
-            # Check if assignment overlaps with selected month
-            if start_date <= month_end and end_date >= month_start:
-                filtered_assignments.append(assignment)
-
-        if not filtered_assignments:
-            st.warning(
-                f"Ingen konsulenter jobber i {selected_month}. Velg en annen måned eller legg til flere rader.")
-            st.session_state.hovedside_results = None
-        else:
-            month_value = selected_month_num if SEND_MONTH_AS_INDEX else selected_month
-
-            payload = {
-                "assignments": filtered_assignments,
-                "yearly_work_hours": yearly_hours,
-                "pex_pct": pex,
-                "month": month_value,
-                # optional hint to backend (does not break old backends):
-                "client_hints": {"utlegg_included_in_ebit": BACKEND_EBIT_INCLUDES_UTLEGG},
-            }
-
-            # Add manual expenses aligned to rows (empty lists for non-manual rows are fine)
-            if "manual_expenses" in st.session_state:
-                payload["manual_expenses"] = st.session_state.get(
-                    "manual_expenses", [])
-
-            try:
-                r = requests.post(f"{BACKEND_URL}/calculate-ebit",
-                                  json=payload, timeout=30)
-                r.raise_for_status()
-                data = r.json()
-                st.session_state.hovedside_results = data
-                st.success("Beregning fullført")
-            except requests.exceptions.RequestException as e:
-                st.error(
-                    f"Feil ved beregning ({getattr(r, 'status_code', 'unknown')}): {getattr(r, 'text', str(e))}")
-                st.session_state.hovedside_results = None
-            except Exception as e:
-                st.error(f"Feil ved beregning: {e}")
-                st.session_state.hovedside_results = None
 
-with col2:
-    if st.button("🗑️ Slett resultater"):
+def params_month_num() -> int:
+    return months.index(st.session_state.selected_month) + 1
+
+
+def calc_params():
+    return {
+        "yearly_work_hours": st.session_state.yearly_hours,
+        "pex_pct": st.session_state.pex,
+        "month": params_month_num() if SEND_MONTH_AS_INDEX else st.session_state.selected_month,
+        # Lønn og timepris som gjaldt ved månedens start
+        "as_of": month_bounds(params_month_num())[0].isoformat(),
+    }
+
+
+def calc_versions() -> dict:
+    """Versjonene av dataene en beregning leser (fra VersionWatcher)."""
+    current = data_versions(BACKEND_URL)
+    return {k: current.get(k) for k in ("consultants", "projects", "settings")}
+
+
+def row_key(assignment, params, versions) -> str:
+    fields = {k: v for k, v in assignment.items() if k != "row_index"}
+    return json.dumps([fields, params, versions], sort_keys=True, default=str)
+
+
+def run_calculation(assignments, params):
+    """Beregn radene som mangler i cachen og sett sammen et fullt resultat."""
+    cache = st.session_state.row_results
+    versions = calc_versions()
+    keys = [row_key(a, params, versions) for a in assignments]
+    todo = {}
+    for key, a in zip(keys, assignments):
+        if key not in cache:
+            todo.setdefault(key, a)
+
+    if todo:
+        payload = {
+            "assignments": list(todo.values()),
+            **params,
+        }
+        r = requests.post(f"{BACKEND_URL}/calculate-ebit", json=payload, timeout=30)
+        r.raise_for_status()
+        # Results come back in the order the assignments were sent
+        fresh = dict(zip(todo, r.json().get("results", [])))
+        # Gamle nøkler (andre parametre / verdier) kastes
+        st.session_state.row_results = cache = {
+            **{k: cache[k] for k in keys if k in cache}, **fresh}
+
+    results = [{**cache[key], "row_index": a["row_index"]}
+               for key, a in zip(keys, assignments)]
+    # Backend-EBIT inkluderer utlegg (prosent og manuelle linjer) per rad
+    department = {
+        measure: sum(float(r.get(measure, 0.0)) for r in results)
+        for measure in ("income", "cost", "utlegg", "ebit")
+    }
+    return {"results": results, "department": department,
+            "rows_sent": len(todo), "calculated_at": datetime.datetime.now().strftime("%H:%M:%S")}
+
+
+def calculate_now(signature):
+    params = calc_params()
+    filtered_assignments = assignments_in_month(build_assignments(), params_month_num())
+    st.session_state.calc_signature = signature
+    if not filtered_assignments:
+        st.warning(
+            f"Ingen konsulenter jobber i {st.session_state.selected_month}. "
+            "Velg en annen måned eller legg til flere rader.")
         st.session_state.hovedside_results = None
-        st.rerun()
+        return False
+    try:
+        st.session_state.hovedside_results = run_calculation(filtered_assignments, params)
+        return True
+    except requests.exceptions.RequestException as e:
+        r = getattr(e, "response", None)
+        st.error(
+            f"Feil ved beregning ({getattr(r, 'status_code', 'unknown')}): {getattr(r, 'text', str(e))}")
+    except Exception as e:
+        st.error(f"Feil ved beregning: {e}")
+    st.session_state.hovedside_results = None
+    return False
 
-# ========== Display results if they exist ==========
-if st.session_state.hovedside_results:
-    data = st.session_state.hovedside_results
-    st.write("## Resultater per rad")
 
-    results = data.get("results", [])
-    total_utlegg = 0.0
+def scenario_signature() -> str:
+    # Med versjonene beregner auto-beregning på nytt etter endringer på andre sider
+    return json.dumps([build_assignments(), calc_params(), calc_versions()],
+                      sort_keys=True, default=str)
 
-    # Display per-row with utlegg and EBIT adjusted if needed
-    for pos, rowres in enumerate(results):
-        ridx = rowres.get("row_index", pos)
-        if ridx >= len(st.session_state.rows):
-            continue
-        frontend_row = st.session_state.rows[ridx]
-        mode = frontend_row.get("utlegg_mode", "Prosent")
-        exp_pct = float(frontend_row.get("expense_pct", 0.0))
 
-        income = float(rowres.get("income", 0.0))
-        cost = float(rowres.get("cost", 0.0))
-        ebit_backend = float(rowres.get("ebit", income - cost))
-
-        # Compute utlegg cost for the row
-        if mode == "Manuelt":
-            manual_sum = 0.0
-            if "manual_expenses" in st.session_state and ridx < len(st.session_state.manual_expenses):
-                manual_sum = sum(
-                    float(x.get("amount", 0.0)) for x in st.session_state.manual_expenses[ridx]
-                )
-            utlegg_cost = manual_sum
+def calc_trigger():
+    """Beregn-knappen og auto-beregning. Med auto-beregning kjører denne delen
+    (og bare den) hvert halve sekund; den beregner når scenariet har stått
+    uendret i AUTO_CALC_DEBOUNCE_SECONDS."""
+    calculated = False
+    if st.button("Beregn EBIT"):
+        calculated = calculate_now(scenario_signature())
+    elif st.session_state.get("auto_calc"):
+        signature = scenario_signature()
+        now = time.monotonic()
+        if signature == st.session_state.get("calc_signature"):
+            st.session_state.pending_signature = None
+        elif signature != st.session_state.get("pending_signature"):
+            st.session_state.pending_signature = signature
+            st.session_state.pending_since = now
+            st.caption("Endringer registrert – beregner snart …")
+        elif now - st.session_state.pending_since >= AUTO_CALC_DEBOUNCE_SECONDS:
+            st.session_state.pending_signature = None
+            calculated = calculate_now(signature)
         else:
-            utlegg_cost = income * exp_pct
+            st.caption("Endringer registrert – beregner snart …")
+    if calculated:
+        # Resultatdelen er et eget fragment: kjør hele siden på nytt for å vise nye tall
+        st.rerun()
 
-        total_utlegg += utlegg_cost
 
-        # Final EBIT to show
-        if BACKEND_EBIT_INCLUDES_UTLEGG:
-            ebit_to_show = ebit_backend  # already includes utlegg
-        else:
-            ebit_to_show = ebit_backend - utlegg_cost  # adjust to include utlegg
+@st.fragment
+def results_view():
+    if st.button("🗑️ Slett resultater"):
+        st.session_state.hovedside_results = None
+        st.session_state.calc_signature = None
+        st.rerun(scope="fragment")
 
-        # Row line
+    if not st.session_state.hovedside_results:
+        return
+    data = st.session_state.hovedside_results
+    st.caption(
+        f"Beregnet {data.get('calculated_at', '')} – "
+        f"{data.get('rows_sent', 0)} endrede rader sendt til backend")
+    st.write("## Resultater per rad")
+
+    for rowres in data.get("results", []):
+        income = float(rowres.get("income", 0.0))
+        cost = float(rowres.get("cost", 0.0))
+        utlegg = float(rowres.get("utlegg", 0.0))
+        ebit = float(rowres.get("ebit", income - cost - utlegg))
         row_line = (
             f"**{rowres.get('consultant_name', 'Konsulent')}** → **{rowres.get('project_name', 'Prosjekt')}** | "
             f"Inntekt: {income:,.0f} kr | Kostnad: {cost:,.0f} kr | "
-            f"Utlegg: **{utlegg_cost:,.0f} kr** | "
-            f"EBIT (inkl. utlegg): **{ebit_to_show:,.0f} kr**"
+            f"Utlegg: **{utlegg:,.0f} kr** | "
+            f"EBIT (inkl. utlegg): **{ebit:,.0f} kr**"
         ).replace(",", " ")
         st.write(row_line)
 
@@ -501,12 +705,8 @@ if st.session_state.hovedside_results:
     dept = data.get("department", {}) or {}
     dept_income = float(dept.get("income", 0.0))
     dept_cost = float(dept.get("cost", 0.0))
-    dept_ebit_backend = float(dept.get("ebit", dept_income - dept_cost))
-
-    if BACKEND_EBIT_INCLUDES_UTLEGG:
-        dept_ebit_to_show = dept_ebit_backend
-    else:
-        dept_ebit_to_show = dept_ebit_backend - total_utlegg
+    total_utlegg = float(dept.get("utlegg", 0.0))
+    dept_ebit_to_show = float(dept.get("ebit", dept_income - dept_cost - total_utlegg))
 
     st.write(
         f"Inntekt: **{dept_income:,.0f} kr**, "
@@ -529,3 +729,17 @@ if st.session_state.hovedside_results:
         st.plotly_chart(fig, use_container_width=True)
     except Exception:
         st.info("Installer Plotly for graf: `pip install plotly`")
+
+
+col1, col2 = st.columns([1, 4])
+with col2:
+    # Endring av bryteren endrer run_every, så den ligger utenfor fragmentet
+    auto_calc = st.toggle(
+        "Auto-beregn", key="auto_calc",
+        help="Beregner automatisk når radene har stått uendret i ett sekund. "
+             "Bare endrede rader sendes til backend.")
+with col1:
+    st.fragment(calc_trigger, run_every=AUTO_CALC_POLL_SECONDS if auto_calc else None)()
+
+# ========== Display results if they exist ==========
+results_view()
@@ -0,0 +1,161 @@
+# change_events.py
+"""Holder styr på dataversjoner fra backend via /events (server-sent events).
+
+Sidene bruker versjonene som cache-nøkkel, slik at listene kan caches lenge og
+kun hentes på nytt når noe faktisk er endret. Konsulent- og prosjektlistene
+holdes som lokale kopier som oppdateres med små endringssett fra /changes.
+
+Når frontend ser samme datakatalog som backend (EBIT_SNAPSHOT_PATH, se
+docker-compose.yml) leses listene direkte fra backendens binære snapshot
+(backend/snapshot.py) uten HTTP.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+import streamlit as st
+
+
+# backend/ ligger ved siden av frontend/ i samme image
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+SNAPSHOT_PATH = os.getenv("EBIT_SNAPSHOT_PATH")
+
+
+@st.cache_resource
+def get_snapshot_reader(path: str):
+    try:
+        from backend.snapshot import SnapshotReader
+    except ImportError:
+        return None
+    return SnapshotReader(path)
+
+
+def _snapshot():
+    if not SNAPSHOT_PATH:
+        return None
+    reader = get_snapshot_reader(SNAPSHOT_PATH)
+    try:
+        return reader.get() if reader else None
+    except (OSError, ValueError):
+        return None
+
+
+class VersionWatcher:
+    def __init__(self, backend_url: str):
+        self.backend_url = backend_url
+        self.versions = {}
+        self.connected = False
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True,
+                         name="ebit-version-watcher").start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                with requests.get(f"{self.backend_url}/events", stream=True, timeout=(5, 60)) as r:
+                    r.raise_for_status()
+                    backoff = 1.0
+                    event = None
+                    for line in r.iter_lines(decode_unicode=True):
+                        if line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif line.startswith("data:"):
+                            self._apply(event, json.loads(line[5:]))
+            except Exception:
+                pass
+            self.connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _apply(self, event, data):
+        with self._lock:
+            if event == "versions":
+                self.versions = dict(data)
+                self.connected = True
+            elif data.get("resync"):
+                self.connected = False
+            elif event == "change":
+                self.versions[data["collection"]] = data["version"]
+
+    def current(self) -> dict:
+        """Gjeldende versjoner; faller tilbake til /versions uten aktiv strøm."""
+        with self._lock:
+            if self.connected:
+                return dict(self.versions)
+        try:
+            r = requests.get(f"{self.backend_url}/versions", timeout=5)
+            r.raise_for_status()
+            return r.json()
+        except Exception:
+            return {}
+
+
+@st.cache_resource
+def get_version_watcher(backend_url: str) -> VersionWatcher:
+    return VersionWatcher(backend_url)
+
+
+def data_versions(backend_url: str) -> dict:
+    versions = get_version_watcher(backend_url).current()
+    if not versions:
+        # Ukjent versjon -> minuttbasert nøkkel (samme som gammel ttl=60)
+        bucket = int(time.time() // 60)
+        return {"consultants": f"t{bucket}", "projects": f"t{bucket}", "settings": f"t{bucket}"}
+    return versions
+
+
+class CollectionReplica:
+    """Lokal kopi av en samling (konsulenter/prosjekter) oppdatert via /changes."""
+
+    def __init__(self, backend_url: str, collection: str):
+        self.backend_url = backend_url
+        self.collection = collection
+        self.version = None
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        r = requests.get(f"{self.backend_url}/changes", params={
+            "collection": self.collection, "since": self.version or 0}, timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        if data["mode"] == "snapshot":
+            self.items = {x["id"]: x for x in data["items"]}
+        else:
+            for x in data["upserts"]:
+                self.items[x["id"]] = x
+            for rid in data["deletes"]:
+                self.items.pop(rid, None)
+        self.version = data["version"]
+
+    def _from_snapshot(self, version) -> bool:
+        snap = _snapshot()
+        if snap is None:
+            return False
+        snap_version = snap.versions[self.collection]
+        # Snapshotet skrives før endringen publiseres; nyere versjon -> bruk HTTP
+        if isinstance(version, int) and version > snap_version:
+            return False
+        if snap_version != self.version:
+            self.items = {x["id"]: x for x in getattr(snap, self.collection).records()}
+            self.version = snap_version
+        return True
+
+    def get(self, version=None) -> list:
+        with self._lock:
+            local = self.collection in ("consultants", "projects") and self._from_snapshot(version)
+            if not local and (version is None or version != self.version):
+                self._sync()
+            return sorted(self.items.values(), key=lambda x: x["id"])
+
+
+@st.cache_resource
+def get_replica(backend_url: str, collection: str) -> CollectionReplica:
+    return CollectionReplica(backend_url, collection)
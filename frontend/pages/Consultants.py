@@ -2,9 +2,10 @@
 # pages/2_Consultants.py
 import streamlit as st
 import requests
-import pandas as pd
 import os
 
+from change_events import data_versions, get_replica
+
 # Use environment variable for backend URL in production
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 st.set_page_config(page_title="Konsulenter", page_icon="👤", layout="wide")
@@ -12,6 +13,8 @@ st.title("👤 Konsulenter")
 
 
 def rerun():
+    # Egen endring: neste henting synkroniserer kopien uten å vente på /events
+    get_replica(BACKEND_URL, "consultants").version = None
     try:
         st.rerun()
     except Exception:
@@ -42,6 +45,7 @@ st.caption("Kolonner: `Name`, `Salary`, (valgfritt) `DefaultUtilization`")
 file = st.file_uploader("Last opp CSV/XLSX", type=["csv", "xlsx"])
 if file is not None:
     try:
+        import pandas as pd  # tung import, kun ved opplasting
         df = pd.read_csv(file) if file.name.endswith(
             ".csv") else pd.read_excel(file)
         st.dataframe(df.head(20))
@@ -88,9 +92,8 @@ st.divider()
 # --- Liste + Rediger/Slett ---
 st.subheader("Registrerte konsulenter")
 try:
-    r = requests.get(f"{BACKEND_URL}/consultants", timeout=10)
-    r.raise_for_status()
-    data = r.json()
+    # Lokal kopi, oppdatert med endringssett når dataversjonen endres (change_events.py)
+    data = get_replica(BACKEND_URL, "consultants").get(data_versions(BACKEND_URL).get("consultants"))
     if not data:
         st.info("Ingen konsulenter registrert enda.")
     else:
@@ -2,46 +2,29 @@
 # pages/EBIT_Trends.py
 import streamlit as st
 import requests
-import pandas as pd
 import datetime
-from datetime import date, timedelta
 import os
+import time
+
+from change_events import data_versions, get_replica
 
 # Use environment variable for backend URL in production
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
-# Backend EBIT includes utlegg (same as main app.py)
-BACKEND_EBIT_INCLUDES_UTLEGG = False
-
-# ---- Plotly: robust import (app feiler ikke hvis plotly mangler) ----
-try:
-    import plotly.graph_objects as go
-    PLOTLY_AVAILABLE = True
-except Exception:
-    go = None  # type: ignore
-    PLOTLY_AVAILABLE = False
-
-# ---- Kompakt standardhøyde for grafer ----
-CHART_HEIGHT = 360
-
-# ---- Arbeidsdager (man–fre) for måned/år: enkel norsk kalender uten røddager ----
+# ---- Plotly: importeres først når grafene tegnes (raskere kald start) ----
 
 
-def business_days_in_month(year: int, month: int) -> int:
-    """Antall arbeidsdager (man–fre) i gitt måned/år (uten røddager)."""
-    first_day = date(year, month, 1)
-    if month == 12:
-        last_day = date(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        last_day = date(year, month + 1, 1) - timedelta(days=1)
-    total = (last_day - first_day).days + 1
-    return sum(1 for d in range(total) if (first_day + timedelta(days=d)).weekday() < 5)
+def _plotly():
+    """plotly.graph_objects, eller None hvis plotly mangler."""
+    try:
+        import plotly.graph_objects as go
+    except Exception:
+        return None
+    return go
 
 
-def business_days_in_year(year: int) -> int:
-    """Antall arbeidsdager (man–fre) i hele året (uten røddager)."""
-    return sum(business_days_in_month(year, m) for m in range(1, 13))
-
+# ---- Kompakt standardhøyde for grafer ----
+CHART_HEIGHT = 360
 
 st.set_page_config(page_title="EBIT Trends", page_icon="📈", layout="wide")
 st.title("📈 EBIT Trends – Månedlig utvikling")
@@ -52,44 +35,41 @@ st.write(
 )
 
 # ========== Cache helpers ==========
+# Nøklet på dataversjon fra backend: hentes på nytt kun ved endringer.
+# Konsulenter/prosjekter er lokale kopier som oppdateres via /changes.
 
 
-@st.cache_data(ttl=60)
-def fetch_consultants():
-    r = requests.get(f"{BACKEND_URL}/consultants", timeout=10)
-    r.raise_for_status()
-    return r.json()
+def fetch_consultants(version=None):
+    return get_replica(BACKEND_URL, "consultants").get(version)
 
 
-@st.cache_data(ttl=60)
-def fetch_projects():
-    r = requests.get(f"{BACKEND_URL}/projects", timeout=10)
-    r.raise_for_status()
-    return r.json()
+def fetch_projects(version=None):
+    return get_replica(BACKEND_URL, "projects").get(version)
 
 
-@st.cache_data(ttl=60)
-def fetch_settings():
+@st.cache_data(max_entries=4)
+def fetch_settings(version=None):
     r = requests.get(f"{BACKEND_URL}/settings", timeout=10)
     r.raise_for_status()
     return r.json()
 
 
 # ========== Fetch data ==========
+versions = data_versions(BACKEND_URL)
 try:
-    consultants = fetch_consultants()
+    consultants = fetch_consultants(versions.get("consultants"))
 except Exception as e:
     st.error(f"Feil ved henting av konsulenter: {e}")
     st.stop()
 
 try:
-    projects = fetch_projects()
+    projects = fetch_projects(versions.get("projects"))
 except Exception as e:
     st.error(f"Feil ved henting av prosjekter: {e}")
     st.stop()
 
 try:
-    settings = fetch_settings()
+    settings = fetch_settings(versions.get("settings"))
 except Exception:
     st.warning("Kunne ikke hente innstillinger, bruker defaults")
     settings = {"pex_pct": 0.32, "expense_pct": 0.40,
@@ -205,12 +185,41 @@ yearly_hours = float(settings.get("yearly_work_hours", 1625))
 pex = float(settings.get("pex_pct", 0.32))
 
 # ========== Calculate EBIT for each month ==========
+# Beregningen kjører som bakgrunnsjobb i backend (/jobs/trend). Siden poller
+# status, og jobb-id ligger i session_state, så reruns starter ikke på nytt.
 st.subheader("3. Beregn trend")
 
+if "ebit_trends_job" not in st.session_state:
+    st.session_state.ebit_trends_job = None
+
+
+def trend_rows():
+    """Hovedside-rader i formatet /jobs/trend forventer (manuelle utlegg per rad)."""
+    out = []
+    for row_idx, row in enumerate(hovedside_rows):
+        row_start, row_end = row.get("start_date"), row.get("end_date")
+        manual = hovedside_manual_expenses[row_idx] if row_idx < len(
+            hovedside_manual_expenses) else []
+        out.append({
+            "consultant_id": row.get("consultant_id"),
+            "project_id": row.get("project_id"),
+            "utilization": row.get("utilization", 0.8),
+            "project_percent": row.get("project_percent", 1.0),
+            "consultant_work_pct": max(0.0, min(1.0, float(row.get("consultant_work_pct", 100)) / 100.0)),
+            "start_date": row_start if isinstance(row_start, str) else row_start.isoformat(),
+            "end_date": row_end if isinstance(row_end, str) else row_end.isoformat(),
+            "utlegg_mode": row.get("utlegg_mode", "Prosent"),
+            "expense_pct": row.get("expense_pct", 0.0),
+            "manual_expenses": [{"type": x.get("type", "Annet"), "amount": float(x.get("amount", 0.0))}
+                                for x in manual],
+        })
+    return out
+
+
 col1, col2, col3 = st.columns([1.5, 1.5, 6])
 
 with col1:
-    if st.button("🚀 Beregn EBIT-trend", type="primary"):
+    if st.button("🚀 Beregn EBIT-trend", type="primary", disabled=bool(st.session_state.ebit_trends_job)):
         start_idx = months_list.index(start_month)
         end_idx = months_list.index(end_month)
 
@@ -218,178 +227,68 @@ with col1:
             st.error("Start måned må være før slutt måned")
             st.stop()
 
-        monthly_ebit_data = []
-
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-
-        for idx, month_idx in enumerate(range(start_idx, end_idx + 1)):
-            month_num = month_idx + 1
-            month_name = months_list[month_idx]
-
-            progress = (idx + 1) / (end_idx - start_idx + 1)
-            progress_bar.progress(progress)
-            status_text.text(f"Beregner {month_name}...")
-
-            # Finn første/siste dag i måneden
-            if month_idx == 11:  # Desember
-                month_start = date(year, 12, 1)
-                month_end = date(year, 12, 31)
-            else:
-                month_start = date(year, month_idx + 1, 1)
-                month_end = date(year, month_idx + 2, 1) - timedelta(days=1)
-
-            # Bygg assignments for rader som overlapper denne måneden
-            assignments = []
-            row_expense_pcts = {}
-
-            for row_idx, row in enumerate(hovedside_rows):
-                row_start = row.get("start_date")
-                row_end = row.get("end_date")
-                if isinstance(row_start, str):
-                    row_start = date.fromisoformat(row_start)
-                if isinstance(row_end, str):
-                    row_end = date.fromisoformat(row_end)
-
-                # Hopper over rader som ikke overlapper måned
-                if row_start > month_end or row_end < month_start:
-                    continue
-
-                consultant_id = row.get("consultant_id")
-                project_id = row.get("project_id")
-
-                # Filtrering: kun de valgte konsulentene/prosjektene
-                if consultant_id not in filtered_consultant_ids or project_id not in filtered_project_ids:
-                    continue
-
-                work_pct_percent = row.get("consultant_work_pct", 100)
-                work_pct_frac = max(
-                    0.0, min(1.0, float(work_pct_percent) / 100.0))
-
-                actual_start = max(row_start, month_start)
-                actual_end = min(row_end, month_end)
-
-                utlegg_mode = row.get("utlegg_mode", "Prosent")
-                if utlegg_mode == "Manuelt":
-                    # Summer manuelle utlegg fra hovedside for denne raden (tolkes som pr. måned)
-                    manual_sum = 0.0
-                    if row_idx < len(hovedside_manual_expenses):
-                        manual_sum = sum(float(x.get("amount", 0.0))
-                                         for x in hovedside_manual_expenses[row_idx])
-                    row_expense_pcts[row_idx] = ("manual", manual_sum)
-                else:
-                    row_expense_pcts[row_idx] = (
-                        "prosent", row.get("expense_pct", 0.0))
-
-                assignments.append({
-                    "row_index": row_idx,
-                    "consultant_id": consultant_id,
-                    "project_id": project_id,
-                    "utilization": row.get("utilization", 0.8),
-                    "project_percent": row.get("project_percent", 1.0),
-                    "consultant_work_pct": work_pct_frac,
-                    "start_date": actual_start.isoformat(),
-                    "end_date": actual_end.isoformat(),
-                    "utlegg_mode": utlegg_mode,
-                    "expense_pct": row.get("expense_pct", 0.0),
-                })
-
-            # Ingen arbeid denne måneden
-            if not assignments:
-                monthly_ebit_data.append({
-                    "Måned": month_name,
-                    "Måned (num)": month_idx,
-                    "Inntekt (kr)": 0.0,
-                    "Kostnad (kr)": 0.0,
-                    "Utlegg (kr)": 0.0,
-                    "EBIT (kr)": 0.0,
-                })
-                continue
-
-            payload = {
-                "assignments": assignments,
+        try:
+            r = requests.post(f"{BACKEND_URL}/jobs/trend", json={
+                "rows": trend_rows(),
+                "year": int(year),
+                "start_month": start_idx + 1,
+                "end_month": end_idx + 1,
+                "consultant_ids": filtered_consultant_ids,
+                "project_ids": filtered_project_ids,
                 "yearly_work_hours": yearly_hours,
                 "pex_pct": pex,
-                "month": month_num,
-            }
-
-            try:
-                r = requests.post(
-                    f"{BACKEND_URL}/calculate-ebit", json=payload, timeout=30)
-                r.raise_for_status()
-                data = r.json()
-
-                # ---- Arbeidsdagsbasert skalering til månedsnivå ----
-                bd_month = business_days_in_month(year, month_num)
-                bd_year = business_days_in_year(year)
-                month_weight = bd_month / bd_year if bd_year else 1.0
-
-                # Avdelingstall fra backend
-                dept = data.get("department", {}) or {}
-                dept_income = float(dept.get("income", 0.0))
-                dept_cost = float(dept.get("cost", 0.0))
-                dept_ebit_backend = float(
-                    dept.get("ebit", dept_income - dept_cost))
-
-                # Skaler avdelingstall til månedsnivå (arbeidsdager)
-                dept_income_m = dept_income * month_weight
-                dept_cost_m = dept_cost * month_weight
-                dept_ebit_backend_m = dept_ebit_backend * month_weight
-
-                # Skaler rad-inntekter for prosent-utlegg til månedsnivå
-                row_income_scaled = {}
-                for result in data.get("results", []):
-                    rid = result.get("row_index")
-                    rincome = float(result.get("income", 0.0))
-                    row_income_scaled[rid] = rincome * month_weight
-
-                # Utlegg:
-                #  - Manuelle: behandles som pr. måned (ikke skalert)
-                #  - Prosent: følger skalert månedsinntekt
-                utlegg_total = 0.0
-                for ridx, expense_info in row_expense_pcts.items():
-                    mode, value = expense_info
-                    if mode == "manual":
-                        utlegg_total += float(value)
-                    else:
-                        rincome_m = row_income_scaled.get(ridx, 0.0)
-                        utlegg_total += rincome_m * float(value)
-
-                # EBIT for visning (avdeling)
-                if BACKEND_EBIT_INCLUDES_UTLEGG:
-                    dept_ebit_final = dept_ebit_backend_m
-                else:
-                    dept_ebit_final = dept_ebit_backend_m - utlegg_total
-
-                monthly_ebit_data.append({
-                    "Måned": month_name,
-                    "Måned (num)": month_idx,
-                    "Inntekt (kr)": dept_income_m,
-                    "Kostnad (kr)": dept_cost_m,
-                    "Utlegg (kr)": utlegg_total,
-                    "EBIT (kr)": dept_ebit_final,
-                })
-            except Exception as e:
-                st.error(f"Feil ved beregning for {month_name}: {e}")
-                st.session_state.ebit_trends_results = None
-                st.stop()
-
-        progress_bar.progress(1.0)
-        status_text.text("✓ Ferdig!")
-
-        # Lagre resultater i session state
-        st.session_state.ebit_trends_results = monthly_ebit_data if monthly_ebit_data else None
+            }, timeout=30)
+            r.raise_for_status()
+            st.session_state.ebit_trends_job = r.json()["job_id"]
+            st.session_state.ebit_trends_results = None
+        except Exception as e:
+            st.error(f"Kunne ikke starte beregningen: {e}")
 
 with col2:
     if st.button("🗑️ Slett resultater"):
         st.session_state.ebit_trends_results = None
         st.rerun()
 
+# ========== Poll beregningsjobb ==========
+if st.session_state.ebit_trends_job:
+    job_id = st.session_state.ebit_trends_job
+    try:
+        r = requests.get(f"{BACKEND_URL}/jobs/{job_id}", timeout=10)
+        r.raise_for_status()
+        job = r.json()
+    except Exception as e:
+        st.error(f"Mistet kontakten med beregningsjobben: {e}")
+        st.session_state.ebit_trends_job = None
+        job = None
+
+    if job and job["status"] in ("queued", "running"):
+        st.progress(job["progress"], text=job.get("message") or "Beregner...")
+        if st.button("⏹️ Avbryt beregning"):
+            requests.delete(f"{BACKEND_URL}/jobs/{job_id}", timeout=10)
+        time.sleep(0.5)
+        st.rerun()
+    elif job:
+        st.session_state.ebit_trends_job = None
+        if job["status"] == "done":
+            st.session_state.ebit_trends_results = [{
+                "Måned": months_list[int(m["month"][5:7]) - 1],
+                "Måned (num)": int(m["month"][5:7]) - 1,
+                "Inntekt (kr)": m["income"],
+                "Kostnad (kr)": m["cost"],
+                "Utlegg (kr)": m["utlegg"],
+                "EBIT (kr)": m["ebit"],
+            } for m in job["result"]] or None
+        elif job["status"] == "failed":
+            st.error(f"Feil ved beregning: {job.get('error')}")
+        else:
+            st.info("Beregningen ble avbrutt.")
+
 # ========== Display results if they exist ==========
 if st.session_state.ebit_trends_results:
     monthly_ebit_data = st.session_state.ebit_trends_results
 
-    # DataFrame
+    # DataFrame (pandas importeres først når det finnes resultater)
+    import pandas as pd
     df = pd.DataFrame(
         monthly_ebit_data) if monthly_ebit_data else pd.DataFrame()
 
@@ -430,7 +329,8 @@ if st.session_state.ebit_trends_results:
         # ===========================
         #   GRAFER (OPPDELING I 2 x 2)
         # ===========================
-        if not PLOTLY_AVAILABLE:
+        go = _plotly()
+        if go is None:
             st.info(
                 "Plotly er ikke installert. Kjør `pip install plotly`, og sørg for at VS Code bruker riktig venv.")
         else:
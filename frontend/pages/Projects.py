@@ -2,9 +2,10 @@
 # pages/3_Projects.py
 import streamlit as st
 import requests
-import pandas as pd
 import os
 
+from change_events import data_versions, get_replica
+
 # Use environment variable for backend URL in production
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 st.set_page_config(page_title="Prosjekter", page_icon="📁", layout="wide")
@@ -12,6 +13,8 @@ st.title("📁 Prosjekter")
 
 
 def rerun():
+    # Egen endring: neste henting synkroniserer kopien uten å vente på /events
+    get_replica(BACKEND_URL, "projects").version = None
     try:
         st.rerun()
     except Exception:
@@ -40,6 +43,7 @@ st.caption("Kolonner: `Name`, `HourlyRate`")
 file = st.file_uploader("Last opp CSV/XLSX", type=["csv", "xlsx"])
 if file is not None:
     try:
+        import pandas as pd  # tung import, kun ved opplasting
         df = pd.read_csv(file) if file.name.endswith(
             ".csv") else pd.read_excel(file)
         st.dataframe(df.head(20))
@@ -83,9 +87,8 @@ st.divider()
 # --- Liste + Rediger/Slett ---
 st.subheader("Registrerte prosjekter")
 try:
-    r = requests.get(f"{BACKEND_URL}/projects", timeout=10)
-    r.raise_for_status()
-    data = r.json()
+    # Lokal kopi, oppdatert med endringssett når dataversjonen endres (change_events.py)
+    data = get_replica(BACKEND_URL, "projects").get(data_versions(BACKEND_URL).get("projects"))
     if not data:
         st.info("Ingen prosjekter registrert enda.")
     else:
@@ -1,11 +1,13 @@
 
 # pages/1_Settings.py
 import streamlit as st
-import pandas as pd
+import csv
 import io
 import requests
 import os
 
+from change_events import data_versions
+
 # Use environment variable for backend URL in production
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
@@ -13,11 +15,17 @@ st.set_page_config(page_title="Innstillinger", page_icon="⚙️", layout="wide"
 st.title("⚙️ Innstillinger")
 
 
+# Caches per settings-versjon (change_events.py); hentes på nytt kun ved endring
+@st.cache_data(max_entries=4)
+def fetch_settings(version=None):
+    r = requests.get(f"{BACKEND_URL}/settings", timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+
 def get_settings():
     try:
-        r = requests.get(f"{BACKEND_URL}/settings", timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return fetch_settings(data_versions(BACKEND_URL).get("settings"))
     except Exception as e:
         st.error(f"Kunne ikke hente innstillinger: {e}")
         return {"pex_pct": 0.32, "expense_pct": 0.40, "yearly_work_hours": 1625}
@@ -43,6 +51,7 @@ if st.button("Lagre innstillinger"):
             "pex_pct": pex, "expense_pct": expense, "yearly_work_hours": work_hours
         }, timeout=10)
         r.raise_for_status()
+        fetch_settings.clear()
         st.success("Innstillinger lagret.")
     except Exception as e:
         st.error(f"Feil ved lagring: {e}")
@@ -50,20 +59,19 @@ if st.button("Lagre innstillinger"):
 st.divider()
 
 st.subheader("Malfiler (CSV)")
-cons_template = pd.DataFrame({
-    "Name": ["Ola Nordmann", "Kari Nordmann"],
-    "Salary": [800000, 750000],
-    "DefaultUtilization": [0.85, 0.80],
-})
-proj_template = pd.DataFrame({
-    "Name": ["Prosjekt Alpha", "Prosjekt Beta"],
-    "HourlyRate": [1400, 1200],
-})
-
+# Malfilene skrives med csv-modulen, så siden ikke trenger pandas før opplasting
 cbuf = io.StringIO()
-cons_template.to_csv(cbuf, index=False)
+csv.writer(cbuf, lineterminator="\n").writerows([
+    ["Name", "Salary", "DefaultUtilization"],
+    ["Ola Nordmann", 800000, 0.85],
+    ["Kari Nordmann", 750000, 0.8],
+])
 pbuf = io.StringIO()
-proj_template.to_csv(pbuf, index=False)
+csv.writer(pbuf, lineterminator="\n").writerows([
+    ["Name", "HourlyRate"],
+    ["Prosjekt Alpha", 1400],
+    ["Prosjekt Beta", 1200],
+])
 
 cc1, cc2 = st.columns(2)
 with cc1:
@@ -95,6 +103,7 @@ with tab1:
         "Last opp konsulent-fil", type=["csv", "xlsx"], key="cons_file")
     if cons_file:
         try:
+            import pandas as pd  # tung import, kun ved opplasting
             cdf = pd.read_csv(cons_file) if cons_file.name.endswith(
                 ".csv") else pd.read_excel(cons_file)
             st.write("Forhåndsvisning (topp 20 rader):")
@@ -120,6 +129,7 @@ with tab2:
         "Last opp prosjekt-fil", type=["csv", "xlsx"], key="proj_file")
     if proj_file:
         try:
+            import pandas as pd
             pdf = pd.read_csv(proj_file) if proj_file.name.endswith(
                 ".csv") else pd.read_excel(proj_file)
             st.write("Forhåndsvisning (topp 20 rader):")
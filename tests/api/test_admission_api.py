@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.main import app
+from client import EbitClient
+
+client = TestClient(app)
+
+ROW = {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0}
+
+
+def test_full_gate_answers_503_with_retry_after(monkeypatch):
+    gate = main._gates["calculate"]
+    monkeypatch.setattr(gate, "limit", 0)
+    monkeypatch.setattr(gate, "queue", 0)
+    rejected = gate.rejected
+
+    r = client.post("/calculate-ebit", json={"assignments": [ROW]})
+    assert r.status_code == 503
+    assert int(r.headers["retry-after"]) >= 1
+    assert gate.rejected == rejected + 1
+    # Cheap routes don't pass a gate
+    assert client.get("/health").json() == {"status": "ok"}
+    assert client.get("/consultants").status_code == 200
+    assert client.get("/admission").json()["calculate"]["rejected"] == rejected + 1
+
+
+def test_large_calculation_runs_as_job(monkeypatch):
+    monkeypatch.setattr(main, "BACKGROUND_ROWS", 2)
+    direct = client.post("/calculate-ebit", json={"assignments": [ROW]}).json()
+
+    r = client.post("/calculate-ebit", json={"assignments": [ROW, ROW]})
+    assert r.status_code == 202
+    assert r.headers["location"] == f"/jobs/{r.json()['job_id']}"
+    assert r.json()["kind"] == "calculate"
+
+    # The client waits for the job and returns the usual result
+    result = EbitClient(http=client).calculate_ebit([ROW, ROW])
+    assert len(result["results"]) == 2
+    assert result["results"][0]["ebit"] == direct["results"][0]["ebit"]
+    assert result["department"]["ebit"] == 2 * direct["department"]["ebit"]
+
+
+def test_coalesced_requests_take_one_slot(monkeypatch):
+    gate = main._gates["calculate"]
+    # One slot, no queue: followers would be rejected if they needed a slot
+    monkeypatch.setattr(gate, "limit", 1)
+    monkeypatch.setattr(gate, "queue", 0)
+    calls = []
+    calculate = main._calculate
+
+    def slow_calculate(cols, params):
+        calls.append(1)
+        time.sleep(0.1)
+        return calculate(cols, params)
+
+    monkeypatch.setattr(main, "_calculate", slow_calculate)
+    admitted = gate.admitted
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await asyncio.gather(*[c.post("/calculate-ebit", json={"assignments": [ROW]})
+                                          for _ in range(4)])
+
+    responses = asyncio.run(burst())
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len(calls) == 1
+    assert gate.admitted == admitted + 1
+
+
+def _post_chunked(path, body):
+    async def chunks():
+        yield body
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            # Sent without Content-Length, so it counts as a large body
+            return await c.post(path, content=chunks(),
+                                headers={"Content-Type": "application/json"})
+
+    return asyncio.run(main())
+
+
+def test_saturated_large_gate_rejects_before_parsing(monkeypatch):
+    large, calculate = main._gates["large"], main._gates["calculate"]
+    monkeypatch.setattr(large, "limit", 0)
+    monkeypatch.setattr(large, "queue", 0)
+    reads = []
+    read_body = main._read_body
+
+    async def counting_read_body(request, list_field):
+        reads.append(1)
+        return await read_body(request, list_field)
+
+    monkeypatch.setattr(main, "_read_body", counting_read_body)
+    body = json.dumps({"assignments": [ROW]}).encode()
+
+    r = _post_chunked("/calculate-ebit", body)
+    assert r.status_code == 503
+    assert reads == []
+
+    # With a free slot the large gate alone admits it
+    monkeypatch.setattr(large, "limit", 1)
+    admitted = (large.admitted, calculate.admitted)
+    r = _post_chunked("/calculate-ebit", body)
+    assert r.status_code == 200 and reads == [1]
+    assert (large.admitted, calculate.admitted) == (admitted[0] + 1, admitted[1])
@@ -1,5 +1,12 @@
 
+import asyncio
+import time
+
+import httpx
+import pytest
 from fastapi.testclient import TestClient
+
+from backend import main
 from backend.main import app
 
 client = TestClient(app)
@@ -32,3 +39,111 @@ def test_calculate_ebit_api():
     data = response.json()
     assert "results" in data
     assert "department" in data
+
+
+def test_calculate_ebit_consultant_cost_mode():
+    rows = [
+        {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 0.75},
+        {"consultant_id": 1, "project_id": 2, "utilization": 0.8, "project_percent": 0.25},
+    ]
+    per_row = client.post("/calculate-ebit", json={"assignments": rows}).json()
+    grouped = client.post(
+        "/calculate-ebit", json={"assignments": rows, "cost_mode": "consultant"}).json()
+
+    one_salary = per_row["results"][0]["cost"]
+    assert abs(per_row["department"]["cost"] - 2 * one_salary) < 1e-6
+    assert abs(grouped["department"]["cost"] - one_salary) < 1e-6
+    assert abs(grouped["results"][0]["cost"] - 0.75 * one_salary) < 1e-6
+
+    (consultant,) = grouped["consultants"]
+    assert consultant["consultant_id"] == 1
+    assert [p["project_id"] for p in grouped["projects"]] == [1, 2]
+
+
+def test_calculate_ebit_includes_utlegg():
+    rows = [
+        {"row_index": 3, "consultant_id": 1, "project_id": 1, "utilization": 0.8,
+         "project_percent": 1.0, "utlegg_mode": "Prosent", "expense_pct": 0.1},
+        {"row_index": 5, "consultant_id": 2, "project_id": 2, "utilization": 0.5,
+         "project_percent": 1.0, "utlegg_mode": "Manuelt",
+         "manual_expenses": [{"type": "Reise", "amount": 4000},
+                             {"type": "Hotell", "amount": 1500}]},
+    ]
+    data = client.post("/calculate-ebit", json={"assignments": rows}).json()
+    first, second = data["results"]
+    assert [first["row_index"], second["row_index"]] == [3, 5]
+    assert abs(first["utlegg"] - 0.1 * first["income"]) < 1e-6
+    assert second["utlegg"] == 5500
+    for r in data["results"]:
+        assert abs(r["ebit"] - (r["income"] - r["cost"] - r["utlegg"])) < 1e-6
+
+    dept = data["department"]
+    assert abs(dept["utlegg"] - (first["utlegg"] + 5500)) < 1e-6
+    assert abs(dept["ebit"] - (dept["income"] - dept["cost"] - dept["utlegg"])) < 1e-6
+    assert dept["utlegg_by_type"] == {
+        "Prosent": first["utlegg"], "Reise": 4000, "Hotell": 1500}
+
+
+def test_identical_concurrent_requests_are_coalesced(monkeypatch):
+    calls = []
+    calculate = main._calculate
+
+    def slow_calculate(cols, params):
+        calls.append(1)
+        time.sleep(0.1)
+        return calculate(cols, params)
+
+    monkeypatch.setattr(main, "_calculate", slow_calculate)
+    payload = {"assignments": [{"consultant_id": 1, "project_id": 1,
+                                "utilization": 0.8, "project_percent": 1.0}]}
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await asyncio.gather(*[c.post("/calculate-ebit", json=payload)
+                                          for _ in range(4)])
+
+    responses = asyncio.run(burst())
+    assert len(calls) == 1
+    assert [r.headers.get("x-coalesced") for r in responses].count("1") == 3
+    assert len({r.text for r in responses}) == 1
+
+
+def test_salary_change_is_effective_dated():
+    consultant = client.post("/consultants", json={"name": "Dated", "salary": 500000}).json()
+    cid = consultant["id"]
+    try:
+        r = client.patch(f"/consultants/{cid}",
+                         json={"salary": 550000, "effective_from": "2025-07-01"})
+        assert r.status_code == 200 and r.json()["salary"] == 550000
+        assert client.get(f"/consultants/{cid}/salary-history").json() == [
+            {"effective_from": None, "salary": 500000},
+            {"effective_from": "2025-07-01", "salary": 550000},
+        ]
+
+        def cost(as_of):
+            body = {"as_of": as_of, "assignments": [
+                {"consultant_id": cid, "project_id": 1, "utilization": 0.8,
+                 "project_percent": 1.0}]}
+            return client.post("/calculate-ebit", json=body).json()["results"][0]["cost"]
+
+        # Earlier calculations are not rewritten by the raise
+        assert cost("2025-06-30") == pytest.approx(500000 * 1.72)
+        assert cost("2025-07-01") == pytest.approx(550000 * 1.72)
+        assert client.patch(f"/consultants/{cid}", json={
+            "salary": 1, "effective_from": "juli"}).status_code == 422
+    finally:
+        client.delete(f"/consultants/{cid}")
+
+
+def test_row_without_expense_pct_keeps_baseline_ebit():
+    # expense_pct (0.40) is charged once, in the loaded cost; unset rows have no utlegg
+    row = {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0}
+    data = client.post("/calculate-ebit", json={"assignments": [
+        row, {**row, "expense_pct": None}, {**row, "expense_pct": 0.0}]}).json()
+    for result in data["results"]:
+        assert result["utlegg"] == 0.0
+        assert result["income"] == pytest.approx(0.8 * 1625 * 1200)
+        assert result["cost"] == pytest.approx(600000 * (1 + 0.32 + 0.40))
+        assert result["ebit"] == pytest.approx(528000)
+    assert data["department"]["ebit"] == pytest.approx(3 * 528000)
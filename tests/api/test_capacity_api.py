@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_capacity_check_reports_overbooking():
+    row = {"consultant_id": 1, "project_id": 1, "utilization": 1.0,
+           "project_percent": 1.0, "start_date": "2025-01-01", "end_date": "2025-01-31"}
+    r = client.post("/capacity-check", json={"assignments": [
+        row, {**row, "project_id": 2, "start_date": "2025-01-15"}]})
+    assert r.status_code == 200
+    (item,) = r.json()["overallocations"]
+    assert item["consultant_name"] == "Test Consultant 1"
+    assert item["start_date"] == "2025-01-15"
+
+
+def test_capacity_check_invalid_date():
+    r = client.post("/capacity-check", json={"assignments": [
+        {"consultant_id": 1, "project_id": 1, "utilization": 1.0,
+         "project_percent": 1.0, "start_date": "januar"}]})
+    assert r.status_code == 422
+
+
+def test_capacity_check_rejects_start_after_end():
+    r = client.post("/capacity-check", json={"assignments": [
+        {"consultant_id": 1, "project_id": 1, "utilization": 1.0, "project_percent": 1.0,
+         "start_date": "2025-03-01", "end_date": "2025-02-01"}]})
+    assert r.status_code == 422
+    assert "etter end_date" in r.json()["detail"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from client import AsyncEbitClient, EbitAPIError, EbitClient
+
+ROW = {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0}
+
+timings = []
+api = EbitClient(http=TestClient(app), timing_hooks=[timings.append], bulk_chunk_size=2)
+
+
+def test_etag_cache_and_timing_hooks():
+    timings.clear()
+    first = api.consultants()
+    second = api.consultants()
+    assert first == second
+    assert [t.cached for t in timings] == [False, True]
+    assert timings[1].status_code == 304
+    assert timings[0].bytes_received > 0
+
+
+def test_bulk_upload_is_chunked():
+    timings.clear()
+    items = [{"name": f"Bulk {i}", "salary": 500000} for i in range(5)]
+    created = api.create_consultants_bulk(items)
+    try:
+        assert [c["name"] for c in created] == [i["name"] for i in items]
+        assert len([t for t in timings if t.path == "/consultants/bulk"]) == 3
+    finally:
+        for c in created:
+            api.delete_consultant(c["id"])
+
+
+def test_errors_carry_detail():
+    with pytest.raises(EbitAPIError) as e:
+        api.update_project(9999, name="X")
+    assert e.value.status_code == 404
+    assert "9999" in e.value.detail
+
+
+def test_calculate_many_sync_and_async():
+    scenarios = [{"assignments": [ROW], "pex_pct": p} for p in (0.0, 0.3, 0.6)]
+    results = api.calculate_many(scenarios, concurrency=2)
+    costs = [r["department"]["cost"] for r in results]
+    assert costs == sorted(costs)
+
+    async def run():
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url="http://test")
+        async with AsyncEbitClient(http=http) as aapi:
+            try:
+                return await aapi.calculate_many(scenarios, concurrency=2)
+            finally:
+                await http.aclose()
+
+    assert asyncio.run(run()) == results
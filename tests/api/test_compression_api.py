@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import compression
+from backend.main import app
+
+client = TestClient(app)
+
+
+def _payload(n):
+    row = {
+        "consultant_id": 1, "project_id": 1, "utilization": 1.0,
+        "project_percent": 1.0, "consultant_work_pct": 1.0,
+        "start_date": "2025-01-01", "end_date": "2025-01-31",
+    }
+    return {"assignments": [row] * n, "yearly_work_hours": 1625, "pex_pct": 0.3, "month": 1}
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_large_response_is_compressed(encoding):
+    if encoding not in compression.available_encodings():
+        pytest.skip(f"{encoding} ikke tilgjengelig")
+    res = client.post("/calculate-ebit", json=_payload(200),
+                      headers={"Accept-Encoding": encoding})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in res.headers["vary"]
+    # httpx decodes transparently
+    assert len(res.json()["results"]) == 200
+
+
+def test_small_or_unaccepted_response_is_not_compressed():
+    res = client.get("/ready", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert "Accept-Encoding" in res.headers["vary"]
+
+    res = client.post("/calculate-ebit", json=_payload(200),
+                      headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert "content-encoding" not in res.headers
+    assert "Accept-Encoding" in res.headers["vary"]
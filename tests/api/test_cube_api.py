@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_cube_follows_scenario_and_master_data_changes():
+    row = {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0,
+           "start_date": "2025-01-01", "end_date": "2025-02-28"}
+    r = client.put("/scenario/rows", json={"items": [row]})
+    assert r.status_code == 200
+    rid = r.json()[0]["id"]
+    try:
+        months = client.get("/cube", params={"group_by": "month"}).json()["items"]
+        assert [m["month"] for m in months] == ["2025-01", "2025-02"]
+
+        # Moving the row to consultant 2 updates the consultant slice
+        client.patch(f"/scenario/rows/{rid}", json={"consultant_id": 2})
+        per_consultant = client.get(
+            "/cube", params={"group_by": "consultant"}).json()["items"]
+        assert [c["consultant_id"] for c in per_consultant] == [2]
+
+        # A rate change on the project is reflected without a rebuild
+        before = client.get("/cube", params={"group_by": "quarter"}).json()["items"][0]
+        client.patch("/projects/1", json={"hourly_rate": 1300, "effective_from": "2025-01-01"})
+        after = client.get("/cube", params={"group_by": "quarter"}).json()["items"][0]
+        assert after["income"] > before["income"]
+    finally:
+        client.patch("/projects/1", json={"hourly_rate": 1200, "effective_from": "2025-01-01"})
+        client.put("/scenario/rows", json={"items": []})
+
+
+def test_scenario_row_validation():
+    row = {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0,
+           "start_date": "2025-02-01", "end_date": "2025-01-01"}
+    assert client.post("/scenario/rows", json=row).status_code == 422
+    row.update(end_date="2025-03-01", consultant_id=999)
+    assert client.post("/scenario/rows", json=row).status_code == 404
@@ -0,0 +1,64 @@
+import shutil
+import uuid
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.main import app
+
+client = TestClient(app)
+
+ROW = {"consultant_id": 1, "project_id": 1, "utilization": 0.5, "project_percent": 1.0,
+       "start_date": "2025-01-01", "end_date": "2025-12-31"}
+
+
+def _department(settings):
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    r = client.post("/departments", json={"name": name, "settings": settings})
+    assert r.status_code == 201
+    return name
+
+
+def test_departments_are_separate_partitions_with_own_settings():
+    name = _department({"pex_pct": 0.2, "expense_pct": 0.1, "yearly_work_hours": 1500})
+    try:
+        assert client.post("/departments", json={"name": name}).status_code == 409
+        assert client.post("/departments", json={"name": "Ikke gyldig"}).status_code == 422
+        assert client.get("/departments/finnes-ikke/consultants").status_code == 404
+
+        c = client.post(f"/departments/{name}/consultants",
+                        json={"name": "Avd", "salary": 500000}).json()
+        client.post(f"/departments/{name}/projects", json={"name": "P", "hourly_rate": 1000})
+        # Ids are per department; the default department is untouched
+        assert c["id"] == 1
+        assert [x["name"] for x in client.get(f"/departments/{name}/consultants").json()] == ["Avd"]
+        assert "Avd" not in [x["name"] for x in client.get("/consultants").json()]
+
+        body = {"assignments": [{**ROW, "consultant_id": 1, "project_id": 1}]}
+        result = client.post(f"/departments/{name}/calculate-ebit", json=body).json()
+        assert result["settings_used"]["yearly_work_hours"] == 1500
+        assert result["results"][0]["income"] == 1500 * 0.5 * 1000
+        assert result["results"][0]["cost"] == 500000 * 1.3
+    finally:
+        shutil.rmtree(main._departments.get(name).path)
+
+
+def test_company_rollup_sums_departments():
+    name = _department(None)
+    try:
+        client.post(f"/departments/{name}/consultants", json={"name": "A", "salary": 400000})
+        client.post(f"/departments/{name}/projects", json={"name": "P", "hourly_rate": 1100})
+        assert client.put(f"/departments/{name}/scenario/rows",
+                          json={"items": [ROW]}).status_code == 200
+        assert client.put(f"/departments/{name}/scenario/rows", json={
+            "items": [{**ROW, "project_id": 9}]}).status_code == 404
+
+        rollup = client.get("/company/ebit").json()
+        by_name = {d["department"]: d for d in rollup["departments"]}
+        assert by_name[name]["rows"] == 1
+        assert by_name[name]["income"] == 1625 * 0.5 * 1100
+        for measure in ("income", "cost", "utlegg", "ebit"):
+            total = sum(d[measure] for d in rollup["departments"])
+            assert abs(rollup["company"][measure] - total) < 1e-6
+    finally:
+        shutil.rmtree(main._departments.get(name).path)
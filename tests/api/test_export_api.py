@@ -0,0 +1,76 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.export import read_table, table_from_rows, write_table
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_export_consultants_parquet():
+    r = client.get("/export/consultants", params={"format": "parquet"})
+    assert r.status_code == 200
+    assert 'filename="consultants.parquet"' in r.headers["content-disposition"]
+    table = pq.read_table(io.BytesIO(r.content))
+    assert table.column("name").to_pylist()[:2] == ["Test Consultant 1", "Test Consultant 2"]
+
+
+def test_export_trends_and_results():
+    row = client.post("/scenario/rows", json={
+        "consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0,
+        "start_date": "2025-01-01", "end_date": "2025-03-31"}).json()
+    try:
+        trends = read_table(client.get("/export/trends", params={"format": "arrow"}).content)
+        assert trends.column("month").to_pylist() == ["2025-01", "2025-02", "2025-03"]
+        results = read_table(client.get("/export/results").content)
+        assert results.column("scenario_row_id").to_pylist() == [row["id"]]
+        assert results.column("ebit")[0].as_py() == results.column("income")[0].as_py() - results.column("cost")[0].as_py()
+    finally:
+        client.delete(f"/scenario/rows/{row['id']}")
+
+
+def test_import_projects_roundtrip():
+    original = client.get("/export/projects", params={"format": "arrow"}).content
+    extra = table_from_rows([{"name": "Importert", "hourly_rate": 999.0}])
+    r = client.post("/import/projects", params={"mode": "append"},
+                    content=write_table(extra, "parquet"))
+    assert r.status_code == 200 and r.json()["imported"] == 1
+    assert client.get("/projects").json()[-1]["name"] == "Importert"
+
+    r = client.post("/import/projects", content=original)
+    assert r.status_code == 200
+    assert [p["id"] for p in client.get("/projects").json()] == [1, 2]
+
+
+def test_import_rejects_invalid_columns():
+    bad = pa.table({"name": ["X"], "salary": [-5.0]})
+    r = client.post("/import/consultants", content=write_table(bad, "arrow"))
+    assert r.status_code == 422
+    r = client.post("/import/consultants", content=b"not a file")
+    assert r.status_code == 422
+
+
+def test_roundtrip_keeps_effective_dated_history():
+    client.patch("/consultants/1", json={"salary": 650000, "effective_from": "2025-07-01"})
+    client.patch("/projects/2", json={"hourly_rate": 1600, "effective_from": "2025-03-01"})
+    salaries = client.get("/consultants/1/salary-history").json()
+    rates = client.get("/projects/2/rate-history").json()
+
+    for table in ("consultants", "projects"):
+        dump = client.get(f"/export/{table}", params={"format": "parquet"}).content
+        r = client.post(f"/import/{table}", content=dump)
+        assert r.status_code == 200
+
+    assert client.get("/consultants/1/salary-history").json() == salaries
+    assert client.get("/projects/2/rate-history").json() == rates
+    assert salaries[0]["salary"] == 600000 and salaries[-1]["salary"] == 650000
+    body = {"as_of": "2025-01-01", "assignments": [
+        {"consultant_id": 1, "project_id": 2, "utilization": 0.8, "project_percent": 1.0}]}
+    row = client.post("/calculate-ebit", json=body).json()["results"][0]
+    later = client.post("/calculate-ebit", json={**body, "as_of": "2025-08-01"}).json()
+    assert later["results"][0]["cost"] == pytest.approx(row["cost"] * 650000 / 600000)
+    assert row["income"] == 0.8 * 1625 * 1500
@@ -0,0 +1,95 @@
+import io
+import json
+
+import msgpack
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+from backend import formats
+from backend.main import app
+
+client = TestClient(app)
+
+ASSIGNMENTS = {"consultant_id": [1, 2], "project_id": [1, 2],
+               "utilization": [0.8, 0.5], "project_percent": [1.0, 1.0]}
+
+
+def _arrow(columns, params=None):
+    table = pa.table(columns).replace_schema_metadata(
+        {formats.ARROW_PARAMS_KEY: json.dumps(params or {}).encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def test_consultants_bulk_columnar_json():
+    r = client.post("/consultants/bulk", content=json.dumps(
+        {"items": {"name": ["Kol A", "Kol B"], "salary": [500000, 550000]}}),
+        headers={"Content-Type": formats.COLUMNAR_JSON, "Accept": formats.COLUMNAR_JSON})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert items["name"] == ["Kol A", "Kol B"]
+    assert items["default_utilization"] == [0.8, 0.8]
+    for cid in items["id"]:
+        client.delete(f"/consultants/{cid}")
+
+
+def test_consultants_bulk_columnar_validation_error():
+    r = client.post("/consultants/bulk", content=msgpack.packb(
+        {"items": {"name": ["X"], "salary": [-1]}}),
+        headers={"Content-Type": formats.COLUMNAR_MSGPACK})
+    assert r.status_code == 422
+
+
+def test_columnar_scalar_column_is_rejected():
+    r = client.post("/consultants/bulk", content=json.dumps({"items": {"name": 5, "salary": 1}}),
+                    headers={"Content-Type": formats.COLUMNAR_JSON})
+    assert r.status_code == 422
+    r = client.post("/calculate-ebit", content=json.dumps(
+        {"assignments": {**ASSIGNMENTS, "utilization": 0.8}}),
+        headers={"Content-Type": formats.COLUMNAR_JSON})
+    assert r.status_code == 422
+    assert "utilization" in r.json()["detail"]
+
+
+def test_unsupported_content_type():
+    r = client.post("/consultants/bulk", content=b"name,salary",
+                    headers={"Content-Type": "text/csv"})
+    assert r.status_code == 415
+
+
+def test_calculate_ebit_msgpack_matches_json():
+    rows = [dict(zip(ASSIGNMENTS, v)) for v in zip(*ASSIGNMENTS.values())]
+    expected = client.post("/calculate-ebit", json={"assignments": rows}).json()
+    r = client.post("/calculate-ebit", content=msgpack.packb({"assignments": rows}),
+                    headers={"Content-Type": formats.MSGPACK, "Accept": formats.MSGPACK})
+    assert r.headers["content-type"] == formats.MSGPACK
+    assert msgpack.unpackb(r.content) == expected
+
+
+def test_calculate_ebit_arrow_roundtrip():
+    r = client.post("/calculate-ebit", content=_arrow(ASSIGNMENTS, {"pex_pct": 0.32}),
+                    headers={"Content-Type": formats.ARROW, "Accept": formats.ARROW})
+    assert r.status_code == 200
+    table = pa.ipc.open_stream(io.BytesIO(r.content)).read_all()
+    assert table.column("consultant_name").to_pylist() == ["Test Consultant 1", "Test Consultant 2"]
+    params = json.loads(table.schema.metadata[formats.ARROW_PARAMS_KEY])
+    assert round(params["department"]["ebit"], 2) == round(sum(table.column("ebit").to_pylist()), 2)
+
+
+def test_calculate_ebit_columnar_unknown_consultant():
+    r = client.post("/calculate-ebit", content=json.dumps(
+        {"assignments": {**ASSIGNMENTS, "consultant_id": [1, 999]}}),
+        headers={"Content-Type": formats.COLUMNAR_JSON})
+    assert r.status_code == 404
+
+
+def test_calculate_ebit_columnar_expense_pct_nulls_mean_none():
+    r = client.post("/calculate-ebit", content=json.dumps(
+        {"assignments": {**ASSIGNMENTS, "expense_pct": [None, 0.1]}}),
+        headers={"Content-Type": formats.COLUMNAR_JSON})
+    assert r.status_code == 200
+    first, second = r.json()["results"]
+    assert first["utlegg"] == 0.0
+    assert abs(second["utlegg"] - 0.1 * second["income"]) < 1e-6
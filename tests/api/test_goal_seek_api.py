@@ -0,0 +1,65 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("cost_mode", ["row", "consultant"])
+def test_goal_seek_break_even_matches_calculate_ebit(cost_mode):
+    # Percentage utlegg on one row, manual utlegg on the other
+    assignments = [
+        {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0,
+         "expense_pct": 0.1},
+        {"consultant_id": 2, "project_id": 2, "utilization": 0.85, "project_percent": 1.0,
+         "utlegg_mode": "Manuelt", "manual_expenses": [{"type": "Reise", "amount": 50000}]},
+    ]
+    r = client.post("/goal-seek", json={
+        "assignments": assignments, "target_margin": 0.0, "cost_mode": cost_mode})
+    assert r.status_code == 200
+    rates = {p["project_id"]: p["break_even_rate"] for p in r.json()["projects"]}
+
+    # Charging the break-even rates gives EBIT == 0 in /calculate-ebit
+    for pid, rate in rates.items():
+        assert client.patch(f"/projects/{pid}", json={"hourly_rate": rate}).status_code == 200
+    calc = client.post("/calculate-ebit", json={
+        "assignments": assignments, "cost_mode": cost_mode}).json()
+    assert [abs(row["ebit"]) < 1e-3 for row in calc["results"]] == [True, True]
+    assert calc["department"]["utlegg"] > 50000
+
+
+def test_goal_seek_rollups():
+    r = client.post("/goal-seek", json={
+        "assignments": [
+            {"consultant_id": 1, "project_id": 1,
+                "utilization": 0.8, "project_percent": 0.5},
+            {"consultant_id": 1, "project_id": 2,
+                "utilization": 0.8, "project_percent": 0.5},
+        ],
+        "target_margin": 0.15,
+    })
+    assert r.status_code == 200
+    data = r.json()
+    assert [p["project_id"] for p in data["projects"]] == [1, 2]
+    assert len(data["consultants"]) == 1
+    assert data["results"][0]["target_rate"] > data["results"][0]["break_even_rate"]
+
+
+def test_goal_seek_unknown_consultant():
+    r = client.post("/goal-seek", json={"assignments": [
+        {"consultant_id": 999, "project_id": 1, "utilization": 1, "project_percent": 1}]})
+    assert r.status_code == 404
+
+
+def test_goal_seek_uses_rates_in_effect_on_as_of():
+    client.patch("/projects/1", json={"hourly_rate": 2000, "effective_from": "2030-01-01"})
+    body = {"assignments": [{"consultant_id": 1, "project_id": 1,
+                             "utilization": 0.8, "project_percent": 1.0}]}
+    now = client.post("/goal-seek", json=body).json()
+    later = client.post("/goal-seek", json={**body, "as_of": "2030-06-01"}).json()
+    assert now["results"][0]["hourly_rate"] == 1200
+    assert later["results"][0]["hourly_rate"] == 2000
+    assert later["projects"][0]["hourly_rate"] == 2000
+    assert abs(later["results"][0]["income"] - now["results"][0]["billable_hours"] * 2000) < 1e-6
+    assert client.post("/goal-seek", json={**body, "as_of": "ikke-dato"}).status_code == 422
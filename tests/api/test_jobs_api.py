@@ -0,0 +1,58 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from backend.cube import month_weight
+from backend.main import app
+
+client = TestClient(app)
+
+ROW = {"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0,
+       "start_date": "2025-01-15", "end_date": "2025-02-28",
+       "utlegg_mode": "Manuelt", "manual_expenses": [{"type": "Reise", "amount": 1000}]}
+
+
+def _poll(job_id):
+    for _ in range(500):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_trend_job_month_by_month():
+    r = client.post("/jobs/trend", json={"rows": [ROW], "year": 2025,
+                                         "start_month": 1, "end_month": 3})
+    assert r.status_code == 202
+    job = _poll(r.json()["job_id"])
+    assert job["status"] == "done"
+    jan, feb, mar = job["result"]
+    assert [jan["month"], mar["month"]] == ["2025-01", "2025-03"]
+    assert jan["income"] == 1625 * 0.8 * 1200 * month_weight(2025, 1)
+    assert jan["utlegg"] == 1000
+    assert jan["ebit"] == jan["income"] - jan["cost"] - 1000
+    assert mar == {"month": "2025-03", "income": 0.0, "cost": 0.0, "utlegg": 0.0, "ebit": 0.0}
+
+
+def test_trend_job_validates_rows_up_front():
+    r = client.post("/jobs/trend", json={"rows": [{**ROW, "consultant_id": 999}], "year": 2025})
+    assert r.status_code == 404
+    assert client.get("/jobs/finnes-ikke").status_code == 404
+
+
+def test_trend_job_follows_mid_year_rate_change():
+    project = client.post("/projects", json={"name": "Dated", "hourly_rate": 1000}).json()
+    try:
+        r = client.patch(f"/projects/{project['id']}",
+                         json={"hourly_rate": 2000, "effective_from": "2025-02-01"})
+        assert r.json()["hourly_rate"] == 2000
+        row = {**ROW, "project_id": project["id"], "start_date": "2025-01-01",
+               "utlegg_mode": "Prosent", "manual_expenses": []}
+        r = client.post("/jobs/trend", json={"rows": [row], "year": 2025,
+                                             "start_month": 1, "end_month": 2})
+        jan, feb = _poll(r.json()["job_id"])["result"]
+        assert jan["income"] == 1625 * 0.8 * 1000 * month_weight(2025, 1)
+        assert feb["income"] == 1625 * 0.8 * 2000 * month_weight(2025, 2)
+    finally:
+        client.delete(f"/projects/{project['id']}")
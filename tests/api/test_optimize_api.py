@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_optimize_staffing_plan_feeds_calculate_ebit():
+    r = client.post("/optimize-staffing", json={
+        "demands": [{"project_id": 2, "max_fte": 1.0}],
+        "pinned": [{"consultant_id": 1, "project_id": 1, "project_percent": 0.5}],
+    })
+    assert r.status_code == 200
+    data = r.json()
+    assert data["pinned_row_indexes"] == [0]
+
+    calc = client.post("/calculate-ebit", json=data["plan"])
+    assert calc.status_code == 200
+    for key in ("income", "cost", "ebit"):
+        assert abs(calc.json()["department"][key] - data["department"][key]) < 1e-6
+
+
+def test_optimize_staffing_rejects_overbooked_pins():
+    r = client.post("/optimize-staffing", json={"pinned": [
+        {"consultant_id": 1, "project_id": 1, "project_percent": 0.8},
+        {"consultant_id": 1, "project_id": 2, "project_percent": 0.8},
+    ]})
+    assert r.status_code == 422
+
+
+def test_optimize_staffing_uses_rates_in_effect_on_as_of():
+    client.patch("/projects/2", json={"hourly_rate": 3000, "effective_from": "2030-01-01"})
+    body = {"consultant_ids": [1], "project_ids": [2]}
+    now = client.post("/optimize-staffing", json=body).json()
+    later = client.post("/optimize-staffing", json={**body, "as_of": "2030-06-01"}).json()
+    assert later["plan"]["as_of"] == "2030-06-01"
+    assert later["department"]["income"] == now["department"]["income"] * 2
+    calc = client.post("/calculate-ebit", json=later["plan"]).json()
+    assert abs(calc["department"]["ebit"] - later["department"]["ebit"]) < 1e-6
+
+
+def test_optimize_staffing_keeps_zero_utilization():
+    client.patch("/consultants/2", json={"default_utilization": 0})
+    r = client.post("/optimize-staffing", json={
+        "pinned": [{"consultant_id": 2, "project_id": 1, "project_percent": 0.5}]})
+    assert r.status_code == 200
+    row = r.json()["plan"]["assignments"][0]
+    assert (row["consultant_id"], row["utilization"]) == (2, 0.0)
@@ -0,0 +1,12 @@
+from fastapi.testclient import TestClient
+
+from backend.main import app
+
+
+def test_ready_after_startup():
+    # The context manager runs the lifespan hook (data files + warm-up)
+    with TestClient(app) as client:
+        r = client.get("/ready")
+        assert r.status_code == 200
+        assert r.json()["status"] == "ready"
+        assert r.json()["startup_seconds"] >= 0
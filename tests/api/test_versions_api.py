@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.snapshot import Snapshot
+
+client = TestClient(app)
+
+
+def test_versions_bump_on_commit():
+    before = client.get("/versions").json()
+    r = client.patch("/consultants/1", json={"default_utilization": 0.8})
+    assert r.status_code == 200
+    after = client.get("/versions").json()
+    assert after["consultants"] == before["consultants"] + 1
+    assert after["projects"] == before["projects"]
+
+
+def test_changes_since_version():
+    version = client.get("/versions").json()["projects"]
+    client.patch("/projects/2", json={"name": "Test Project 2"})
+
+    delta = client.get("/changes", params={"collection": "projects", "since": version}).json()
+    assert delta["mode"] == "delta"
+    assert delta["version"] == version + 1
+    assert [p["id"] for p in delta["upserts"]] == [2]
+    assert delta["deletes"] == []
+
+    # A client from a future/unknown version gets a full snapshot
+    snapshot = client.get(
+        "/changes", params={"collection": "projects", "since": version + 100}).json()
+    assert snapshot["mode"] == "snapshot"
+    assert [p["id"] for p in snapshot["items"]] == [1, 2]
+
+
+def test_snapshot_follows_commits(data_store):
+    r = client.post("/consultants", json={"name": "Snapshot", "salary": 500000})
+    cid = r.json()["id"]
+    try:
+        snap = Snapshot(data_store.snapshot_file)
+        assert snap.versions["consultants"] == client.get("/versions").json()["consultants"]
+        assert snap.consultants.get(cid)["name"] == "Snapshot"
+    finally:
+        client.delete(f"/consultants/{cid}")
+
+
+def test_list_etag_and_not_modified():
+    r = client.get("/projects")
+    etag = r.headers["etag"]
+    assert client.get("/projects", headers={"If-None-Match": etag}).status_code == 304
+
+    client.patch("/projects/1", json={"name": "Test Project 1"})
+    r = client.get("/projects", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert [p["id"] for p in r.json()] == [1, 2]
@@ -1,68 +1,65 @@
 import pytest
 import json
-import os
 from pathlib import Path
 
+from backend import main
 
-@pytest.fixture(scope="session", autouse=True)
-def setup_test_data():
-    """Create test data files before running tests"""
-    data_dir = Path("data")
-    data_dir.mkdir(exist_ok=True)
+CONSULTANTS = {
+    "last_id": 2,
+    "items": [
+        {
+            "id": 1,
+            "name": "Test Consultant 1",
+            "salary": 600000,
+            "default_utilization": 0.8
+        },
+        {
+            "id": 2,
+            "name": "Test Consultant 2",
+            "salary": 700000,
+            "default_utilization": 0.85
+        }
+    ]
+}
 
-    # Create test consultants
-    consultants = {
-        "last_id": 2,
-        "items": [
-            {
-                "id": 1,
-                "name": "Test Consultant 1",
-                "salary": 600000,
-                "default_utilization": 0.8
-            },
-            {
-                "id": 2,
-                "name": "Test Consultant 2",
-                "salary": 700000,
-                "default_utilization": 0.85
-            }
-        ]
-    }
+PROJECTS = {
+    "last_id": 2,
+    "items": [
+        {
+            "id": 1,
+            "name": "Test Project 1",
+            "hourly_rate": 1200
+        },
+        {
+            "id": 2,
+            "name": "Test Project 2",
+            "hourly_rate": 1500
+        }
+    ]
+}
 
-    # Create test projects
-    projects = {
-        "last_id": 2,
-        "items": [
-            {
-                "id": 1,
-                "name": "Test Project 1",
-                "hourly_rate": 1200
-            },
-            {
-                "id": 2,
-                "name": "Test Project 2",
-                "hourly_rate": 1500
-            }
-        ]
-    }
+SETTINGS = {
+    "pex_pct": 0.32,
+    "expense_pct": 0.40,
+    "yearly_work_hours": 1625
+}
 
-    # Create test settings
-    settings = {
-        "pex_pct": 0.32,
-        "expense_pct": 0.40,
-        "yearly_work_hours": 1625
-    }
 
-    # Write files
-    with open(data_dir / "consultants.json", "w", encoding="utf-8") as f:
-        json.dump(consultants, f, ensure_ascii=False, indent=2)
+def write_test_data(data_dir: Path):
+    """Create the test data files in `data_dir`."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for name, data in (("consultants", CONSULTANTS), ("projects", PROJECTS),
+                       ("settings", SETTINGS), ("scenario", {"last_id": 0, "items": []})):
+        with open(data_dir / f"{name}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
 
-    with open(data_dir / "projects.json", "w", encoding="utf-8") as f:
-        json.dump(projects, f, ensure_ascii=False, indent=2)
 
-    with open(data_dir / "settings.json", "w", encoding="utf-8") as f:
-        json.dump(settings, f, ensure_ascii=False, indent=2)
-
-    yield
-
-    # Cleanup is optional - you can keep test data or remove it
+@pytest.fixture(autouse=True)
+def data_store(tmp_path, monkeypatch):
+    """Every test gets its own data directory, so tests never see each
+    other's writes (or the developer's data/) and can run in parallel
+    (pytest -n auto)."""
+    data_dir = tmp_path / "data"
+    write_test_data(data_dir)
+    monkeypatch.setenv("EBIT_DATA_DIR", str(data_dir))
+    yield main.configure(data_dir)
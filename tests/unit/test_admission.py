@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.admission import AdmissionMiddleware, Gate, Overloaded, rule
+
+
+def test_gate_queues_then_rejects():
+    gate = Gate("calc", limit=1, queue=1, max_wait=1.0)
+
+    async def main():
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+        # Slot taken and queue full: rejected without waiting
+        with pytest.raises(Overloaded) as e:
+            await gate.acquire()
+        assert e.value.retry_after >= 1
+        # The released slot goes straight to the queued request
+        gate.release(2.0)
+        await waiter
+        assert gate.active == 1 and gate.waiting == 0
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(main())
+    assert gate.stats()["admitted"] == 2
+    assert gate.stats()["rejected"] == 1
+
+
+def test_gate_wait_times_out():
+    gate = Gate("calc", limit=1, queue=4, max_wait=0.02)
+
+    async def main():
+        await gate.acquire()
+        with pytest.raises(Overloaded):
+            await gate.acquire()
+        assert gate.waiting == 0
+        gate.release()
+        # Free again: admitted at once
+        await gate.acquire()
+        gate.release()
+
+    asyncio.run(main())
+    assert gate.active == 0 and gate.rejected == 1
+
+
+def test_retry_after_follows_service_time():
+    gate = Gate("calc", limit=2)
+    gate.service_seconds = 6.0
+    assert gate.retry_after() == 3
+    gate.service_seconds = 0.01
+    assert gate.retry_after() == 1
+
+
+def test_rules_and_large_bodies():
+    small, large = Gate("small", 1), Gate("large", 1)
+    mw = AdmissionMiddleware(None, rules=[rule(["POST"], r"/calc", small)],
+                             large=[rule(["POST"], r"/calc", large)], large_bytes=1000)
+    assert mw.gate_for("POST", "/calc", 10) is small
+    assert mw.gate_for("POST", "/calc", 1000) is large
+    assert mw.gate_for("GET", "/calc", 0) is None
+    assert mw.gate_for("POST", "/calc/x", 0) is None
+
+
+def test_body_of_unknown_size_uses_the_large_gate():
+    small, large = Gate("small", 1), Gate("large", 1)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    mw = AdmissionMiddleware(app, rules=[rule(["POST"], r"/calc", small)],
+                             large=[rule(["POST"], r"/calc", large)], large_bytes=1000)
+    assert mw.gate_for("POST", "/calc", None) is large
+
+    async def chunks():
+        yield b"{}"
+
+    async def main():
+        transport = httpx.ASGITransport(app=mw)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            # A generator body is sent chunked, without Content-Length
+            await c.post("/calc", content=chunks())
+            await c.post("/calc", content=b"{}")
+
+    asyncio.run(main())
+    assert (large.admitted, small.admitted) == (1, 1)
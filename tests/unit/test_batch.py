@@ -0,0 +1,75 @@
+import csv
+import json
+
+import pytest
+
+from backend import batch, export
+from backend.calculations import calculate_assignments, resolve_settings
+from backend.formats import validate_columns, ASSIGNMENT_COLUMNS
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    d = tmp_path / "master"
+    d.mkdir()
+    (d / "consultants.json").write_text(json.dumps({"last_id": 2, "items": [
+        {"id": 1, "name": "A", "salary": 600000, "default_utilization": 0.8},
+        {"id": 2, "name": "B", "salary": 700000, "default_utilization": 0.85},
+    ]}))
+    (d / "projects.json").write_text(json.dumps({"last_id": 1, "items": [
+        {"id": 1, "name": "P", "hourly_rate": 1200},
+    ]}))
+    (d / "settings.json").write_text(json.dumps(
+        {"pex_pct": 0.32, "expense_pct": 0.4, "yearly_work_hours": 1625}))
+    return d
+
+
+def _scenarios(tmp_path):
+    rows = [{"consultant_id": 1, "project_id": 1, "utilization": 0.8, "project_percent": 1.0},
+            {"consultant_id": 2, "project_id": 1, "utilization": 0.5, "project_percent": 0.5}]
+    s = tmp_path / "scenarios"
+    s.mkdir()
+    with open(s / "a.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) + ["row_index"])
+        writer.writeheader()
+        writer.writerows(rows)
+    (s / "b.json").write_text(json.dumps({"assignments": rows, "pex_pct": 0.0}))
+    (s / "c.parquet").write_bytes(export.write_table(export.table_from_rows(rows), "parquet"))
+    (s / "d.json").write_text(json.dumps([{**rows[0], "consultant_id": 99}]))
+    return s, rows
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_matches_calculation(tmp_path, data_dir, workers):
+    scenarios, rows = _scenarios(tmp_path)
+    out = tmp_path / "out"
+    summaries = batch.run_batch([str(scenarios)], str(out), "csv", workers, str(data_dir))
+    by_name = {s["scenario"].rsplit("/", 1)[-1]: s for s in summaries}
+    assert list(by_name) == ["a.csv", "b.json", "c.parquet", "d.json"]
+
+    consultants, projects, settings = batch.load_master_data(str(data_dir))
+    cols = validate_columns({k: [r[k] for r in rows] for k in rows[0]}, ASSIGNMENT_COLUMNS)
+    expected = calculate_assignments(cols, consultants, projects, resolve_settings(settings))
+    assert by_name["a.csv"]["ebit"] == pytest.approx(expected["department"]["ebit"])
+    assert by_name["c.parquet"]["ebit"] == pytest.approx(expected["department"]["ebit"])
+    # pex_pct from the JSON file lowers the cost
+    assert by_name["b.json"]["cost"] < by_name["a.csv"]["cost"]
+    assert by_name["d.json"]["error"] == "Konsulent 99 finnes ikke"
+
+    with open(out / "a.csv") as f:
+        result_rows = list(csv.DictReader(f))
+    assert [r["consultant_name"] for r in result_rows] == ["A", "B"]
+    with open(out / "summary.csv") as f:
+        assert len(list(csv.DictReader(f))) == 4
+
+
+def test_cli_exit_code_and_json_output(tmp_path, data_dir):
+    scenarios, _ = _scenarios(tmp_path)
+    out = tmp_path / "out"
+    assert batch.main([str(scenarios / "b.json"), "--out", str(out), "--format", "json",
+                       "--data-dir", str(data_dir), "--workers", "1"]) == 0
+    result = json.loads((out / "b.json").read_text())
+    assert result["settings_used"]["pex_pct"] == 0.0
+    assert len(result["results"]) == 2
+    assert batch.main([str(scenarios), "--out", str(out),
+                       "--data-dir", str(data_dir)]) == 1
@@ -1,5 +1,7 @@
 
-from backend.calculations import calculate_ebit
+import numpy as np
+
+from backend.calculations import allocate_cost, calculate_ebit, expenses, manual_lines
 
 
 def test_calculate_ebit_basic():
@@ -12,3 +14,31 @@ def test_calculate_ebit_with_utlegg():
 
 def test_calculate_ebit_zero():
     assert calculate_ebit(0, 0, 0) == 0
+
+
+def test_allocate_cost_charges_consultant_once():
+    cost = allocate_cost([1, 1, 2], [300.0, 100.0, 0.0], [400.0, 400.0, 90.0])
+    assert list(cost) == [300.0, 100.0, 90.0]
+
+
+def test_expenses_percent_and_manual_per_row_and_type():
+    rows = [
+        {"manual_expenses": []},
+        {"manual_expenses": [{"type": "Reise", "amount": 300.0},
+                             {"type": "Hotell", "amount": 200.0}]},
+        # Manual lines on a Prosent row are ignored
+        {"manual_expenses": [{"type": "Taxi", "amount": 999.0}]},
+    ]
+    cols = {"utlegg_mode": ["Prosent", "Manuelt", "Prosent"],
+            "expense_pct": np.array([0.1, 0.5, 0.0]), **manual_lines(rows)}
+    utlegg, by_type = expenses(cols, np.array([1000.0, 1000.0, 1000.0]))
+    assert list(utlegg) == [100.0, 500.0, 0.0]
+    assert by_type == {"Prosent": 100.0, "Reise": 300.0, "Hotell": 200.0}
+
+
+def test_expenses_missing_pct_is_zero():
+    income = np.array([1000.0, 1000.0])
+    utlegg, _ = expenses({"expense_pct": np.array([np.nan, 0.1])}, income)
+    assert list(utlegg) == [0.0, 100.0]
+    utlegg, _ = expenses({}, income)
+    assert list(utlegg) == [0.0, 0.0]
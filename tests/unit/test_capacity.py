@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pytest
+
+from backend.capacity import find_overallocations
+
+
+def test_overlapping_rows_are_reported():
+    out = find_overallocations(
+        consultant_ids=[1, 1, 1],
+        start_dates=["2025-01-01", "2025-01-10", "2025-03-01"],
+        end_dates=["2025-01-31", "2025-02-15", "2025-03-31"],
+        load=[0.8, 0.5, 1.0],
+    )
+    assert out == [{
+        "consultant_id": 1,
+        "start_date": "2025-01-10",
+        "end_date": "2025-01-31",
+        "peak_load": 1.3,
+        "excess": out[0]["excess"],
+    }]
+    assert abs(out[0]["excess"] - 0.3) < 1e-9
+
+
+def test_adjacent_overbooked_intervals_merge_and_consultants_are_separate():
+    out = find_overallocations(
+        consultant_ids=[1, 1, 1, 2],
+        start_dates=["2025-01-01", "2025-01-01", "2025-01-05", "2025-01-01"],
+        end_dates=["2025-01-10", "2025-01-04", "2025-01-10", "2025-01-10"],
+        load=[1.0, 0.5, 0.2, 1.0],
+    )
+    assert len(out) == 1
+    assert (out[0]["start_date"], out[0]["end_date"]) == ("2025-01-01", "2025-01-10")
+    assert abs(out[0]["peak_load"] - 1.5) < 1e-9
+
+
+def test_open_ended_rows_and_exact_capacity():
+    out = find_overallocations([1, 1], [None, "2025-06-01"], [None, None], [0.5, 0.5])
+    assert out == []
+    out = find_overallocations([1, 1], [None, "2025-06-01"], [None, None], [0.6, 0.5])
+    assert out[0]["start_date"] == "2025-06-01" and out[0]["end_date"] is None
+
+
+def test_many_rows_is_fast():
+    rng = np.random.default_rng(1)
+    n = 50_000
+    start = np.datetime64("2025-01-01") + rng.integers(0, 300, n)
+    end = start + rng.integers(0, 60, n)
+    t = time.perf_counter()
+    find_overallocations(rng.integers(1, 2000, n), start.astype(str), end.astype(str),
+                         rng.uniform(0.1, 0.6, n))
+    assert time.perf_counter() - t < 5
+
+
+def test_start_after_end_is_rejected():
+    with pytest.raises(ValueError, match="rad 1"):
+        find_overallocations([1, 1], ["2025-01-01", "2025-03-01"],
+                             ["2025-01-31", "2025-02-01"], [1.0, 1.0])
@@ -0,0 +1,29 @@
+from backend.changelog import ChangeLog
+
+
+def test_delta_coalesces_changes_per_record():
+    log = ChangeLog()
+    log.record("consultants", 1, upserts=[{"id": 1, "name": "A"}])
+    log.record("consultants", 2, upserts=[{"id": 2, "name": "B"}])
+    log.record("consultants", 3, upserts=[{"id": 1, "name": "A2"}], deletes=[2])
+
+    assert log.since("consultants", 0, 3) == {
+        "upserts": [{"id": 1, "name": "A2"}], "deletes": [2]}
+    assert log.since("consultants", 2, 3) == {
+        "upserts": [{"id": 1, "name": "A2"}], "deletes": [2]}
+    assert log.since("consultants", 3, 3) == {"upserts": [], "deletes": []}
+
+
+def test_compacted_or_unknown_history_needs_snapshot():
+    log = ChangeLog(history=2)
+    for v in range(1, 5):
+        log.record("projects", v, upserts=[{"id": v}])
+    assert log.since("projects", 1, 4) is None
+    assert log.since("projects", 2, 4) == {"upserts": [{"id": 3}, {"id": 4}], "deletes": []}
+    # Client ahead of the server (e.g. data restored) and no history at all
+    assert log.since("projects", 9, 4) is None
+    assert ChangeLog().since("scenario", 0, 5) is None
+
+    log.reset("projects", 5)
+    assert log.since("projects", 4, 5) is None
+    assert log.since("projects", 5, 5) == {"upserts": [], "deletes": []}
@@ -0,0 +1,49 @@
+import httpx
+import pytest
+
+from client import EbitAPIError, EbitClient
+from client.base import SSEParser
+
+
+def _client(handler, **options):
+    http = httpx.Client(transport=httpx.MockTransport(handler), base_url="http://test")
+    return EbitClient(http=http, backoff=0, **options)
+
+
+def test_retries_503_with_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) < 3:
+            return httpx.Response(503, headers={"Retry-After": "0"},
+                                  json={"detail": "opptatt"})
+        return httpx.Response(200, json={"status": "ok"})
+
+    assert _client(handler).seed() == {"status": "ok"}
+    assert calls == ["POST"] * 3
+
+
+def test_no_retry_of_non_idempotent_502_and_gives_up():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(502, json={"detail": "gateway"})
+
+    with pytest.raises(EbitAPIError):
+        _client(handler).seed()
+    assert calls == ["POST"]
+
+    calls.clear()
+    with pytest.raises(EbitAPIError) as e:
+        _client(handler, retries=2).versions()
+    assert calls == ["GET"] * 3
+    assert e.value.detail == "gateway"
+
+
+def test_sse_parser():
+    parser = SSEParser()
+    lines = [": keepalive", "event: change", "id: 7", 'data: {"seq": 7}', ""]
+    events = [e for e in map(parser.feed, lines) if e]
+    assert events == [{"event": "change", "id": "7", "data": {"seq": 7}}]
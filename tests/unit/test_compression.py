@@ -0,0 +1,26 @@
+import gzip
+
+import pytest
+
+from backend import compression
+
+
+def test_negotiate_encoding_prefers_brotli_and_respects_q():
+    if compression.brotli is None:
+        pytest.skip("brotli ikke installert")
+    assert compression.negotiate_encoding("gzip, deflate, br") == "br"
+    assert compression.negotiate_encoding("br;q=0.5, gzip") == "gzip"
+    assert compression.negotiate_encoding("*") == "br"
+
+
+def test_negotiate_encoding_none():
+    assert compression.negotiate_encoding(None) is None
+    assert compression.negotiate_encoding("identity") is None
+    assert compression.negotiate_encoding("gzip;q=0, br;q=0") is None
+
+
+def test_compress_round_trip():
+    body = b'{"results": []}' * 100
+    assert gzip.decompress(compression.compress(body, "gzip")) == body
+    if compression.brotli is not None:
+        assert compression.brotli.decompress(compression.compress(body, "br")) == body
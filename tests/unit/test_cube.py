@@ -0,0 +1,84 @@
+import pytest
+
+from backend.cube import EbitCube, business_days_in_month, row_contributions
+
+SETTINGS = {"yearly_work_hours": 1625, "pex_pct": 0.32, "expense_pct": 0.40}
+C1 = {"id": 1, "salary": 600000}
+C2 = {"id": 2, "salary": 700000}
+P1 = {"id": 1, "hourly_rate": 1200}
+
+
+def _row(rid, cid, start="2025-01-15", end="2025-03-10", **extra):
+    return {"id": rid, "consultant_id": cid, "project_id": 1, "utilization": 0.8,
+            "project_percent": 1.0, "start_date": start, "end_date": end, **extra}
+
+
+def test_business_days():
+    assert business_days_in_month(2025, 1) == 23
+    assert business_days_in_month(2025, 2) == 20
+
+
+def test_row_contributions_cover_overlapped_months():
+    contrib = row_contributions(_row(1, 1, expense_pct=0.1), C1, P1, SETTINGS)
+    assert sorted(contrib) == ["2025-01", "2025-02", "2025-03"]
+    income, cost, utlegg, ebit, count = contrib["2025-01"]
+    assert utlegg == pytest.approx(0.1 * income)
+    assert ebit == pytest.approx(income - cost - utlegg)
+
+
+def test_incremental_updates_match_rebuild():
+    cube = EbitCube()
+    r1, r2 = _row(1, 1), _row(2, 2, start="2025-02-01", end="2025-02-28")
+    cube.upsert_row(1, 1, 1, row_contributions(r1, C1, P1, SETTINGS))
+    cube.upsert_row(2, 2, 1, row_contributions(r2, C2, P1, SETTINGS))
+
+    # Raise for consultant 1 -> recompute only its rows
+    raised = {**C1, "salary": 650000}
+    for rid in cube.rows_for(consultant_ids=[1]):
+        cube.upsert_row(rid, 1, 1, row_contributions(r1, raised, P1, SETTINGS))
+
+    fresh = EbitCube()
+    fresh.upsert_row(1, 1, 1, row_contributions(r1, raised, P1, SETTINGS))
+    fresh.upsert_row(2, 2, 1, row_contributions(r2, C2, P1, SETTINGS))
+    assert cube.query("month") == pytest.approx(fresh.query("month"))
+
+
+def test_queries_slice_and_roll_up():
+    cube = EbitCube()
+    cube.upsert_row(1, 1, 1, row_contributions(_row(1, 1), C1, P1, SETTINGS))
+    cube.upsert_row(2, 2, 1, row_contributions(
+        _row(2, 2, start="2025-04-01", end="2025-04-30"), C2, P1, SETTINGS))
+
+    months = cube.query("month", ytd=True)
+    assert [m["month"] for m in months] == ["2025-01", "2025-02", "2025-03", "2025-04"]
+    assert months[-1]["ebit_ytd"] == pytest.approx(sum(m["ebit"] for m in months))
+
+    quarters = cube.query("quarter")
+    assert [q["quarter"] for q in quarters] == ["2025-Q1", "2025-Q2"]
+
+    per_consultant = cube.query("consultant", start="2025-04", end="2025-04")
+    assert [c["consultant_id"] for c in per_consultant] == [2]
+    assert cube.query("month", consultant_ids=[2]) == cube.query(
+        "month", consultant_ids=[2], project_ids=[1])
+
+    cube.remove_row(2)
+    assert cube.query("consultant") == cube.query("consultant", consultant_ids=[1])
+    assert cube.query("month", consultant_ids=[2]) == []
+
+
+def test_ytd_counts_from_january_when_start_is_later():
+    cube = EbitCube()
+    cube.upsert_row(1, 1, 1, row_contributions(_row(1, 1), C1, P1, SETTINGS))
+    cube.upsert_row(2, 2, 1, row_contributions(
+        _row(2, 2, start="2025-04-01", end="2025-04-30"), C2, P1, SETTINGS))
+
+    full = {m["month"]: m for m in cube.query("month", ytd=True)}
+    sliced = cube.query("month", start="2025-04", end="2025-04", ytd=True)
+    assert [m["month"] for m in sliced] == ["2025-04"]
+    assert sliced[0]["ebit"] == pytest.approx(full["2025-04"]["ebit"])
+    assert sliced[0]["ebit_ytd"] == pytest.approx(full["2025-04"]["ebit_ytd"])
+    assert sliced[0]["ebit_ytd"] != pytest.approx(sliced[0]["ebit"])
+
+    quarter = cube.query("quarter", start="2025-04", ytd=True)
+    assert [q["quarter"] for q in quarter] == ["2025-Q2"]
+    assert quarter[0]["income_ytd"] == pytest.approx(sum(m["income"] for m in full.values()))
@@ -0,0 +1,22 @@
+import json
+
+from backend.data_access import DEFAULT_SETTINGS, DataStore, load_consultants, load_settings
+
+
+def test_store_follows_env_and_creates_missing_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("EBIT_DATA_DIR", str(tmp_path / "other"))
+    store = DataStore()
+    assert store.data_dir == str(tmp_path / "other")
+    store.ensure()
+    assert store.load("scenario") == {"last_id": 0, "items": []}
+    assert load_settings() == DEFAULT_SETTINGS
+    assert load_consultants() == []
+
+
+def test_items_reads_both_file_shapes(tmp_path):
+    (tmp_path / "consultants.json").write_text(json.dumps([{"id": 1, "name": "Liste"}]))
+    (tmp_path / "projects.json").write_text(json.dumps(
+        {"last_id": 1, "items": [{"id": 1, "name": "Objekt"}], "version": 3}))
+    store = DataStore(tmp_path)
+    assert store.items("consultants") == [{"id": 1, "name": "Liste"}]
+    assert store.items("projects") == [{"id": 1, "name": "Objekt"}]
@@ -0,0 +1,25 @@
+import asyncio
+import threading
+
+from backend.events import ChangeBus, sse_message
+
+
+def test_publish_from_thread_reaches_subscriber():
+    bus = ChangeBus()
+
+    async def run():
+        async with bus.subscribe() as queue:
+            t = threading.Thread(target=bus.publish, args=("consultants", 7))
+            t.start()
+            t.join()
+            return await asyncio.wait_for(queue.get(), 1)
+
+    event = asyncio.run(run())
+    assert event["collection"] == "consultants"
+    assert event["version"] == 7
+    assert bus.subscriber_count == 0
+
+
+def test_sse_message_format():
+    msg = sse_message("change", {"collection": "projects", "version": 2}, event_id=5)
+    assert msg == 'id: 5\nevent: change\ndata: {"collection": "projects", "version": 2}\n\n'
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from backend import formats
+
+
+def test_validate_columns_defaults_and_types():
+    cols = formats.validate_columns(
+        {"name": ["A", "B"], "salary": [500000, 600000.5]}, formats.CONSULTANT_COLUMNS)
+    assert cols["name"] == ["A", "B"]
+    assert cols["salary"].dtype == float
+    np.testing.assert_allclose(cols["default_utilization"], [0.8, 0.8])
+
+
+@pytest.mark.parametrize("columns", [
+    {"name": ["A"], "salary": [1, 2]},
+    {"name": ["A"]},
+    {"name": ["A"], "salary": ["mye"]},
+    {"name": [1], "salary": [1]},
+    {"name": ["A", "B"], "salary": [1, -1]},
+])
+def test_validate_columns_rejects(columns):
+    with pytest.raises(formats.ColumnError):
+        formats.validate_columns(columns, formats.CONSULTANT_COLUMNS)
+
+
+def test_response_format_negotiation():
+    assert formats.response_format(None) == (False, "json", formats.JSON)
+    assert formats.response_format("text/html, */*") == (False, "json", formats.JSON)
+    assert formats.response_format(formats.COLUMNAR_MSGPACK)[:2] == (True, "msgpack")
+    with pytest.raises(formats.UnsupportedFormat):
+        formats.response_format("text/csv")
+
+
+@pytest.mark.parametrize("media", [formats.COLUMNAR_JSON, formats.COLUMNAR_MSGPACK, formats.ARROW])
+def test_encode_decode_roundtrip(media):
+    columnar, encoding = formats.request_format(media)
+    payload = {"pex_pct": 0.3, "items": {"id": np.array([1, 2]), "name": ["A", "B"]}}
+    back_columnar, back = formats.decode(formats.encode(payload, encoding, "items"), media, "items")
+    assert columnar and back_columnar
+    assert back["pex_pct"] == 0.3
+    assert list(back["items"]["id"]) == [1, 2]
+    assert list(back["items"]["name"]) == ["A", "B"]
@@ -0,0 +1,32 @@
+import numpy as np
+
+from backend.calculations import required_rate, required_utilization, supported_headcount
+
+
+def test_required_rate_break_even_and_margin():
+    cost = np.array([1_000_000.0, 500_000.0])
+    hours = np.array([1000.0, 500.0])
+    assert np.allclose(required_rate(cost, hours), [1000.0, 1000.0])
+    # 20% margin: income * 0.8 == cost
+    assert np.allclose(required_rate(cost, hours, 0.2), [1250.0, 1250.0])
+
+
+def test_required_rate_covers_utlegg():
+    # 10% utlegg and 100 000 fixed: income * 0.9 == cost + 100 000
+    assert np.isclose(required_rate(800_000.0, 1000.0, 0.0, 0.1, 100_000.0), 1000.0)
+    # Nothing left of the income at 100% utlegg
+    assert np.isinf(required_rate(100.0, 1000.0, 0.0, 1.0))
+
+
+def test_required_rate_without_hours_is_inf():
+    assert np.isinf(required_rate([100.0], [0.0]))[0]
+
+
+def test_required_utilization():
+    # 1625 h * 1.0 * 1000 kr = 1 625 000 at full utilization
+    util = required_utilization(812_500.0, 1625, 1.0, 1000.0)
+    assert np.isclose(util, 0.5)
+
+
+def test_supported_headcount():
+    assert np.isclose(supported_headcount(2_000_000.0, 1_000_000.0, 2, 0.0), 4.0)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from backend.jobs import CANCELLED, DONE, FAILED, JobManager, JobQueueFull
+
+
+def _wait(manager, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.status in (DONE, FAILED, CANCELLED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_reports_progress_and_result():
+    manager = JobManager(max_workers=1)
+
+    def work(job, n):
+        for i in range(n):
+            job.report(i / n)
+        return n * 2
+
+    job = _wait(manager, manager.submit("test", work, 5).id)
+    assert job.status == DONE
+    assert job.to_dict()["result"] == 10
+    assert job.progress == 1.0
+
+
+def test_job_failure_is_recorded():
+    manager = JobManager(max_workers=1)
+    job = _wait(manager, manager.submit("test", lambda job: 1 / 0).id)
+    assert job.status == FAILED
+    assert "division" in job.error
+    assert "result" not in job.to_dict()
+
+
+def test_cancel_running_job():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+
+    def work(job):
+        started.set()
+        while True:
+            job.report(0.5)
+            time.sleep(0.005)
+
+    job = manager.submit("test", work)
+    assert started.wait(5)
+    manager.cancel(job.id)
+    assert _wait(manager, job.id).status == CANCELLED
+
+
+def test_queue_is_bounded_and_finished_jobs_expire():
+    manager = JobManager(max_workers=1, max_pending=1, ttl=0.0)
+    release = threading.Event()
+    job = manager.submit("test", lambda job: release.wait(5))
+    with pytest.raises(JobQueueFull):
+        manager.submit("test", lambda job: None)
+    release.set()
+    time.sleep(0.05)
+    assert manager.get(job.id) is None
+
+
+def test_cancel_queued_job_is_immediate():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    ran = []
+    blocker = manager.submit("test", lambda job: release.wait(5))
+    queued = manager.submit("test", lambda job: ran.append(1))
+
+    assert manager.cancel(queued.id).status == CANCELLED
+    assert queued.finished is not None
+    release.set()
+    assert _wait(manager, blocker.id).status == DONE
+    time.sleep(0.05)
+    assert ran == [] and manager.get(queued.id).status == CANCELLED
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+from backend.optimizer import optimize_staffing
+
+
+def _pct(plan, cid, pid):
+    return sum(r["project_percent"] for r in plan["rows"]
+               if r["consultant_id"] == cid and r["project_id"] == pid)
+
+
+def test_best_consultant_gets_best_project():
+    plan = optimize_staffing(
+        consultant_ids=[1, 2], utilization=[0.6, 0.9], cost=[100.0, 100.0],
+        project_ids=[10, 20], hourly_rate=[1000.0, 1500.0],
+        yearly_work_hours=1000, max_fte={10: 1.0, 20: 1.0})
+    assert _pct(plan, 2, 20) == pytest.approx(1.0)
+    assert _pct(plan, 1, 10) == pytest.approx(1.0)
+    assert plan["ebit"] == pytest.approx(1000 * (0.9 * 1500 + 0.6 * 1000) - 200)
+
+
+def test_respects_capacity_demand_and_pins():
+    plan = optimize_staffing(
+        consultant_ids=[1, 2, 3], utilization=[0.8, 0.8, 0.8], cost=[10.0] * 3,
+        project_ids=[10, 20], hourly_rate=[1000.0, 1200.0],
+        yearly_work_hours=1000, max_fte={20: 1.5},
+        pinned=[(3, 10, 0.4)])
+    per_consultant = {}
+    per_project = {}
+    for r in plan["rows"]:
+        per_consultant[r["consultant_id"]] = per_consultant.get(
+            r["consultant_id"], 0) + r["project_percent"]
+        per_project[r["project_id"]] = per_project.get(
+            r["project_id"], 0) + r["project_percent"]
+    assert all(v <= 1 + 1e-9 for v in per_consultant.values())
+    assert per_project[20] <= 1.5 + 1e-9
+    assert _pct(plan, 3, 10) >= 0.4
+
+
+def test_unprofitable_consultant_is_left_unassigned():
+    plan = optimize_staffing(
+        consultant_ids=[1, 2], utilization=[0.8, 0.8], cost=[100.0, 10_000_000.0],
+        project_ids=[10], hourly_rate=[1000.0], yearly_work_hours=1000)
+    assert plan["unassigned_consultant_ids"] == [2]
+
+
+def test_pins_over_capacity_raise():
+    with pytest.raises(ValueError):
+        optimize_staffing([1], [1.0], [0.0], [10, 20], [1.0, 1.0], 1000,
+                          pinned=[(1, 10, 0.7), (1, 20, 0.7)])
+
+
+def test_large_instance_is_fast():
+    rng = np.random.default_rng(0)
+    n, m = 1000, 500
+    start = time.perf_counter()
+    plan = optimize_staffing(
+        np.arange(1, n + 1), rng.uniform(0.6, 0.95, n), rng.uniform(1e6, 1.5e6, n),
+        np.arange(1, m + 1), rng.choice([900.0, 1200.0, 1500.0], m), 1625,
+        max_fte={p: 2.0 for p in range(1, m + 1)})
+    assert time.perf_counter() - start < 5
+    assert plan["rows"]
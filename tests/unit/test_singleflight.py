@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from backend.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return {"value": value}
+
+    async def main():
+        results = await asyncio.gather(
+            *[flight.do("k", lambda: compute(1)) for _ in range(5)],
+            flight.do("other", lambda: compute(2)))
+        assert flight.inflight == 0
+        # Not cached: a later call computes again
+        again, shared = await flight.do("k", lambda: compute(3))
+        return results, again, shared
+
+    results, again, shared = asyncio.run(main())
+    assert calls == [1, 2, 3]
+    assert [r[1] for r in results] == [False, True, True, True, True, False]
+    assert results[0][0] is results[4][0]
+    assert again == {"value": 3} and not shared
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*[flight.do("k", fail) for _ in range(3)],
+                                    return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, ValueError) for e in errors)
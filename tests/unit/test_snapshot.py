@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from backend.snapshot import Snapshot, SnapshotReader, write_snapshot
+from backend.tables import TABLE_COLUMNS, ColumnTable
+
+SETTINGS = {"pex_pct": 0.32, "expense_pct": 0.4, "yearly_work_hours": 1625}
+
+
+def _write(path, consultants, projects, version=1):
+    write_snapshot(str(path),
+                   ColumnTable.from_records(consultants, TABLE_COLUMNS["consultants"]),
+                   ColumnTable.from_records(projects, TABLE_COLUMNS["projects"]), SETTINGS,
+                   {"consultants": version, "projects": 7, "settings": 2})
+
+
+def test_snapshot_lookup(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    _write(path, [{"id": 5, "name": "Åse", "salary": 700000, "default_utilization": 0.7},
+                  {"id": 2, "name": "Bo", "salary": 600000, "default_utilization": 0.8}],
+           [{"id": 1, "name": "Alpha", "hourly_rate": 1200}])
+    snap = Snapshot(str(path))
+    assert snap.versions == {"consultants": 1, "projects": 7, "settings": 2}
+    assert snap.settings == SETTINGS
+    assert list(snap.consultants.ids) == [2, 5]
+    pos = snap.consultants.positions([5, 2, 5])
+    assert snap.consultants.columns["salary"][pos].tolist() == [700000, 600000, 700000]
+    assert snap.consultants.get(5)["name"] == "Åse"
+    assert snap.projects.records() == [{"id": 1, "name": "Alpha", "hourly_rate": 1200.0}]
+    assert snap.consultants.get(3) is None
+    with pytest.raises(KeyError):
+        snap.projects.positions([1, 9])
+
+
+def test_reader_remaps_after_replace(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    reader = SnapshotReader(str(path))
+    assert reader.get() is None
+    _write(path, [], [])
+    old = reader.get()
+    assert len(old.consultants) == 0
+    _write(path, [{"id": 1, "name": "Ny", "salary": 1, "default_utilization": 1}], [], version=2)
+    new = reader.get()
+    assert new.versions["consultants"] == 2
+    assert new.consultants.get(1)["name"] == "Ny"
+    # The old mapping is still readable
+    assert len(old.consultants) == 0
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
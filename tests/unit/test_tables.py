@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from backend.tables import TABLE_COLUMNS, ColumnTable, to_days
+
+
+def _consultants():
+    return ColumnTable.from_records([
+        {"id": 3, "name": "Kari", "salary": 700000, "default_utilization": None},
+        {"id": 1, "name": "Ola", "salary": 600000, "default_utilization": 0.8},
+    ], TABLE_COLUMNS["consultants"])
+
+
+def test_join_is_array_take():
+    table = _consultants()
+    pos = table.positions([1, 3, 1])
+    assert table.columns["salary"][pos].tolist() == [600000, 700000, 600000]
+    assert table.names_at(pos) == ["Ola", "Kari", "Ola"]
+    with pytest.raises(KeyError) as e:
+        table.positions([1, 2])
+    assert e.value.args[0] == 2
+
+
+def test_records_roundtrip():
+    table = _consultants()
+    assert table.records() == [
+        {"id": 1, "name": "Ola", "salary": 600000.0, "default_utilization": 0.8},
+        {"id": 3, "name": "Kari", "salary": 700000.0, "default_utilization": None},
+    ]
+    assert table.get(2) is None
+    assert table.position(3) == 1
+
+
+def test_empty_table():
+    table = ColumnTable.from_records([], TABLE_COLUMNS["projects"])
+    assert len(table) == 0
+    assert table.positions([]).size == 0
+    assert table.position(1) is None
+    with pytest.raises(KeyError):
+        table.positions(np.array([1]))
+
+
+def test_values_at_resolves_effective_dated_versions():
+    table = ColumnTable.from_records([
+        {"id": 1, "name": "Ola", "salary": 660000, "default_utilization": 0.8,
+         "salary_history": [{"effective_from": "2025-07-01", "salary": 660000},
+                            {"effective_from": None, "salary": 600000}]},
+        {"id": 3, "name": "Kari", "salary": 700000, "default_utilization": None},
+    ], TABLE_COLUMNS["consultants"])
+    days = to_days(["2025-06-30", "2025-07-01", "2030-01-01", "2025-01-01"])
+    salary = table.values_at("salary", [0, 0, 0, 1], days)
+    # Kari has no history: her current salary applies on every day
+    assert salary.tolist() == [600000, 660000, 660000, 700000]
+
+
+def test_dates_before_the_first_version_take_the_first_version():
+    table = ColumnTable.from_records([
+        {"id": 1, "name": "P", "hourly_rate": 1300,
+         "hourly_rate_history": [{"effective_from": "2025-03-01", "hourly_rate": 1100},
+                                 {"effective_from": "2025-09-01", "hourly_rate": 1300}]},
+    ], TABLE_COLUMNS["projects"])
+    rates = table.values_at("hourly_rate", [0, 0, 0], to_days(["2024-01-01", "2025-08-31",
+                                                              "2025-09-01"]))
+    assert rates.tolist() == [1100, 1100, 1300]